@@ -1,13 +1,38 @@
 import os
 import json
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
-import google.generativeai as genai
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
+from functools import wraps
+from flask import Flask, Response, abort, g, render_template, request, redirect, url_for, flash, jsonify, stream_with_context
+from flask.json.provider import JSONProvider
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
+from pymongo.errors import ConnectionFailure
 from models import User
 from werkzeug.security import generate_password_hash, check_password_hash
-from database import mongodb
+from database import DatabaseUnavailableError, mongodb
+from gemini import LazyModel
+from llm_cache import ResponseCache, make_cache_key
+from singleflight import SingleFlight
+from batching import MicroBatcher
+from governor import ModelGovernor, OverloadedError, is_retryable
+from history_prompt import HISTORY_FORMAT_NOTE, build_history_payload
+from prompts import registry as prompt_registry
+from jobs import FINISHED, JobQueue, MemoryJobStore, MongoJobStore, public_job
+from streaming import JsonFieldStream, sse_event
+from local_scorer import DEFAULT_THRESHOLD, scorer as local_scorer
+from structured_output import (ANALYZE_BATCH_SCHEMA, ANALYZE_SCHEMA, EVALUATION_SCHEMA, JsonPrompt, coerce,
+                               extract_json, generation_config, parse_structured, parse_totals)
+from log import get_logger
+import metrics
+import serializer
+from metrics import ERRORS, GEMINI_SECONDS, JSON_SECONDS, LLM_CHARS, LLM_TOKENS, REQUEST_SECONDS, Counter
+
+logger = get_logger("app")
 
 # โหลด .env (ใน Railway จะใช้ Environment Variables แทนไฟล์ .env ก็ได้)
 load_dotenv()
@@ -15,6 +40,42 @@ load_dotenv()
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'your-secret-key-here')
 
+class TimedJSONProvider(JSONProvider):
+    """JSON ของ jsonify (response) และ request.get_json (request) ผ่าน serializer.py (orjson ถ้ามี)
+    ส่งแบบ compact และแปลง ObjectId/datetime ได้เอง พร้อมจับเวลาลง metrics"""
+
+    mimetype = "application/json"
+
+    def dumps(self, obj, indent=None, **kwargs):
+        with JSON_SECONDS.time(kind="response"):
+            return serializer.dumps(obj, indent=bool(indent))
+
+    def loads(self, s, **kwargs):
+        with JSON_SECONDS.time(kind="request"):
+            return serializer.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        with JSON_SECONDS.time(kind="response"):
+            body = serializer.dumps_bytes(obj)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+app.json = TimedJSONProvider(app)
+
+# latency ต่อ route (route ที่ stream เป็น SSE นับถึงตอนส่ง header เท่านั้น)
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    started = g.pop("request_started", None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_SECONDS.observe(time.perf_counter() - started, route=route, method=request.method,
+                                status=response.status_code)
+    return response
+
 # Flask-Login setup
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -24,16 +85,89 @@ login_manager.login_view = 'signin'  # type: ignore
 def load_user(user_id):
     return User.get(user_id)
 
-# ตั้งค่า Gemini API
-try:
-    genai.configure(api_key=os.environ["GEMINI_API_KEY"])  # type: ignore
-    model = genai.GenerativeModel('gemini-2.0-flash')  # type: ignore
-except KeyError:
-    model = None
-    print("❌ GEMINI_API_KEY not found")
-except Exception as e:
-    model = None
-    print(f"❌ Error configuring Gemini API: {e}")
+DATABASE_RETRY_AFTER = 5
+
+@app.errorhandler(DatabaseUnavailableError)
+def database_unavailable(error):
+    """MongoDB ติดต่อไม่ได้ (เช่น ตอนโหลด user ที่ล็อกอินอยู่): ตอบ 503 ให้ลองใหม่ แทนการพาไปหน้า signin"""
+    logger.warning("⚠️ MongoDB unavailable: %s", error)
+    return jsonify({"error": "ฐานข้อมูลไม่พร้อมใช้งานชั่วคราว กรุณาลองใหม่อีกครั้ง"}), 503, {"Retry-After": str(DATABASE_RETRY_AFTER)}
+
+# ตั้งค่า Gemini API (import SDK และ configure ตอนเรียกครั้งแรก ดู gemini.py)
+MODEL_NAME = 'gemini-2.0-flash'
+model = LazyModel(MODEL_NAME)
+
+# แคชผลวิเคราะห์ของ /analyze (ข้อความ+อีโมจิเดิม ไม่ต้องเรียก Gemini ซ้ำ)
+analyze_cache = ResponseCache(
+    max_size=int(os.environ.get("ANALYZE_CACHE_SIZE", 1024)),
+    ttl_seconds=int(os.environ.get("ANALYZE_CACHE_TTL", 24 * 3600)),
+    store=mongodb if os.environ.get("ANALYZE_CACHE_PERSIST", "0") == "1" else None,
+)
+
+# prompt เดียวกันที่ถูกส่งพร้อมกัน (เปิดหลายแท็บ/กดซ้ำ) ให้เรียก Gemini แค่ครั้งเดียว
+model_calls = SingleFlight()
+
+# จำกัดอัตราและจำนวน call ที่ส่งถึง Gemini พร้อมกัน (คิวเต็ม/รอนานเกิน -> 503 แทนการค้าง)
+model_governor = ModelGovernor(
+    rate=float(os.environ.get("GEMINI_RATE_PER_SEC", 5)),
+    burst=int(os.environ.get("GEMINI_BURST", 10)),
+    max_in_flight=int(os.environ.get("GEMINI_MAX_IN_FLIGHT", 8)),
+    max_queue=int(os.environ.get("GEMINI_MAX_QUEUE", 64)),
+    max_wait=float(os.environ.get("GEMINI_MAX_WAIT", 20)),
+    max_retries=int(os.environ.get("GEMINI_MAX_RETRIES", 3)),
+)
+
+# prompt ที่เป็น JsonPrompt ขอให้ Gemini ตอบเป็น JSON ตาม schema (GEMINI_JSON_MODE=0 เพื่อปิด)
+GEMINI_JSON_MODE = os.environ.get("GEMINI_JSON_MODE", "1") == "1"
+
+def model_options(prompt):
+    config = generation_config(prompt) if GEMINI_JSON_MODE else None
+    return {"generation_config": config} if config else {}
+
+@contextmanager
+def timed_model_call(mode):
+    """จับเวลา call ของ Gemini หนึ่งครั้ง (ทุกครั้งที่ governor ลองใหม่นับแยกกัน)"""
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        GEMINI_SECONDS.observe(time.perf_counter() - started, mode=mode, outcome="error")
+        ERRORS.inc(component="gemini", operation=mode)
+        raise
+    GEMINI_SECONDS.observe(time.perf_counter() - started, mode=mode, outcome="ok")
+
+def record_model_usage(prompt, response_chars, response=None):
+    """นับจำนวนตัวอักษรเข้า/ออก และ token จาก usage_metadata (ถ้า Gemini ส่งมา)"""
+    LLM_CHARS.inc(len(prompt), direction="prompt")
+    LLM_CHARS.inc(response_chars, direction="response")
+    usage = getattr(response, "usage_metadata", None)
+    if usage:
+        LLM_TOKENS.inc(getattr(usage, "prompt_token_count", 0) or 0, direction="prompt")
+        LLM_TOKENS.inc(getattr(usage, "candidates_token_count", 0) or 0, direction="response")
+
+def generate_model_text(prompt):
+    with timed_model_call("sync"):
+        response = model.generate_content(prompt, **model_options(prompt))
+        text = response.text
+    record_model_usage(prompt, len(text), response)
+    return text
+
+def call_model(prompt, user_key=None):
+    """เรียก Gemini แบบ blocking แล้วคืนข้อความตอบกลับ"""
+    key = make_cache_key(MODEL_NAME, prompt)
+    return model_calls.do(key, lambda: model_governor.call(lambda: generate_model_text(prompt), user_key))
+
+async def call_model_async(prompt, user_key=None):
+    """เรียก Gemini แบบ async แล้วคืนข้อความตอบกลับ"""
+    async def generate():
+        with timed_model_call("async"):
+            response = await model.generate_content_async(prompt, **model_options(prompt))
+            text = response.text
+        record_model_usage(prompt, len(text), response)
+        return text
+
+    key = make_cache_key(MODEL_NAME, prompt)
+    return await model_calls.do_async(key, lambda: model_governor.call_async(generate, user_key))
 
 # ประเมินความเสี่ยงซึมเศร้า
 def evaluate_depression_risk(avg_score):
@@ -64,26 +198,139 @@ def evaluate_depression_risk(avg_score):
 def index():
     return render_template("index.html", user=current_user)
 
-# วิเคราะห์อารมณ์
-@app.route("/analyze", methods=["POST"])
-@login_required
-def analyze():
-    if not model:
-        return jsonify({"error": "Gemini API is not configured."}), 500
+# ขั้นตอนที่ต้องเรียก Gemini เขียนเป็น generator: yield prompt (หรือ request object เช่น BatchedAnalysis)
+# ออกไปแล้วรับข้อความตอบกลับ (หรือ exception) กลับเข้ามา แล้ว return ค่าที่ view ต้องส่งกลับ
+# ทำให้ใช้ logic ชุดเดียวกันได้ทั้งโหมด WSGI (run_model_flow) และ ASGI (asgi.py)
+def run_model_flow(flow, user_key=None):
+    """ขับ flow ด้วยการเรียก Gemini แบบ blocking (user_key ใช้จัดคิวอย่างเป็นธรรมใน model_governor)"""
+    try:
+        prompt = next(flow)
+        while True:
+            try:
+                text = resolve_model_request(prompt, user_key)
+            except Exception as e:
+                prompt = flow.throw(e)
+            else:
+                prompt = flow.send(text)
+    except StopIteration as stop:
+        return stop.value
 
-    data = request.get_json()
-    message = data.get("message", "").strip() if data else ""
-    emoji = data.get("emoji", "").strip() if data else ""
+def resolve_model_request(request, user_key=None):
+    """prompt (str) ส่งให้ call_model ส่วน request แบบอื่น (เช่น BatchedAnalysis) เรียก run() ของมันเอง"""
+    if isinstance(request, str):
+        return call_model(request, user_key)
+    return request.run()
 
-    if not message:
-        return jsonify({"error": "Missing message"}), 400
-    if not emoji:
-        return jsonify({"error": "Missing emoji"}), 400
+async def resolve_model_request_async(request, user_key=None):
+    if isinstance(request, str):
+        return await call_model_async(request, user_key)
+    return await request.run_async()
+
+OVERLOADED_RETRY_AFTER = 5
+
+def overloaded_response(error):
+    """คำตอบเมื่อ model_governor รับงานเพิ่มไม่ได้: ให้ client ลองใหม่ภายหลัง"""
+    logger.warning("⚠️ Gemini overloaded: %s", error)
+    return jsonify({"error": "ระบบกำลังมีผู้ใช้งานจำนวนมาก กรุณาลองใหม่อีกครั้ง"}), 503, {"Retry-After": str(OVERLOADED_RETRY_AFTER)}
+
+def sse_response(events):
+    return Response(stream_with_context(events), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def open_model_stream(prompt):
+    """generate_content(stream=True) หนึ่งครั้ง (model_governor.stream เรียกใหม่เมื่อลองใหม่)"""
+    with timed_model_call("stream"):
+        yield from model.generate_content(prompt, stream=True, **model_options(prompt))
+
+def stream_model_text(prompt, user_key=None):
+    """เรียก Gemini แบบ stream=True แล้วคืนข้อความทีละ chunk
+
+    ผ่าน model_governor.stream (ถือ slot ไว้จนอ่านครบ ลองใหม่เมื่อ 429/5xx ก่อน chunk แรก) และ model_calls
+    เหมือน call_model: ถ้า prompt เดียวกันกำลังถูกเรียกอยู่จะรอผลนั้นแล้วคืนเป็น chunk เดียว
+    และ call_model ของ prompt เดียวกันที่เกิดระหว่าง stream จะได้ผลของ stream นี้
+    """
+    key = make_cache_key(MODEL_NAME, prompt)
+    call = model_calls.begin(key)
+    if call is None:
+        yield call_model(prompt, user_key)
+        return
+    parts = []
+    chunk = None
+    try:
+        for chunk in model_governor.stream(lambda: open_model_stream(prompt), user_key):
+            try:
+                text = chunk.text
+            except ValueError:
+                # chunk ที่ไม่มีข้อความ (เช่น มีแต่ safety rating)
+                continue
+            if text:
+                parts.append(text)
+                yield text
+    except BaseException as e:
+        model_calls.finish(key, call, error=e)
+        raise
+    text = "".join(parts)
+    model_calls.finish(key, call, text)
+    # usage_metadata ของ chunk สุดท้ายเป็นยอดรวมของทั้ง response
+    record_model_usage(prompt, len(text), chunk)
+
+def stream_model_flow(flow, user_key=None, json_fields=False):
+    """ขับ flow แบบ streaming แล้วส่งผลเป็น Server-Sent Events
+
+    event: chunk  {"text"}          ข้อความจาก Gemini ทีละส่วน (เมื่อ json_fields=False)
+    event: field  {"name", "value"}  field ของ JSON ที่ค่าครบแล้ว (เมื่อ json_fields=True)
+    event: done   {"status", "body", "first_chunk_ms", "total_ms"}  response สุดท้ายของ flow
+    """
+    started = time.perf_counter()
+    first_chunk_ms = None
+    try:
+        prompt = next(flow)
+        while True:
+            parts = []
+            try:
+                if isinstance(prompt, str):
+                    parser = JsonFieldStream() if json_fields else None
+                    try:
+                        for text in stream_model_text(prompt, user_key):
+                            if first_chunk_ms is None:
+                                first_chunk_ms = round((time.perf_counter() - started) * 1000, 1)
+                            parts.append(text)
+                            if parser is None:
+                                yield sse_event("chunk", {"text": text})
+                                continue
+                            for name, value in parser.feed(text):
+                                yield sse_event("field", {"name": name, "value": value})
+                    except Exception as e:
+                        if not parts or not is_retryable(e):
+                            raise
+                        # stream ขาดกลางทาง: เรียกใหม่แบบไม่ stream (ลองใหม่ตาม call_model) ผลที่ถูกต้องอยู่ใน event done
+                        logger.warning("⚠️ Gemini stream failed after %d chunks, retrying without streaming: %s",
+                                       len(parts), e)
+                        parts = [call_model(prompt, user_key)]
+                else:
+                    parts.append(resolve_model_request(prompt, user_key))
+            except Exception as e:
+                prompt = flow.throw(e)
+            else:
+                prompt = flow.send("".join(parts))
+    except StopIteration as stop:
+        response = app.make_response(stop.value)
+        if first_chunk_ms is not None:
+            STREAM_FIRST_CHUNKS.inc()
+            STREAM_FIRST_CHUNK_MS.inc(first_chunk_ms)
+        yield sse_event("done", {
+            "status": response.status_code,
+            "body": response.get_json(),
+            "first_chunk_ms": first_chunk_ms,
+            "total_ms": round((time.perf_counter() - started) * 1000, 1),
+        })
 
-    prompt = f"""
-    วิเคราะห์ข้อความและอีโมจิต่อไปนี้ แล้วตอบกลับเป็น JSON object เท่านั้น ห้ามมีข้อความอื่นนอกเหนือจาก JSON
-    ข้อความ: "{message}"
-    อีโมจิ: {emoji}
+STREAM_FIRST_CHUNKS = Counter("moodmate_stream_first_chunks_total", "Streamed Gemini responses that produced a chunk")
+STREAM_FIRST_CHUNK_MS = Counter("moodmate_stream_first_chunk_ms_total", "Summed time to first chunk of streamed responses (ms)")
+
+# prompt ของ /analyze: คำสั่งและตัวอย่างอยู่ใน prefix คงที่ ข้อความของผู้ใช้อยู่ท้ายสุด (ดู prompts.py)
+ANALYZE_PROMPT = prompt_registry.register("analyze", """
+    วิเคราะห์ข้อความและอีโมจิที่ให้ไว้ท้ายคำสั่งนี้ แล้วตอบกลับเป็น JSON object เท่านั้น ห้ามมีข้อความอื่นนอกเหนือจาก JSON
 
     หน้าที่ของคุณ:
     1.  `emotion`: ระบุอารมณ์หลักของข้อความเป็นภาษาไทย (เช่น "มีความสุข", "เศร้า", "โกรธ").
@@ -91,19 +338,153 @@ def analyze():
     3.  `emotionScore`: ให้คะแนนอารมณ์จาก 0 ถึง 100 (0 คือแง่ลบสุดๆ, 100 คือแง่บวกสุดๆ).
 
     ตัวอย่าง JSON output ที่ต้องการ:
-    {{
+    {
       "emotion": "มีความสุข",
       "summary": "ผู้เขียนรู้สึกดีใจที่ได้ไปเที่ยวทะเลกับเพื่อนๆ",
       "emotionScore": 95
-    }}
+    }
 
     วิเคราะห์ข้อมูลต่อไปนี้และสร้าง JSON object ตามรูปแบบที่กำหนด:
+    """, suffix='ข้อความ: "{message}"\nอีโมจิ: {emoji}\n')
+
+ANALYZE_BATCH_PROMPT = prompt_registry.register("analyze_batch", """
+    วิเคราะห์ข้อความและอีโมจิแต่ละรายการที่ให้ไว้ท้ายคำสั่งนี้ แล้วตอบกลับเป็น JSON array เท่านั้น ห้ามมีข้อความอื่นนอกเหนือจาก JSON
+    array ต้องมี object เท่ากับจำนวนรายการ เรียงตาม index โดยแต่ละ object มี field:
+    1.  `index`: index ของรายการนั้น
+    2.  `emotion`: ระบุอารมณ์หลักของข้อความเป็นภาษาไทย (เช่น "มีความสุข", "เศร้า", "โกรธ").
+    3.  `summary`: สรุปใจความสำคัญของข้อความสั้นๆ เป็นภาษาไทย.
+    4.  `emotionScore`: ให้คะแนนอารมณ์จาก 0 ถึง 100 (0 คือแง่ลบสุดๆ, 100 คือแง่บวกสุดๆ).
+
+    ตัวอย่าง JSON output ที่ต้องการ:
+    [
+      {"index": 0, "emotion": "มีความสุข", "summary": "ผู้เขียนรู้สึกดีใจที่ได้ไปเที่ยวทะเลกับเพื่อนๆ", "emotionScore": 95}
+    ]
+
+    """, suffix="รายการที่ต้องวิเคราะห์: {count} รายการ\n{entries}\n")
+
+# prompt ประเมินความเสี่ยง: เนื้อหา anaprompt.md + คำอธิบายรูปแบบข้อมูล เป็น prefix คงที่ ประวัติของผู้ใช้อยู่ท้ายสุด
+prompt_registry.register_file("evaluate_depression", "anaprompt.md",
+                              static_tail=f"\n\n{HISTORY_FORMAT_NOTE}\n\nข้อมูลผู้ใช้:\n", suffix="{history}")
+
+def build_analyze_prompt(message, emoji):
+    return JsonPrompt(ANALYZE_PROMPT.render(message=message, emoji=emoji), ANALYZE_SCHEMA, ANALYZE_PROMPT)
+
+def build_analyze_batch_prompt(items):
+    entries = [{"index": i, "message": message, "emoji": emoji} for i, (message, emoji) in enumerate(items)]
+    return JsonPrompt(ANALYZE_BATCH_PROMPT.render(count=len(items), entries=serializer.dumps(entries)),
+                      ANALYZE_BATCH_SCHEMA, ANALYZE_BATCH_PROMPT)
+
+def parse_analyze_batch(text, count):
+    """แยกผลของ batch prompt กลับเป็น list ของ JSON object ตามลำดับ index"""
+    results = coerce(extract_json(text, "array"), ANALYZE_BATCH_SCHEMA)
+    if len(results) != count:
+        raise ValueError(f"Expected a JSON array of {count} results")
+    by_index = {item["index"]: item for item in results}
+    if sorted(by_index) != list(range(count)):
+        raise ValueError("Batch result indexes do not match the request")
+    return [by_index[i] for i in range(count)]
+
+def analyze_batch(items):
+    """วิเคราะห์ (message, emoji) หลายรายการด้วย prompt เดียว ถ้าแยกผลไม่ได้จะเรียกทีละรายการแทน
+
+    ทุกทางใช้ ANALYZE_BATCH_PROMPT (รายการเดียวก็ส่งเป็น batch ขนาด 1) ให้ promptVersion ที่ analyze_flow
+    บันทึกตรงกับ prompt ที่ใช้จริงเสมอ ข้อความตอบกลับเป็น array ที่ parse_structured ดึง object แรกได้
     """
+    if len(items) == 1:
+        return [call_model(build_analyze_batch_prompt(items), BATCH_USER_KEY)]
+    try:
+        results = parse_analyze_batch(call_model(build_analyze_batch_prompt(items), BATCH_USER_KEY), len(items))
+        # คืนเป็นข้อความ JSON ให้ analyze_flow parse ต่อเหมือนผลจากการเรียกปกติ
+        return [json.dumps(result, ensure_ascii=False) for result in results]
+    except OverloadedError:
+        raise
+    except Exception as e:
+        logger.warning("⚠️ Batch analysis failed, falling back to single calls: %s", e)
+        ANALYZE_BATCH_FALLBACKS.inc()
+
+    def single(item):
+        try:
+            return call_model(build_analyze_batch_prompt([item]), BATCH_USER_KEY)
+        except Exception as e:
+            return e
+
+    with ThreadPoolExecutor(max_workers=len(items)) as pool:
+        return list(pool.map(single, items))
+
+class BatchedAnalysis:
+    """request ของ analyze_flow ที่ส่งผ่าน micro-batcher แทนการเรียก Gemini ตรง"""
+
+    def __init__(self, message, emoji):
+        self.item = (message, emoji)
+
+    def run(self):
+        return analyze_batcher.submit(self.item).result()
+
+    async def run_async(self):
+        return await asyncio.wrap_future(analyze_batcher.submit(self.item))
+
+# micro-batching ของ /analyze: ANALYZE_BATCH_SIZE > 1 เพื่อเปิดใช้
+ANALYZE_BATCH_SIZE = int(os.environ.get("ANALYZE_BATCH_SIZE", 1))
+# batch รวมข้อความจากหลาย user จึงเข้าคิวของ model_governor ในชื่อเดียวกัน
+BATCH_USER_KEY = "batch"
+ANALYZE_BATCH_FALLBACKS = Counter("moodmate_analyze_batch_fallbacks_total",
+                                  "Analyze batches that fell back to one call per item")
+analyze_batcher = MicroBatcher(
+    analyze_batch,
+    max_batch_size=ANALYZE_BATCH_SIZE,
+    max_delay=int(os.environ.get("ANALYZE_BATCH_DELAY_MS", 50)) / 1000,
+) if ANALYZE_BATCH_SIZE > 1 else None
+
+# ข้อความสั้นที่ lexicon/อีโมจิบอกอารมณ์ชัดเจน ให้ local_scorer ตอบเองโดยไม่เรียก Gemini
+LOCAL_SCORER = os.environ.get("LOCAL_SCORER", "1") == "1"
+LOCAL_SCORER_THRESHOLD = float(os.environ.get("LOCAL_SCORER_THRESHOLD", DEFAULT_THRESHOLD))
+LOCAL_SCORER_RESULTS = Counter("moodmate_local_scorer_total", "Messages scored locally (answered = Gemini skipped)",
+                               ("result",))
+
+def score_locally(message, emoji):
+    """ผลจาก local_scorer ถ้ามั่นใจถึง LOCAL_SCORER_THRESHOLD ไม่งั้นคืน None (ให้ไปถาม Gemini)"""
+    if not LOCAL_SCORER:
+        return None
+    result = local_scorer.score(message, emoji)
+    LOCAL_SCORER_RESULTS.inc(result="scored")
+    if result["confidence"] < LOCAL_SCORER_THRESHOLD:
+        return None
+    LOCAL_SCORER_RESULTS.inc(result="answered")
+    # local_scorer สรุปข้อความไม่ได้: ใช้ค่าว่างแบบเดียวกับ entry ที่ไม่มีสรุป ไม่เอาข้อความของผู้ใช้ไปเป็นสรุปของ AI
+    return {"emotion": result["emotion"], "summary": "N/A", "emotionScore": result["emotionScore"],
+            "promptVersion": local_scorer.version}
+
+# วิเคราะห์อารมณ์
+def analyze_flow(data):
+    if not model:
+        return jsonify({"error": "Gemini API is not configured."}), 500
+
+    message = data.get("message", "").strip() if data else ""
+    emoji = data.get("emoji", "").strip() if data else ""
+
+    if not message:
+        return jsonify({"error": "Missing message"}), 400
+    if not emoji:
+        return jsonify({"error": "Missing emoji"}), 400
+
+    # แก้ prompt แล้ว version เปลี่ยน ผลที่แคชไว้จาก prompt รุ่นเก่าจึงไม่ถูกใช้
+    prompt = ANALYZE_BATCH_PROMPT if analyze_batcher else ANALYZE_PROMPT
+    cache_key = make_cache_key(MODEL_NAME, "analyze", prompt.version_id, message, emoji)
 
     try:
-        response = model.generate_content(prompt)
-        cleaned = response.text.strip().replace("```json", "").replace("```", "").strip()
-        ai_result = json.loads(cleaned)
+        # ลำดับ: local_scorer (เร็วและได้ผลเดิมทุกครั้ง จึงไม่ต้องแคช) -> analyze_cache -> Gemini
+        # ข้อความที่ local_scorer ตอบเองได้จึงไม่ใช้ผลของ Gemini ที่อาจแคชไว้ก่อนเปิด LOCAL_SCORER
+        ai_result = score_locally(message, emoji)
+        if ai_result is None:
+            ai_result = analyze_cache.get(cache_key)
+        if ai_result is None:
+            if analyze_batcher:
+                response_text = yield BatchedAnalysis(message, emoji)
+            else:
+                response_text = yield build_analyze_prompt(message, emoji)
+            ai_result = yield from parse_structured(response_text, ANALYZE_SCHEMA, "analyze")
+            ai_result["promptVersion"] = prompt.version_id
+            analyze_cache.set(cache_key, ai_result)
 
         entry = {
             "date": datetime.now().strftime("%Y-%m-%d"),
@@ -112,9 +493,12 @@ def analyze():
             "emotion": ai_result.get("emotion", "N/A"),
             "summary": ai_result.get("summary", "N/A"),
             "emotionScore": ai_result.get("emotionScore", 50),
+            "promptVersion": ai_result.get("promptVersion"),
         }
         return jsonify(entry)
 
+    except OverloadedError as e:
+        return overloaded_response(e)
     except Exception as e:
         return jsonify({
             "date": datetime.now().strftime("%Y-%m-%d"),
@@ -125,6 +509,13 @@ def analyze():
             "emotionScore": 50,
         }), 500
 
+@app.route("/analyze", methods=["POST"])
+@login_required
+def analyze():
+    if wants_async_job():
+        return enqueue_job_response("analyze", request.get_json())
+    return run_model_flow(analyze_flow(request.get_json()), current_user.get_id())
+
 # บันทึกข้อมูล
 @app.route("/save", methods=["POST"])
 @login_required
@@ -144,6 +535,7 @@ def save_entry():
         'emotion': entry.get('emotion', 'N/A'),
         'summary': entry.get('summary', 'N/A'),
         'analysis': entry.get('analysis', ''),
+        'promptVersion': entry.get('promptVersion'),
         'user_id': str(current_user.id)
     }
     
@@ -151,35 +543,48 @@ def save_entry():
     if mongodb.client:
         success = mongodb.save_emotion_entry(current_user.id, entry)
         if success:
+            if EVALUATE_ON_SAVE and model:
+                schedule_evaluation_refresh(current_user.id)
             return jsonify({"status": "saved", "entry": safe_entry})
     
     # หาก MongoDB ไม่พร้อม ให้ return error
     return jsonify({"error": "Database connection failed. Please try again later."}), 500
 
-@app.route('/generate', methods=["POST"])
-@login_required
-def generate_text():
+def generate_flow(data):
     try:
         if not model:
             return jsonify({'error': 'Gemini API is not configured.'}), 500
             
-        data = request.get_json()
         prompt = data.get('prompt') if data else None
         if not prompt:
             return jsonify({'error': 'Prompt is missing.'}), 400
-        response = model.generate_content(prompt)
-        return jsonify({'response': response.text})
+        response_text = yield prompt
+        return jsonify({'response': response_text})
+    except OverloadedError as e:
+        return overloaded_response(e)
     except Exception as e:
-        print(f"An error occurred: {e}")
+        logger.error("An error occurred: %s", e)
         return jsonify({'error': 'Failed to generate response from the model.'}), 500
 
+@app.route('/generate', methods=["POST"])
+@login_required
+def generate_text():
+    return run_model_flow(generate_flow(request.get_json()), current_user.get_id())
+
+@app.route('/generate/stream', methods=["POST"])
+@login_required
+def generate_text_stream():
+    return sse_response(stream_model_flow(generate_flow(request.get_json()), current_user.get_id()))
+
 # ประวัติย้อนหลัง 90 วัน
+HISTORY90_FIELDS = ("date", "emoji", "message", "emotion", "emotionScore", "summary")
+
 @app.route("/history90")
 @login_required
 def history90():
-    # ดึงข้อมูลจาก MongoDB
+    # ดึงข้อมูลจาก MongoDB (เฉพาะ field ที่หน้าเว็บแสดง)
     if mongodb.client:
-        history = mongodb.get_emotion_history(current_user.id, days=90)
+        history = mongodb.get_emotion_history(current_user.id, days=90, fields=HISTORY90_FIELDS)
     else:
         # หาก MongoDB ไม่พร้อม ให้ return empty data
         return jsonify({"history90": [], "averageScore": 0, "risk": evaluate_depression_risk(0)})
@@ -187,9 +592,10 @@ def history90():
     if not history:
         return jsonify({"history90": [], "averageScore": 0, "risk": evaluate_depression_risk(0)})
 
-    # คำนวณคะแนนเฉลี่ย
-    total_score = sum(entry.get("emotionScore", 0) for entry in history if isinstance(entry, dict))
-    avg_score = total_score / len(history) if history else 0
+    # คำนวณคะแนนเฉลี่ยจากประวัติที่โหลดมาแล้ว (ไม่ต้องอ่าน user_daily_stats เพิ่ม)
+    scores = [entry.get("emotionScore") for entry in history]
+    avg_score = sum(score for score in scores
+                    if isinstance(score, (int, float)) and not isinstance(score, bool)) / len(history)
     risk = evaluate_depression_risk(avg_score)
 
     return jsonify({
@@ -198,23 +604,116 @@ def history90():
         "risk": risk,
     })
 
-# ประเมินความเสี่ยงด้วย AI
-@app.route('/evaluate_depression', methods=['POST'])
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
+# ประวัติย้อนหลังแบบแบ่งหน้า (keyset pagination ด้วย cursor)
+@app.route("/history90/page")
 @login_required
-def evaluate_depression_with_ai():
+def history90_page():
+    limit = min(request.args.get("limit", HISTORY_PAGE_SIZE, type=int) or HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE)
+    if not mongodb.client:
+        return jsonify({"history": [], "next": None})
+
+    try:
+        entries, next_cursor = mongodb.get_emotion_history_page(
+            current_user.id, days=90, cursor=request.args.get("cursor"), limit=max(limit, 1)
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"history": entries, "next": next_cursor})
+
+# ประวัติย้อนหลังแบบ stream (NDJSON: 1 entry ต่อบรรทัด)
+@app.route("/history90/stream")
+@login_required
+def history90_stream():
+    user_id = current_user.id
+
+    def generate():
+        for entry in mongodb.iter_emotion_history(user_id, days=90):
+            entry.pop("_id", None)
+            yield app.json.dumps(entry) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+# ประวัติที่ส่งให้ AI ประเมิน: entry ใน EVALUATE_RECENT_DAYS วันล่าสุดส่งแบบเต็ม ที่เก่ากว่าสรุปเป็นรายวัน
+EVALUATE_HISTORY_TOKEN_BUDGET = int(os.environ.get("EVALUATE_HISTORY_TOKEN_BUDGET", 6000))
+EVALUATE_RECENT_DAYS = int(os.environ.get("EVALUATE_RECENT_DAYS", 14))
+EVALUATE_PROMPT_TOKENS = Counter("moodmate_evaluate_prompt_tokens_total",
+                                 "Estimated evaluation history tokens before and after compaction", ("stage",))
+EVALUATE_PROMPTS = Counter("moodmate_evaluate_prompts_total", "Evaluation prompts built")
+EVALUATE_HISTORY_FIELDS = ("date", "emoji", "message", "emotion", "emotionScore", "summary", "analysis")
+
+# ผลประเมินถูกเก็บไว้ใน user_evaluations พร้อม fingerprint ของประวัติ กดประเมินซ้ำโดยไม่มี entry ใหม่จะได้ผลเดิมทันที
+# EVALUATE_ON_SAVE=1 เพื่อประเมินใหม่ใน background ทันทีหลังบันทึก (ใช้ quota ของ Gemini ทุกครั้งที่บันทึก)
+EVALUATE_ON_SAVE = os.environ.get("EVALUATE_ON_SAVE", "0") == "1"
+EVALUATE_RESULTS = Counter("moodmate_evaluate_results_total",
+                           "Evaluations served from user_evaluations (hits), run (misses) or refreshed in background",
+                           ("result",))
+evaluation_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="evaluate")
+evaluation_pending = set()
+evaluation_pending_lock = threading.Lock()
+
+def evaluation_fingerprint(state, prompt_version):
+    """fingerprint ของ input ที่ใช้ประเมิน: จำนวน entry + created_at ล่าสุด + วันนี้ (หน้าต่าง 90 วันเลื่อนทุกวัน) + รุ่นของ prompt"""
+    state = state or {}
+    last_entry_at = state.get("last_entry_at")
+    return make_cache_key(
+        MODEL_NAME, "evaluate",
+        state.get("entries", 0),
+        last_entry_at.isoformat() if isinstance(last_entry_at, datetime) else "",
+        datetime.now().strftime("%Y-%m-%d"),
+        prompt_version,
+    )
+
+def schedule_evaluation_refresh(user_id):
+    """สั่งประเมินใหม่ใน background (ถ้ามีงานของ user นี้รออยู่แล้วจะไม่สั่งซ้ำ)"""
+    with evaluation_pending_lock:
+        if user_id in evaluation_pending:
+            return
+        evaluation_pending.add(user_id)
+    evaluation_executor.submit(refresh_evaluation, user_id)
+
+def refresh_evaluation(user_id):
+    # ถอดออกก่อนเริ่ม: ถ้ามีการบันทึกระหว่างประเมิน จะได้สั่งรอบใหม่ที่เห็นข้อมูลล่าสุด
+    with evaluation_pending_lock:
+        evaluation_pending.discard(user_id)
+    try:
+        with app.app_context():
+            run_model_flow(evaluate_depression_flow(user_id), user_id)
+        EVALUATE_RESULTS.inc(result="background")
+    except Exception as e:
+        logger.error("❌ Background evaluation failed for user %s: %s", user_id, e)
+
+# ประเมินความเสี่ยงด้วย AI
+def evaluate_depression_flow(user_id):
     if not model:
         return jsonify({"error": "Gemini API is not configured."}), 500
 
-    # 1. ดึงข้อมูลประวัติทั้งหมดของผู้ใช้
-    if mongodb.client:
-        history = mongodb.get_emotion_history(current_user.id, days=90) # ดึงข้อมูล 90 วัน
-    else:
+    if not mongodb.client:
         return jsonify({
             "risk": "ไม่สามารถประเมินได้",
             "reason": "ไม่สามารถเชื่อมต่อฐานข้อมูลได้",
             "advice": "กรุณาลองใหม่อีกครั้งในภายหลัง"
         })
 
+    # Prompt จาก anaprompt.md (อ่านครั้งแรกแล้วเก็บไว้ โหลดใหม่เมื่อไฟล์ถูกแก้)
+    try:
+        prompt_template = prompt_registry.get("evaluate_depression")
+    except FileNotFoundError:
+        return jsonify({"error": "Prompt file (anaprompt.md) not found."}), 500
+
+    # ใช้ผลเดิมถ้ายังไม่มี entry ใหม่ตั้งแต่ประเมินครั้งก่อน
+    state = mongodb.get_evaluation_state(user_id)
+    fingerprint = evaluation_fingerprint(state, prompt_template.version_id)
+    if state and state.get("result") and state.get("result_fingerprint") == fingerprint:
+        EVALUATE_RESULTS.inc(result="hits")
+        return jsonify(state["result"])
+    EVALUATE_RESULTS.inc(result="misses")
+
+    # 1. ดึงประวัติ 90 วันเฉพาะ field ที่ใช้สร้าง prompt (ไม่มี _id/created_at จึงส่งต่อได้เลยโดยไม่ต้องแปลงทีละ entry)
+    history = mongodb.get_emotion_history(user_id, days=90, fields=EVALUATE_HISTORY_FIELDS)
+
     if not history:
         return jsonify({
             "risk": "ไม่สามารถประเมินได้",
@@ -222,86 +721,119 @@ def evaluate_depression_with_ai():
             "advice": "กรุณาเริ่มบันทึกอารมณ์ของคุณก่อน แล้วลองประเมินอีกครั้ง"
         })
 
-    # 2. อ่าน Prompt จากไฟล์ anaprompt.md
-    try:
-        with open("anaprompt.md", "r", encoding="utf-8") as f:
-            prompt_template = f.read()
-    except FileNotFoundError:
-        return jsonify({"error": "Prompt file (anaprompt.md) not found."}), 500
-
-    # 3. สร้าง safe history data สำหรับ JSON serialization
-    safe_history = []
-    
-    # Debug: ตรวจสอบประเภทข้อมูลใน history
-    print(f"🔍 History type: {type(history)}, Length: {len(history) if history else 'None'}")
-    if history and isinstance(history, list):
-        for i, entry in enumerate(history[:3]):  # ตรวจสอบแค่ 3 entries แรก
-            print(f"🔍 Entry {i}: type={type(entry)}, keys={list(entry.keys()) if isinstance(entry, dict) else 'Not a dict'}")
-            if isinstance(entry, dict):
-                for key, value in entry.items():
-                    if hasattr(value, '__class__') and 'datetime' in str(type(value)):
-                        print(f"⚠️  Found datetime in {key}: {type(value)} - {value}")
-    
-    for entry in history:
-        # ตรวจสอบว่า entry เป็น dict หรือไม่
-        if not isinstance(entry, dict):
-            print(f"⚠️  Skipping invalid entry (not a dict): {type(entry)} - {entry}")
-            continue
-        
-        # Debug: ตรวจสอบทุก field ใน entry
-        for key, value in entry.items():
-            if hasattr(value, '__class__') and ('datetime' in str(type(value)) or 'ObjectId' in str(type(value))):
-                print(f"⚠️  Problematic field {key}: {type(value)} - {value}")
-        
-        # แปลง date field ให้เป็น string ถ้าเป็น datetime object
-        date_value = entry.get('date')
-        if isinstance(date_value, datetime):
-            date_value = date_value.strftime("%Y-%m-%d")
-        elif date_value is None:
-            date_value = datetime.now().strftime("%Y-%m-%d")
-        
-        # สร้าง safe_entry โดยแปลงทุก field เป็น string หรือ primitive types เท่านั้น
-        safe_entry = {
-            'message': str(entry.get('message', '')),
-            'emoji': str(entry.get('emoji', '')),
-            'date': str(date_value),
-            'emotionScore': int(entry.get('emotionScore', 0)) if isinstance(entry.get('emotionScore'), (int, float)) else 0,
-            'emotion': str(entry.get('emotion', 'N/A')),
-            'summary': str(entry.get('summary', 'N/A')),
-            'analysis': str(entry.get('analysis', '')),
-        }
-        safe_history.append(safe_entry)
-    
-    # 4. สร้าง Prompt ที่สมบูรณ์
+    # 2. สร้าง Prompt ที่สมบูรณ์ (ย่อประวัติให้อยู่ใน token budget)
     try:
-        history_json_str = json.dumps(safe_history, ensure_ascii=False, indent=2)
-        print(f"✅ Successfully serialized {len(safe_history)} entries to JSON")
+        with JSON_SECONDS.time(kind="history_payload"):
+            history_json_str, report = build_history_payload(
+                history, EVALUATE_HISTORY_TOKEN_BUDGET, EVALUATE_RECENT_DAYS
+            )
+        logger.info("📊 Evaluation history: %d entries -> %d recent + %d daily, ~%d -> ~%d tokens",
+                    report['entries'], report['recent_entries'], report['daily_aggregates'],
+                    report['before_tokens'], report['after_tokens'])
+        EVALUATE_PROMPT_TOKENS.inc(report["before_tokens"], stage="before")
+        EVALUATE_PROMPT_TOKENS.inc(report["after_tokens"], stage="after")
+        EVALUATE_PROMPTS.inc()
     except Exception as e:
-        print(f"❌ JSON serialization failed: {e}")
-        print(f"🔍 Safe history sample: {safe_history[:2] if safe_history else 'Empty'}")
+        logger.error("❌ JSON serialization failed: %s", e)
+        logger.debug("🔍 History sample: %s", history[:2])
         return jsonify({
             "risk": "ข้อผิดพลาด",
             "reason": "เกิดข้อผิดพลาดในการประมวลผลข้อมูลประวัติ",
             "advice": f"รายละเอียด: {str(e)}"
         }), 500
-        
-    full_prompt = f"{prompt_template}\n\nข้อมูลผู้ใช้:\n{history_json_str}"
 
-    # 5. เรียก Gemini API
+    full_prompt = JsonPrompt(prompt_template.render(history=history_json_str), EVALUATION_SCHEMA, prompt_template)
+
+    # 3. เรียก Gemini API
     try:
-        response = model.generate_content(full_prompt)
-        cleaned = response.text.strip().replace("```json", "").replace("```", "").strip()
-        ai_result = json.loads(cleaned)
+        response_text = yield full_prompt
+        ai_result = yield from parse_structured(response_text, EVALUATION_SCHEMA, "evaluate_depression")
+        mongodb.save_evaluation(user_id, fingerprint, ai_result, prompt_template.version_id)
         return jsonify(ai_result)
 
+    except OverloadedError as e:
+        return overloaded_response(e)
     except Exception as e:
-        print(f"❌ AI Evaluation Error: {e}")
+        logger.error("❌ AI Evaluation Error: %s", e)
         return jsonify({
             "risk": "ข้อผิดพลาด",
             "reason": "เกิดข้อผิดพลาดในการสื่อสารกับ AI หรือการประมวลผลข้อมูล",
             "advice": f"รายละเอียด: {str(e)}"
         }), 500
 
+@app.route('/evaluate_depression', methods=['POST'])
+@login_required
+def evaluate_depression_with_ai():
+    if wants_async_job():
+        return enqueue_job_response("evaluate_depression")
+    return run_model_flow(evaluate_depression_flow(current_user.id), current_user.get_id())
+
+@app.route('/evaluate_depression/stream', methods=['POST'])
+@login_required
+def evaluate_depression_stream():
+    """เหมือน /evaluate_depression แต่ส่ง risk, reason, advice เป็น SSE ทันทีที่แต่ละ field ครบ"""
+    return sse_response(stream_model_flow(
+        evaluate_depression_flow(current_user.id), current_user.get_id(), json_fields=True
+    ))
+
+# งาน LLM แบบ background: client ส่ง header "Prefer: respond-async" (RFC 7240) ไปที่ /analyze หรือ
+# /evaluate_depression จะได้ 202 + job_id ทันที แล้ว poll ผลจาก /jobs/<job_id> (อ่าน job ครั้งเดียว ไม่ถือ worker ไว้)
+JOB_BACKEND = os.environ.get("JOB_BACKEND", "mongo" if os.environ.get("MONGODB_URI") else "memory")
+# วินาทีที่แนะนำให้ client รอก่อน poll /jobs/<job_id> ครั้งถัดไป (header Retry-After ขณะงานยังไม่เสร็จ)
+JOB_POLL_INTERVAL = 1
+job_queue = JobQueue(
+    MongoJobStore(mongodb) if JOB_BACKEND == "mongo" else MemoryJobStore(),
+    workers=int(os.environ.get("JOB_WORKERS", 2)),
+    visibility_timeout=int(os.environ.get("JOB_VISIBILITY_TIMEOUT", 120)),
+    max_attempts=int(os.environ.get("JOB_MAX_ATTEMPTS", 3)),
+)
+
+def job_handler(make_flow):
+    """แปลง flow เป็น handler ของ job_queue: เก็บ status code + JSON body ของ response ไว้เป็นผลลัพธ์"""
+    def handle(job):
+        with app.app_context():
+            response = app.make_response(run_model_flow(make_flow(job), job["user_id"]))
+            if response.status_code == 503:
+                # Gemini รับงานไม่ไหวตอนนี้ ให้ job_queue ลองใหม่ภายหลัง
+                raise OverloadedError(response.get_json().get("error"))
+            return {"status_code": response.status_code, "body": response.get_json()}
+    return handle
+
+job_queue.register("analyze", job_handler(lambda job: analyze_flow(job["payload"])))
+job_queue.register("evaluate_depression", job_handler(lambda job: evaluate_depression_flow(job["user_id"])))
+
+def wants_async_job():
+    return "respond-async" in request.headers.get("Prefer", "")
+
+def enqueue_job_response(kind, payload=None):
+    try:
+        job_id = job_queue.enqueue(kind, current_user.id, payload)
+    except ConnectionFailure as e:
+        logger.error("❌ Could not enqueue %s job: %s", kind, e)
+        return jsonify({"error": "Database not available"}), 503, {"Retry-After": str(OVERLOADED_RETRY_AFTER)}
+    status_url = url_for("job_status", job_id=job_id)
+    return jsonify({
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": status_url,
+    }), 202, {"Location": status_url, "Preference-Applied": "respond-async"}
+
+def get_user_job(job_id):
+    """คืนงานถ้าเป็นของ user ที่ล็อกอินอยู่ (งานของคนอื่นถือว่าไม่มี)"""
+    job = job_queue.get(job_id)
+    if job is None or job["user_id"] != str(current_user.id):
+        return None
+    return job
+
+@app.route("/jobs/<job_id>")
+@login_required
+def job_status(job_id):
+    job = get_user_job(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    if job["status"] not in FINISHED:
+        return jsonify(public_job(job)), 200, {"Retry-After": str(JOB_POLL_INTERVAL)}
+    return jsonify(public_job(job))
 
 @app.route('/signup', methods=['GET', 'POST'])
 def signup():
@@ -366,6 +898,135 @@ def debug_users():
             "users": []
         })
 
+@metrics.register_collector
+def collect_app_stats():
+    """ค่าจาก stats() เดิมของแคช คิว governor และ connection pool (อ่านตอน scrape)"""
+    caches = {"analyze": analyze_cache.stats(), "users": mongodb.user_cache.stats()}
+    governor = model_governor.stats()
+    jobs = job_queue.stats()
+    db = mongodb.stats()
+    pool = db["pool"]
+    return [
+        ("moodmate_cache_hits_total", "counter", "Cache lookups that found a value",
+         [({"cache": name}, stats["hits"]) for name, stats in caches.items()]),
+        ("moodmate_cache_misses_total", "counter", "Cache lookups that missed",
+         [({"cache": name}, stats["misses"]) for name, stats in caches.items()]),
+        ("moodmate_cache_entries", "gauge", "Entries held in memory",
+         [({"cache": name}, stats["size"]) for name, stats in caches.items()]),
+        ("moodmate_gemini_in_flight", "gauge", "Gemini calls running now", [({}, governor["in_flight"])]),
+        ("moodmate_gemini_queued", "gauge", "Gemini calls waiting for a slot", [({}, governor["queued"])]),
+        ("moodmate_gemini_rejected_total", "counter", "Gemini calls rejected as overloaded (503)",
+         [({}, governor["rejected"])]),
+        ("moodmate_gemini_retries_total", "counter", "Gemini calls retried after 429/5xx", [({}, governor["retries"])]),
+        ("moodmate_gemini_coalesced_total", "counter", "Identical prompts served by an in-flight call",
+         [({}, model_calls.stats()["coalesced"])]),
+        ("moodmate_jobs_total", "counter", "Background LLM jobs",
+         [({"result": name}, jobs[name]) for name in ("enqueued", "completed", "retried", "failed")]),
+        ("moodmate_mongodb_connected", "gauge", "1 if this process has a healthy MongoDB client",
+         [({}, int(db["connected"]))]),
+        ("moodmate_mongodb_pool_checked_out", "gauge", "Connections checked out of the pool",
+         [({}, pool["checked_out"])]),
+        ("moodmate_mongodb_pool_checkouts_total", "counter", "Connection checkouts", [({}, pool["checkouts"])]),
+        ("moodmate_mongodb_pool_max_wait_seconds", "gauge", "Longest wait for a pooled connection",
+         [({}, pool["max_wait_ms"] / 1000)]),
+    ]
+
+STARTED_AT = time.monotonic()
+
+@app.route('/healthz')
+def healthz():
+    """liveness check: ตอบทันทีโดยไม่แตะ MongoDB หรือ Gemini (บอกแค่ว่าเชื่อมต่อ/โหลดแล้วหรือยัง)"""
+    return jsonify({
+        "status": "ok",
+        "pid": os.getpid(),
+        "uptime_seconds": round(time.monotonic() - STARTED_AT, 3),
+        "mongodb_connected": mongodb.connected,
+        "gemini_loaded": getattr(model, "loaded", True),
+    })
+
+def preload():
+    """งานที่ทำได้ใน gunicorn master ก่อน fork (GUNICORN_PRELOAD=1): import Gemini SDK และสร้าง model
+    ให้ worker ได้ไปโดยไม่ต้อง import เอง ไม่เปิด connection ใด ๆ เพราะ socket ใช้ข้าม fork ไม่ได้"""
+    if isinstance(model, LazyModel) and model:
+        try:
+            model.load()
+        except Exception:
+            pass  # load() log ไว้แล้ว route จะตอบ error ตามปกติ
+
+# WARM_UP=1: แต่ละ worker เรียก warm_up() ตอนเริ่ม (gunicorn post_fork หรือ ASGI lifespan startup)
+WARM_UP = os.environ.get("WARM_UP", "1") == "1"
+warm_up_pid = None
+
+def warm_up():
+    """เตรียม worker หลัง fork ใน background: เชื่อมต่อ MongoDB (ping + index) และโหลด Gemini
+    request แรกจึงไม่ต้องรอ ถ้าเชื่อมต่อไม่ได้ route ใช้โหมด fallback ตามเดิม (เรียกซ้ำได้ ทำครั้งเดียวต่อ process)"""
+    global warm_up_pid
+    if warm_up_pid == os.getpid():
+        return
+    warm_up_pid = os.getpid()
+
+    def run():
+        started = time.perf_counter()
+        preload()
+        connected = mongodb.client is not None
+        logger.info("Worker %s warmed up in %.2fs (MongoDB connected: %s)", os.getpid(),
+                    time.perf_counter() - started, connected)
+
+    threading.Thread(target=run, name="warm-up", daemon=True).start()
+
+# /metrics และ /debug/* เปิดเผยสถิติภายใน (connection pool, แคช, คิว) จึงปิดไว้เป็นค่าเริ่มต้น (ตอบ 404)
+# INTERNAL_ENDPOINTS=1 เปิดเมื่อพอร์ตของแอปเข้าถึงได้เฉพาะจากเครือข่ายภายใน เช่น ให้ Prometheus scrape
+INTERNAL_ENDPOINTS = os.environ.get("INTERNAL_ENDPOINTS", "0") == "1"
+
+def internal_endpoint(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not INTERNAL_ENDPOINTS:
+            abort(404)
+        return view(*args, **kwargs)
+    return wrapper
+
+@app.route('/metrics')
+@internal_endpoint
+def metrics_endpoint():
+    """metrics ของ process นี้ในรูปแบบ Prometheus text"""
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route('/debug/db')
+@internal_endpoint
+def debug_db():
+    """สถานะการเชื่อมต่อ MongoDB และ connection pool ของ process นี้ (สำหรับ debug/ปรับจำนวน worker)"""
+    return jsonify(mongodb.stats())
+
+def debug_stream_stats():
+    streams, first_chunk_ms = STREAM_FIRST_CHUNKS.value(), STREAM_FIRST_CHUNK_MS.value()
+    return {"streams": streams, "first_chunk_ms_sum": first_chunk_ms,
+            "average_first_chunk_ms": round(first_chunk_ms / streams, 1) if streams else None}
+
+@app.route('/debug/cache')
+@internal_endpoint
+def debug_cache():
+    """สถิติแคชผลวิเคราะห์ (สำหรับ debug)"""
+    return jsonify({
+        "analyze": analyze_cache.stats(),
+        "model_calls": model_calls.stats(),
+        "model_governor": model_governor.stats(),
+        "local_scorer": {"scored": LOCAL_SCORER_RESULTS.value(result="scored"),
+                         "answered": LOCAL_SCORER_RESULTS.value(result="answered"),
+                         "threshold": LOCAL_SCORER_THRESHOLD if LOCAL_SCORER else None},
+        "structured_output": parse_totals(),
+        "prompts": prompt_registry.stats(),
+        "gemini": model.stats() if isinstance(model, LazyModel) else None,
+        "evaluate_prompt": {"prompts": EVALUATE_PROMPTS.value(),
+                            "before_tokens": EVALUATE_PROMPT_TOKENS.value(stage="before"),
+                            "after_tokens": EVALUATE_PROMPT_TOKENS.value(stage="after")},
+        "evaluate_results": {name: EVALUATE_RESULTS.value(result=name) for name in ("hits", "misses", "background")},
+        "jobs": job_queue.stats(),
+        "streams": debug_stream_stats(),
+        "users": mongodb.user_cache.stats(),
+        "analyze_batches": dict(analyze_batcher.stats(), fallbacks=ANALYZE_BATCH_FALLBACKS.value()) if analyze_batcher else None,
+    })
+
 # รันแอป
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 5000))
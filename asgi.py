@@ -0,0 +1,183 @@
+"""ASGI entry point: `uvicorn asgi:app`
+
+route ที่เรียก Gemini (/analyze, /generate, /evaluate_depression) ทำงานแบบ asyncio
+โดยรอผลจาก generate_content_async บน event loop เดียว ทำให้ request ที่รอ LLM อยู่หลายร้อยตัว
+ไม่กิน worker thread ส่วน route อื่นทั้งหมดส่งต่อให้ Flask app เดิมผ่าน a2wsgi.WSGIMiddleware
+
+    WSGI_THREADS=32   จำนวน thread ที่รัน route แบบ WSGI พร้อมกันได้ (รวม SSE ที่ถือ thread ไว้ตลอด stream)
+
+(ไม่ใช้ asgiref.wsgi.WsgiToAsgi เพราะรันทุก request ใน thread เดียวกัน request ช้าตัวเดียวทำให้ route อื่นรอทั้งหมด)
+"""
+import asyncio
+import io
+import os
+import sys
+
+from a2wsgi import WSGIMiddleware
+from flask_login import current_user
+
+import app as flask_module
+from database import DatabaseUnavailableError
+
+flask_app = flask_module.app
+login_manager = flask_module.login_manager
+
+# (method, path) -> ฟังก์ชันที่รับ request data แล้วคืน flow generator (ดู run_model_flow ใน app.py)
+ASYNC_ROUTES = {
+    ("POST", "/analyze"): lambda request: flask_module.analyze_flow(request.get_json()),
+    ("POST", "/generate"): lambda request: flask_module.generate_flow(request.get_json()),
+    ("POST", "/evaluate_depression"): lambda request: flask_module.evaluate_depression_flow(current_user.id),
+}
+
+WSGI_THREADS = int(os.environ.get("WSGI_THREADS", 32))
+wsgi_app = WSGIMiddleware(flask_app, workers=WSGI_THREADS)
+
+
+def wants_async_job(scope):
+    """request ที่ขอ Prefer: respond-async ให้ Flask view ส่งเข้า job_queue แทนการรอ Gemini"""
+    return any(name.lower() == b"prefer" and b"respond-async" in value for name, value in scope.get("headers", []))
+
+
+def build_environ(scope, body):
+    """แปลง ASGI scope เป็น WSGI environ เพื่อสร้าง Flask request context"""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf8").decode("latin1"),
+        "PATH_INFO": scope["path"].encode("utf8").decode("latin1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("ascii"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1] or 80),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+        "CONTENT_LENGTH": str(len(body)),
+    }
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin1").upper().replace("-", "_")
+        value = raw_value.decode("latin1")
+        if name == "CONTENT_TYPE":
+            environ["CONTENT_TYPE"] = value
+            continue
+        if name == "CONTENT_LENGTH":
+            continue
+        key = f"HTTP_{name}"
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+class FlowRequest:
+    """ถือ Flask request context ของ request หนึ่งไว้ตลอดช่วงที่รอ Gemini
+
+    ทุกขั้นตอนที่แตะ Flask/MongoDB ทำใน thread (asyncio.to_thread) โดย push context
+    เข้าไปใหม่ทุกครั้ง app context แยกไว้เพื่อให้ g (รวมถึง user ที่ล็อกอิน) อยู่ข้ามขั้นตอน
+    """
+
+    def __init__(self, scope, body):
+        self.app_ctx = flask_app.app_context()
+        self.request_ctx = flask_app.request_context(build_environ(scope, body))
+        self.user_key = None
+
+    def call(self, func, *args):
+        self.app_ctx.push()
+        self.request_ctx.push()
+        try:
+            return func(*args)
+        finally:
+            self.request_ctx.pop()
+            self.app_ctx.pop()
+
+    def start(self, make_flow):
+        """เริ่ม flow: คืน ("prompt", flow, prompt) หรือ ("response", response, None)"""
+        rv = flask_app.preprocess_request()
+        try:
+            if rv is None and not current_user.is_authenticated:
+                rv = login_manager.unauthorized()
+        except DatabaseUnavailableError as e:
+            rv = flask_app.handle_user_exception(e)
+        if rv is not None:
+            return "response", self.finish_response(rv), None
+        self.user_key = current_user.get_id()
+        flow = make_flow(self.request_ctx.request)
+        return self.advance(flow, next, flow)
+
+    def advance(self, flow, step, *args):
+        try:
+            prompt = step(*args)
+        except StopIteration as stop:
+            return "response", self.finish_response(stop.value), None
+        return "prompt", flow, prompt
+
+    def finish_response(self, rv):
+        response = flask_app.make_response(rv)
+        return flask_app.process_response(response)
+
+
+async def run_model_flow_async(flow_request, make_flow):
+    """เหมือน run_model_flow แต่รอ Gemini ด้วย generate_content_async"""
+    kind, value, prompt = await asyncio.to_thread(flow_request.call, flow_request.start, make_flow)
+    while kind == "prompt":
+        flow = value
+        try:
+            text = await flask_module.resolve_model_request_async(prompt, flow_request.user_key)
+            step, args = flow.send, (text,)
+        except Exception as e:
+            step, args = flow.throw, (e,)
+        kind, value, prompt = await asyncio.to_thread(flow_request.call, flow_request.advance, flow, step, *args)
+    return value
+
+
+async def read_body(receive):
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    return body
+
+
+async def send_response(send, response):
+    body = response.get_data()
+    headers = [
+        (name.lower().encode("latin1"), value.encode("latin1"))
+        for name, value in response.headers.to_wsgi_list()
+        if name.lower() != "content-length"
+    ]
+    headers.append((b"content-length", str(len(body)).encode("latin1")))
+    await send({"type": "http.response.start", "status": response.status_code, "headers": headers})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            if flask_module.WARM_UP:
+                flask_module.warm_up()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        return await lifespan(receive, send)
+
+    make_flow = ASYNC_ROUTES.get((scope.get("method"), scope.get("path"))) if scope["type"] == "http" else None
+    if make_flow is None or wants_async_job(scope):
+        return await wsgi_app(scope, receive, send)
+
+    body = await read_body(receive)
+    flow_request = FlowRequest(scope, body)
+    response = await run_model_flow_async(flow_request, make_flow)
+    await send_response(send, response)
@@ -0,0 +1,80 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class MicroBatcher:
+    """รวม request ที่เข้ามาในช่วงเวลาสั้น ๆ เป็น batch เดียวก่อนส่งให้ process_batch
+
+    submit() คืน concurrent.futures.Future (ใช้ asyncio.wrap_future ในโหมด async ได้)
+    process_batch(items) ต้องคืน list ผลลัพธ์ยาวเท่า items ตามลำดับ ถ้าสมาชิกตัวไหนเป็น
+    Exception จะถูกส่งกลับเป็น exception ของผู้เรียกคนนั้น
+    """
+
+    def __init__(self, process_batch, max_batch_size=8, max_delay=0.05, max_concurrent_batches=4):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        # batch ถัดไปเริ่มรวบรวมได้ทันทีโดยไม่ต้องรอ batch ก่อนหน้าเรียก LLM เสร็จ
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrent_batches, thread_name_prefix="microbatch")
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, item):
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((item, future))
+        return future
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._collect, name="microbatch-collector", daemon=True)
+                self._worker.start()
+
+    def _collect(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            with self._lock:
+                self.batches += 1
+                self.items += len(batch)
+            self._executor.submit(self._dispatch, batch)
+
+    def _dispatch(self, batch):
+        items = [item for item, _ in batch]
+        try:
+            results = self.process_batch(items)
+            if len(results) != len(batch):
+                raise ValueError(f"Expected {len(batch)} results, got {len(results)}")
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        for (_, future), result in zip(batch, results):
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "batches": self.batches,
+                "items": self.items,
+                "average_batch_size": round(self.items / self.batches, 2) if self.batches else 0,
+                "queued": self._queue.qsize(),
+            }
@@ -0,0 +1,117 @@
+"""เปรียบเทียบ requests/sec ของ /generate เมื่อโมเดลตอบช้า: WSGI (sync workers) vs ASGI
+
+    python benchmarks/bench_async.py --requests 200 --latency 0.5 --workers 4
+
+โหมด WSGI จำลอง gunicorn sync workers ด้วย thread pool ขนาด --workers
+โหมด ASGI เรียก asgi.app ตรง ๆ ใน event loop เดียวพร้อมกัน --concurrency request
+"""
+import argparse
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookies import SimpleCookie
+
+import common
+
+
+def bench_wsgi(flask_app, total, workers):
+    def worker(count):
+        client = flask_app.test_client()
+        client.post("/signin", data={"username": "bench", "password": "bench-password"})
+        for i in range(count):
+            # prompt ไม่ซ้ำกัน เพื่อไม่ให้ SingleFlight รวม call จนตัวเลขเพี้ยน
+            client.post("/generate", json={"prompt": f"สวัสดี {threading.get_ident()} {i}"})
+
+    per_worker = [total // workers + (1 if i < total % workers else 0) for i in range(workers)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(worker, per_worker))
+    return total / (time.perf_counter() - started)
+
+
+async def asgi_request(asgi_app, method, path, body=b"", headers=()):
+    messages = []
+    sent = False
+
+    async def receive():
+        nonlocal sent
+        if sent:
+            await asyncio.sleep(3600)
+        sent = True
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": method,
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in headers]
+        + [(b"content-length", str(len(body)).encode())],
+        "client": ("127.0.0.1", 12345),
+        "server": ("localhost", 8000),
+    }
+    await asgi_app(scope, receive, send)
+    start = next(m for m in messages if m["type"] == "http.response.start")
+    return start["status"], dict(start["headers"])
+
+
+async def bench_asgi(asgi_app, total, concurrency):
+    form = b"username=bench&password=bench-password"
+    _, headers = await asgi_request(
+        asgi_app, "POST", "/signin", form,
+        [("content-type", "application/x-www-form-urlencoded")],
+    )
+    cookie = SimpleCookie(headers[b"set-cookie"].decode())
+    cookie_header = "; ".join(f"{k}={v.value}" for k, v in cookie.items())
+    request_headers = [("content-type", "application/json"), ("cookie", cookie_header)]
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            body = json.dumps({"prompt": f"สวัสดี {i}"}).encode()
+            status, _ = await asgi_request(asgi_app, "POST", "/generate", body, request_headers)
+            assert status == 200, status
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return total / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.5, help="เวลาตอบของโมเดลปลอม (วินาที)")
+    parser.add_argument("--workers", type=int, default=4, help="จำนวน sync worker ฝั่ง WSGI")
+    parser.add_argument("--concurrency", type=int, default=200, help="request พร้อมกันฝั่ง ASGI")
+    args = parser.parse_args()
+
+    import app as flask_module
+    import asgi
+    from governor import ModelGovernor
+
+    common.create_user()
+    flask_module.model = common.FakeModel(latency=args.latency)
+    # วัดเฉพาะ concurrency ของ server จึงปิด rate limit ของ model_governor (ดู bench_governor.py)
+    flask_module.model_governor = ModelGovernor(rate=0, max_in_flight=10 ** 6, max_queue=10 ** 6)
+
+    wsgi_rps = bench_wsgi(flask_module.app, args.requests, args.workers)
+    asgi_rps = asyncio.run(bench_asgi(asgi.app, args.requests, args.concurrency))
+
+    print(f"model latency: {args.latency}s, requests: {args.requests}")
+    print(f"WSGI ({args.workers} sync workers): {wsgi_rps:8.1f} req/s")
+    print(f"ASGI (concurrency {args.concurrency}): {asgi_rps:8.1f} req/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""throughput ของ /analyze แบบเรียกทีละข้อความเทียบกับ micro-batching
+
+    python benchmarks/bench_batching.py --requests 200 --clients 32 --batch-size 8
+
+โมเดลปลอมจำลอง provider จริง: ใช้เวลา --latency ต่อ call บวก --per-item ต่อรายการใน batch
+และรับได้พร้อมกันไม่เกิน --max-in-flight call (ส่วนเกินต้องรอคิว)
+"""
+import argparse
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import common
+
+ITEM = {"emotion": "มีความสุข", "summary": "ทดสอบ", "emotionScore": 80}
+
+
+class BatchAwareModel(common.FakeModel):
+    def __init__(self, latency, per_item, max_in_flight):
+        super().__init__(latency=latency)
+        self.per_item = per_item
+        self.slots = threading.Semaphore(max_in_flight)
+        self.lock = threading.Lock()
+
+    def generate_content(self, prompt, **kwargs):
+        count = len(re.findall(r'"index":\s*\d+,\s*"message"', prompt))
+        with self.slots:
+            with self.lock:
+                self.calls += 1
+            time.sleep(self.latency + self.per_item * max(count, 1))
+        if count:
+            text = json.dumps([dict(ITEM, index=i) for i in range(count)], ensure_ascii=False)
+        else:
+            text = json.dumps(ITEM, ensure_ascii=False)
+        return common.FakeResponse(text)
+
+
+def run(flask_app, cookie, total, clients):
+    def one(i):
+        client = flask_app.test_client()
+        client.set_cookie("session", cookie)
+        response = client.post("/analyze", json={"message": f"ข้อความที่ {i} {time.time()}", "emoji": "😀"})
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        list(pool.map(one, range(total)))
+    return total / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--delay-ms", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.8)
+    parser.add_argument("--per-item", type=float, default=0.05)
+    parser.add_argument("--max-in-flight", type=int, default=4)
+    args = parser.parse_args()
+
+    import app as flask_module
+    from batching import MicroBatcher
+
+    common.create_user()
+    client = flask_module.app.test_client()
+    client.post("/signin", data={"username": "bench", "password": "bench-password"})
+    cookie = client.get_cookie("session").value
+
+    model = BatchAwareModel(args.latency, args.per_item, args.max_in_flight)
+    flask_module.model = model
+
+    flask_module.analyze_batcher = None
+    single_rps = run(flask_module.app, cookie, args.requests, args.clients)
+    single_calls = model.calls
+
+    model.calls = 0
+    flask_module.analyze_batcher = MicroBatcher(
+        flask_module.analyze_batch, max_batch_size=args.batch_size, max_delay=args.delay_ms / 1000
+    )
+    batched_rps = run(flask_module.app, cookie, args.requests, args.clients)
+
+    print(f"requests: {args.requests}, clients: {args.clients}, model: {args.latency}s + {args.per_item}s/item, "
+          f"max {args.max_in_flight} in flight")
+    print(f"single calls: {single_rps:7.1f} req/s, {single_calls} model calls")
+    print(f"micro-batch:  {batched_rps:7.1f} req/s, {model.calls} model calls, {flask_module.analyze_batcher.stats()}")
+
+
+if __name__ == "__main__":
+    main()
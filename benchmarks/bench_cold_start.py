@@ -0,0 +1,76 @@
+"""เวลาเริ่มต้นของ worker เมื่อ MongoDB ติดต่อไม่ได้: import app และเวลาจนได้ response แรก
+
+    python benchmarks/bench_cold_start.py --runs 5
+    python benchmarks/bench_cold_start.py --db-uri mongodb://10.255.255.1:27017/kanrawee_db
+
+แต่ละรอบเป็น process ใหม่ (import cache ว่าง) วัด 3 โหมด:
+- lazy: import app แล้วยิง /healthz และ GET /signin ทันที (แบบที่ worker ทำหลัง user-023)
+- warm: เหมือน lazy แต่เรียก app.warm_up() ก่อน (เชื่อมต่อใน background ไม่ควรทำให้ช้าลง)
+- eager: import แล้วโหลด Gemini SDK + เชื่อมต่อ MongoDB ก่อนรับ request (พฤติกรรมเดิมตอน import)
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+UNREACHABLE_URI = "mongodb://10.255.255.1:27017/kanrawee_db"
+MODES = ("lazy", "warm", "eager")
+
+
+def child(mode):
+    started = time.perf_counter()
+    import common  # noqa: F401  (ตั้ง sys.path)
+    import app as flask_module
+
+    imported = time.perf_counter()
+    if mode == "warm":
+        flask_module.warm_up()
+    elif mode == "eager":
+        flask_module.preload()
+        flask_module.mongodb.client  # noqa: B018  (ping ที่เคยเกิดตอน import)
+    client = flask_module.app.test_client()
+    health_status = client.get("/healthz").status_code
+    healthz = time.perf_counter()
+    signin_status = client.get("/signin").status_code
+    signin = time.perf_counter()
+    print(json.dumps({
+        "import_s": imported - started,
+        "healthz_s": healthz - started,
+        "signin_page_s": signin - started,
+        "statuses": [health_status, signin_status],
+    }))
+
+
+def run(mode, db_uri):
+    env = dict(os.environ, BENCH_MONGODB_URI=db_uri, LOG_LEVEL="ERROR", WARM_UP="0")
+    env.setdefault("GEMINI_API_KEY", "benchmark-fake-key")
+    output = subprocess.run([sys.executable, "-W", "ignore", os.path.abspath(__file__), "--child", mode],
+                            env=env, capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--db-uri", default=UNREACHABLE_URI, help="MongoDB ที่ติดต่อไม่ได้")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--child", choices=MODES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child(args.child)
+
+    print(f"MongoDB: {args.db_uri}, {args.runs} runs per mode (median seconds since interpreter start of import)")
+    print(f"{'mode':<6} {'import':>8} {'/healthz':>9} {'/signin':>9}  statuses")
+    for mode in args.modes:
+        results = [run(mode, args.db_uri) for _ in range(args.runs)]
+        row = {key: statistics.median(result[key] for result in results)
+               for key in ("import_s", "healthz_s", "signin_page_s")}
+        print(f"{mode:<6} {row['import_s']:8.3f} {row['healthz_s']:9.3f} {row['signin_page_s']:9.3f}  "
+              f"{results[-1]['statuses']}")
+
+
+if __name__ == "__main__":
+    main()
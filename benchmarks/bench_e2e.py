@@ -0,0 +1,341 @@
+"""benchmark แบบ end-to-end: ยิง traffic ผสม (signin, analyze, save, history90, evaluate_depression)
+เข้าแอปจริงผ่าน Flask test client ที่ concurrency หลายระดับ โดยใช้ mongomock (หรือ mongod) และ Gemini ปลอม
+
+    python benchmarks/bench_e2e.py --concurrency 1 4 16 --duration 20 --latency 0.8 --failure-rate 0.02
+    BENCH_MONGODB_URI=mongodb://localhost:27017/moodmate_bench python benchmarks/bench_e2e.py ...
+    python benchmarks/bench_e2e.py --compare benchmarks/results/e2e-<commit เดิม>.json
+
+แต่ละ virtual user เป็น thread ที่มี client และบัญชีของตัวเอง (มีประวัติ --seed-entries รายการ) แล้วสุ่ม
+operation ตามน้ำหนักใน --mix รายงานต่อ operation: p50/p95/p99, throughput, จำนวน MongoDB operation และ
+Gemini call ต่อ request (นับตาม thread ที่เรียก งานใน thread อื่น เช่น micro-batcher หรือ job worker
+จะนับเป็น "background") ผลทั้งหมดถูกเขียนเป็น JSON ใน benchmarks/results/ เพื่อเทียบระหว่าง commit
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+import common
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+SAMPLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "emotion_sample.jsonl")
+OPERATIONS = ("signin", "analyze", "save", "history90", "evaluate_depression")
+DEFAULT_MIX = "signin=1,analyze=4,save=3,history90=5,evaluate_depression=1"
+PASSWORD = "bench-password"
+
+EVALUATION_RESULT = json.dumps({"risk": "ต่ำ", "reason": "อารมณ์ส่วนใหญ่เป็นบวก", "advice": "ดูแลตัวเองต่อไป"},
+                               ensure_ascii=False)
+BATCH_MARKER = "รายการที่ต้องวิเคราะห์:"
+
+DB_METHODS = ("find", "find_one", "insert_one", "insert_many", "update_one", "update_many", "replace_one",
+              "delete_one", "delete_many", "find_one_and_update", "aggregate", "bulk_write", "count_documents",
+              "create_index")
+
+# operation ที่ thread ปัจจุบันกำลังยิง ใช้แยกจำนวน DB/Gemini call ตาม operation
+current = threading.local()
+calls_lock = threading.Lock()
+db_calls = Counter()
+llm_calls = Counter()
+
+
+def current_operation():
+    return getattr(current, "operation", "background")
+
+
+class MixedModel(common.FakeModel):
+    """Gemini ปลอมที่ตอบตามชนิดของ prompt: ผลประเมิน, batch analyze หรือ analyze รายการเดียว"""
+
+    def respond(self, prompt):
+        from structured_output import ANALYZE_BATCH_SCHEMA, EVALUATION_SCHEMA, extract_json
+
+        schema = getattr(prompt, "schema", None)
+        if schema is EVALUATION_SCHEMA:
+            return EVALUATION_RESULT
+        if schema is ANALYZE_BATCH_SCHEMA:
+            items = extract_json(prompt.split(BATCH_MARKER, 1)[1], "array")
+            result = extract_json(self.text)
+            return json.dumps([dict(result, index=i) for i in range(len(items))], ensure_ascii=False)
+        return self.text
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        with calls_lock:
+            llm_calls[current_operation()] += 1
+        return super().generate_content(prompt, stream=stream, **kwargs)
+
+
+def count_db_operations():
+    """นับทุก operation ของ collection (pymongo จริงและ mongomock) แยกตาม operation ที่ thread กำลังยิง"""
+    import pymongo.collection
+
+    classes = [pymongo.collection.Collection]
+    try:
+        import mongomock.collection
+
+        classes.append(mongomock.collection.Collection)
+    except ImportError:
+        pass
+    for cls in classes:
+        for name in DB_METHODS:
+            original = getattr(cls, name, None)
+            if original is None:
+                continue
+
+            def counted(self, *args, _original=original, **kwargs):
+                with calls_lock:
+                    db_calls[current_operation()] += 1
+                return _original(self, *args, **kwargs)
+
+            setattr(cls, name, counted)
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - set(OPERATIONS)
+    if unknown:
+        raise SystemExit(f"unknown operation(s) in --mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def load_messages():
+    with open(SAMPLE_PATH, "r", encoding="utf-8") as f:
+        return [(row["message"], row["emoji"]) for row in map(json.loads, filter(str.strip, f))]
+
+
+class VirtualUser:
+    def __init__(self, flask_app, username, messages, unique_messages):
+        self.client = flask_app.test_client()
+        self.username = username
+        self.messages = messages
+        self.unique_messages = unique_messages
+        self.sent = 0
+        self.last_analysis = None
+
+    def pick_message(self):
+        message, emoji = random.choice(self.messages)
+        if self.unique_messages:
+            # ข้อความไม่ซ้ำ = ไม่โดนแคชผลวิเคราะห์และ SingleFlight
+            self.sent += 1
+            message = f"{message} ({self.username} #{self.sent})"
+        return message, emoji
+
+    def signin(self):
+        return self.client.post("/signin", data={"username": self.username, "password": PASSWORD})
+
+    def analyze(self):
+        message, emoji = self.pick_message()
+        response = self.client.post("/analyze", json={"message": message, "emoji": emoji})
+        if response.status_code == 200:
+            self.last_analysis = response.get_json()
+        return response
+
+    def save(self):
+        entry = self.last_analysis
+        if entry is None:
+            message, emoji = self.pick_message()
+            entry = {"message": message, "emoji": emoji, "emotion": "มีความสุข", "summary": message,
+                     "emotionScore": 80}
+        self.last_analysis = None
+        return self.client.post("/save", json=entry)
+
+    def history90(self):
+        return self.client.get("/history90")
+
+    def evaluate_depression(self):
+        return self.client.post("/evaluate_depression")
+
+
+def seed_users(count, entries, messages):
+    """สร้างบัญชี bench-e2e-N พร้อมประวัติย้อนหลัง (ใช้ซ้ำข้ามระดับ concurrency)"""
+    from database import mongodb
+
+    usernames = []
+    for i in range(count):
+        username = f"bench-e2e-{i}"
+        user = common.create_user(username, PASSWORD)
+        if not mongodb.get_emotion_history(user.id):
+            today = datetime.now()
+            for day in range(entries):
+                message, emoji = messages[(i + day) % len(messages)]
+                mongodb.save_emotion_entry(user.id, {
+                    "message": message, "emoji": emoji, "emotion": "มีความสุข", "summary": message,
+                    "emotionScore": 40 + (i * 7 + day * 13) % 60,
+                    "date": (today - timedelta(days=day)).strftime("%Y-%m-%d"),
+                })
+        usernames.append(username)
+    return usernames
+
+
+def run_level(flask_app, usernames, messages, mix, duration, max_requests, unique_messages):
+    """ยิง traffic ด้วย len(usernames) thread จนครบเวลาหรือจำนวน request แล้วคืนผลของระดับนี้"""
+    names, weights = list(mix), list(mix.values())
+    latencies = defaultdict(list)
+    statuses = defaultdict(Counter)
+    results_lock = threading.Lock()
+    issued = Counter()
+    users = [VirtualUser(flask_app, username, messages, unique_messages) for username in usernames]
+    for user in users:
+        user.signin()
+    with calls_lock:
+        db_calls.clear()
+        llm_calls.clear()
+
+    deadline = time.perf_counter() + duration
+
+    def worker(user):
+        while time.perf_counter() < deadline:
+            with results_lock:
+                if max_requests and issued["total"] >= max_requests:
+                    return
+                issued["total"] += 1
+            name = random.choices(names, weights)[0]
+            current.operation = name
+            started = time.perf_counter()
+            try:
+                status = getattr(user, name)().status_code
+            except Exception as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - started
+            current.operation = "background"
+            with results_lock:
+                latencies[name].append(elapsed)
+                statuses[name][status] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(user,)) for user in users]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    operations = {}
+    for name in names:
+        values = latencies[name]
+        if not values:
+            continue
+        operations[name] = {
+            "requests": len(values),
+            "errors": sum(count for status, count in statuses[name].items()
+                          if not isinstance(status, int) or status >= 500),
+            "statuses": {str(status): count for status, count in sorted(statuses[name].items(), key=str)},
+            "p50_ms": round(common.percentile(values, 50) * 1000, 2),
+            "p95_ms": round(common.percentile(values, 95) * 1000, 2),
+            "p99_ms": round(common.percentile(values, 99) * 1000, 2),
+            "mean_ms": round(sum(values) / len(values) * 1000, 2),
+            "db_ops_per_request": round(db_calls[name] / len(values), 2),
+            "llm_calls_per_request": round(llm_calls[name] / len(values), 3),
+        }
+    total = sum(len(values) for values in latencies.values())
+    return {
+        "concurrency": len(users),
+        "requests": total,
+        "duration_s": round(elapsed, 2),
+        "throughput_rps": round(total / elapsed, 2) if elapsed else 0,
+        "operations": operations,
+        "background": {"db_ops": db_calls["background"], "llm_calls": llm_calls["background"]},
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=common.ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_level(level):
+    print(f"\nconcurrency {level['concurrency']}: {level['requests']} requests in {level['duration_s']}s "
+          f"= {level['throughput_rps']} req/s (background: {level['background']})")
+    print(f"{'operation':<20} {'n':>6} {'err':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'db/req':>7} "
+          f"{'llm/req':>8}")
+    for name, op in level["operations"].items():
+        print(f"{name:<20} {op['requests']:>6} {op['errors']:>4} {op['p50_ms']:>9.1f} {op['p95_ms']:>9.1f} "
+              f"{op['p99_ms']:>9.1f} {op['db_ops_per_request']:>7.2f} {op['llm_calls_per_request']:>8.3f}")
+
+
+def compare(report, baseline_path, tolerance):
+    """เทียบ throughput และ p95 กับผลเดิม แล้วคืนจำนวนค่าที่แย่ลงเกิน tolerance"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    previous = {level["concurrency"]: level for level in baseline["levels"]}
+    regressions = 0
+    print(f"\ncompared with {baseline.get('commit', '?')} ({baseline_path}), tolerance {tolerance:.0%}")
+    for level in report["levels"]:
+        before = previous.get(level["concurrency"])
+        if before is None:
+            continue
+        rows = [("throughput_rps", before["throughput_rps"], level["throughput_rps"], True)]
+        for name, op in level["operations"].items():
+            if name in before["operations"]:
+                rows.append((f"{name} p95_ms", before["operations"][name]["p95_ms"], op["p95_ms"], False))
+        for label, old, new, higher_is_better in rows:
+            change = (new - old) / old if old else 0
+            worse = -change if higher_is_better else change
+            flag = "  REGRESSION" if worse > tolerance else ""
+            regressions += bool(flag)
+            print(f"  c={level['concurrency']:<3} {label:<28} {old:>9.1f} -> {new:>9.1f} ({change:+.0%}){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="จำนวน virtual user")
+    parser.add_argument("--duration", type=float, default=15, help="วินาทีต่อระดับ concurrency")
+    parser.add_argument("--requests", type=int, default=0, help="จำกัดจำนวน request ต่อระดับ (0 = ตามเวลา)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="น้ำหนักของแต่ละ operation")
+    parser.add_argument("--latency", type=float, default=0.8, help="latency ของ Gemini ปลอม (วินาที)")
+    parser.add_argument("--jitter", type=float, default=0.3, help="สุ่ม latency ±สัดส่วนนี้")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="โอกาสที่ Gemini ปลอมตอบ 503")
+    parser.add_argument("--db-latency", type=float, default=0.0, help="round trip จำลองต่อ operation ของ mongomock")
+    parser.add_argument("--seed-entries", type=int, default=30, help="จำนวนประวัติเริ่มต้นต่อ user")
+    parser.add_argument("--unique-messages", action="store_true", help="ไม่ให้ข้อความซ้ำ (ปิดผลของแคช)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help=f"ไฟล์ JSON ผลลัพธ์ (ค่าเริ่มต้น {RESULTS_DIR}/e2e-<commit>.json)")
+    parser.add_argument("--compare", help="ไฟล์ JSON ผลเดิมที่จะเทียบ")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="สัดส่วนที่ถือว่าแย่ลง")
+    args = parser.parse_args()
+    random.seed(args.seed)
+    mix = parse_mix(args.mix)
+
+    import app as flask_module
+
+    flask_module.model = MixedModel(latency=args.latency, jitter=args.jitter, failure_rate=args.failure_rate)
+    messages = load_messages()
+    usernames = seed_users(max(args.concurrency), args.seed_entries, messages)
+    common.simulate_db_latency(args.db_latency)
+    count_db_operations()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "database": "mongod" if os.environ.get("BENCH_MONGODB_URI") else "mongomock",
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "levels": [],
+    }
+    for concurrency in args.concurrency:
+        level = run_level(flask_module.app, usernames[:concurrency], messages, mix, args.duration, args.requests,
+                          args.unique_messages)
+        report["levels"].append(level)
+        print_level(level)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"e2e-{report['commit']}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\nresults written to {output}")
+
+    if args.compare and compare(report, args.compare, args.tolerance):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""พฤติกรรมภายใต้ quota ของ provider: ไม่มี governor เทียบกับ ModelGovernor
+
+    python benchmarks/bench_governor.py --requests 150 --heavy-clients 24 --quota 10
+
+โมเดลปลอม (ThrottlingModel ใน tests/test_governor.py) รับได้ไม่เกิน --quota call ต่อวินาที เกินนั้นตอบ 429 ทันที
+user "heavy" ยิงพร้อมกัน --heavy-clients ตัว ส่วน user "light" ยิงทีละ request
+ดูว่า governor ลด 429 ได้แค่ไหน และ light user ยังได้คิวไม่ถูก heavy user แย่งทั้งหมด
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import common
+from tests.test_governor import ThrottlingModel  # โมเดลปลอมตัวเดียวกับที่ test ใช้ตรวจ governor
+
+
+def login(flask_app, username):
+    common.create_user(username)
+    client = flask_app.test_client()
+    client.post("/signin", data={"username": username, "password": "bench-password"})
+    return client.get_cookie("session").value
+
+
+def run(flask_app, cookies, total, heavy_clients):
+    results = {"heavy": [], "light": []}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def request(user, i):
+        client = flask_app.test_client()
+        client.set_cookie("session", cookies[user])
+        started = time.perf_counter()
+        response = client.post("/generate", json={"prompt": f"{user} {i} {time.time()}"})
+        with lock:
+            results[user].append((response.status_code, time.perf_counter() - started))
+
+    def light():
+        i = 0
+        while not stop.is_set():
+            request("light", i)
+            i += 1
+
+    light_thread = threading.Thread(target=light)
+    light_thread.start()
+    with ThreadPoolExecutor(max_workers=heavy_clients) as pool:
+        list(pool.map(lambda i: request("heavy", i), range(total)))
+    stop.set()
+    light_thread.join()
+    return results
+
+
+def summarize(label, results, model):
+    print(f"{label}: {model.calls} model calls, {model.throttled} throttled by provider")
+    for user, samples in results.items():
+        ok = [elapsed for status, elapsed in samples if status == 200]
+        statuses = {}
+        for status, _ in samples:
+            statuses[status] = statuses.get(status, 0) + 1
+        print(f"  {user:5s} {len(samples):4d} requests, {len(ok) / len(samples):6.1%} ok, "
+              f"p50 {common.percentile(ok, 50):5.2f}s p95 {common.percentile(ok, 95):5.2f}s, status {statuses}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=150)
+    parser.add_argument("--heavy-clients", type=int, default=24)
+    parser.add_argument("--quota", type=int, default=10, help="call ต่อวินาทีที่ provider ปลอมยอมรับ")
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--max-wait", type=float, default=20)
+    args = parser.parse_args()
+
+    import app as flask_module
+    from governor import ModelGovernor
+
+    cookies = {user: login(flask_module.app, user) for user in ("heavy", "light")}
+
+    model = ThrottlingModel(latency=args.latency, quota=args.quota)
+    flask_module.model = model
+    flask_module.model_governor = ModelGovernor(rate=0, max_in_flight=10 ** 6, max_queue=10 ** 6, max_retries=0)
+    summarize("no governor", run(flask_module.app, cookies, args.requests, args.heavy_clients), model)
+
+    model = ThrottlingModel(latency=args.latency, quota=args.quota)
+    flask_module.model = model
+    # ตั้ง rate ต่ำกว่า quota เล็กน้อยเผื่อ clock ของ provider ไม่ตรงกับเรา
+    flask_module.model_governor = ModelGovernor(
+        rate=args.quota * 0.9, burst=args.quota // 2 or 1, max_in_flight=max(args.quota // 2, 1),
+        max_queue=args.requests, max_wait=args.max_wait,
+    )
+    summarize("governor", run(flask_module.app, cookies, args.requests, args.heavy_clients), model)
+    print(f"  governor stats: {flask_module.model_governor.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""ขนาด prompt ของ /evaluate_depression ก่อน/หลังย่อประวัติ และ latency โดยประมาณ
+
+    python benchmarks/bench_history_prompt.py --per-day 3 6 12 --budget 6000
+
+สร้างประวัติ 90 วันแบบสุ่ม (ข้อความยาว + analysis แบบเก่า + ข้อความซ้ำบางส่วน) แล้วเทียบ
+json.dumps(indent=2) แบบเดิมกับ build_history_payload latency ประมาณจากเวลาต่อ 1k input token
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+import common  # noqa: F401  (ตั้ง sys.path)
+from history_prompt import build_history_payload
+
+MESSAGES = [
+    "วันนี้เหนื่อยมาก งานเยอะจนไม่มีเวลาพัก รู้สึกว่าไม่มีใครเข้าใจเลย",
+    "ไปกินข้าวกับเพื่อนมา สนุกดี หัวเราะทั้งวัน",
+    "นอนไม่หลับอีกแล้ว คิดมากเรื่องอนาคต ไม่รู้จะทำยังไงต่อ",
+    "ได้คะแนนสอบดีกว่าที่คิด ดีใจมาก",
+    "เบื่อ ไม่อยากทำอะไรเลย",
+]
+EMOJIS = ["😀", "😢", "😡", "😴", "😭", "🙂"]
+EMOTIONS = ["มีความสุข", "เศร้า", "โกรธ", "เหนื่อย", "กังวล"]
+
+
+def make_history(per_day, days=90, seed=1):
+    rng = random.Random(seed)
+    history = []
+    for offset in range(days):
+        date = (datetime.now() - timedelta(days=offset)).strftime("%Y-%m-%d")
+        for _ in range(rng.randint(max(per_day - 2, 1), per_day + 2)):
+            message = rng.choice(MESSAGES) * rng.randint(1, 4)
+            history.append({
+                "message": message,
+                "emoji": rng.choice(EMOJIS),
+                "date": date,
+                "emotionScore": rng.randint(0, 100),
+                "emotion": rng.choice(EMOTIONS),
+                "summary": message[:80],
+                "analysis": ("ผลวิเคราะห์แบบเก่า " * 20) if rng.random() < 0.3 else "",
+            })
+    return history
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--per-day", type=int, nargs="+", default=[1, 3, 6, 12])
+    parser.add_argument("--budget", type=int, default=6000)
+    parser.add_argument("--recent-days", type=int, default=14)
+    parser.add_argument("--ms-per-1k-tokens", type=float, default=60, help="เวลาประมวลผล input ต่อ 1k token")
+    args = parser.parse_args()
+
+    print(f"budget {args.budget} tokens, recent {args.recent_days} days, {args.ms_per_1k_tokens}ms per 1k input tokens")
+    for per_day in args.per_day:
+        history = make_history(per_day)
+        started = time.perf_counter()
+        payload, report = build_history_payload(history, args.budget, args.recent_days)
+        build_ms = (time.perf_counter() - started) * 1000
+        json.loads(payload)
+        before_ms = report["before_tokens"] / 1000 * args.ms_per_1k_tokens
+        after_ms = report["after_tokens"] / 1000 * args.ms_per_1k_tokens
+        print(f"{per_day:3d}/day {report['entries']:5d} entries: "
+              f"{report['before_chars']:8,d} -> {report['after_chars']:6,d} chars, "
+              f"~{report['before_tokens']:7,d} -> ~{report['after_tokens']:5,d} tokens "
+              f"({report['recent_entries']} recent, {report['daily_aggregates']} daily, "
+              f"{report['duplicates_merged']} merged), build {build_ms:.1f}ms, "
+              f"input latency ~{before_ms:.0f}ms -> ~{after_ms:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""ความแม่นยำเทียบกับ latency ของ local_scorer บนชุดข้อความที่ติด label ไว้ ใช้เลือก LOCAL_SCORER_THRESHOLD
+
+    python benchmarks/bench_local_scorer.py --thresholds 0.5 0.6 0.7 0.8 0.9 --llm-latency 1.2
+
+ต่อ threshold รายงาน: สัดส่วนที่ตอบเองได้ (= call ของ Gemini ที่ประหยัดได้), ความแม่นยำของ emotion
+และ MAE ของ emotionScore เฉพาะข้อที่ตอบเอง และ latency เฉลี่ยต่อข้อความเมื่อข้อที่เหลือไปรอ Gemini
+ท้ายรายงานเทียบเวลา score() ทีละข้อความกับ score_batch() แบบ NumPy (ที่ reanalysis.py ใช้)
+"""
+import argparse
+import json
+import os
+import time
+
+import common  # noqa: F401  (ตั้ง sys.path)
+from local_scorer import scorer
+
+SAMPLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "emotion_sample.jsonl")
+
+
+def load_sample(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sample", default=SAMPLE_PATH, help="JSONL ที่มี message, emoji, emotion, emotionScore")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=[0.5, 0.6, 0.7, 0.8, 0.9])
+    parser.add_argument("--llm-latency", type=float, default=1.2, help="เวลาต่อ call ของ Gemini (วินาที)")
+    parser.add_argument("--batch-copies", type=int, default=200, help="ขยายชุดข้อมูลกี่เท่าสำหรับวัดเวลา batch")
+    parser.add_argument("--show-misses", action="store_true", help="แสดงข้อที่ตอบเองแล้วผิด")
+    args = parser.parse_args()
+
+    sample = load_sample(args.sample)
+    messages = [row["message"] for row in sample]
+    emojis = [row["emoji"] for row in sample]
+    results = scorer.score_batch(messages, emojis)
+
+    print(f"{len(sample)} labeled messages, Gemini latency {args.llm_latency}s")
+    print("threshold  local   emotion acc  score MAE  avg latency")
+    for threshold in args.thresholds:
+        covered = [(row, result) for row, result in zip(sample, results) if result["confidence"] >= threshold]
+        coverage = len(covered) / len(sample)
+        if covered:
+            accuracy = sum(result["emotion"] == row["emotion"] for row, result in covered) / len(covered)
+            mae = sum(abs(result["emotionScore"] - row["emotionScore"]) for row, result in covered) / len(covered)
+            quality = f"{accuracy:10.0%}  {mae:9.1f}"
+        else:
+            quality = f"{'-':>10}  {'-':>9}"
+        latency = (1 - coverage) * args.llm_latency
+        print(f"{threshold:9.2f}  {coverage:5.0%}  {quality}  {latency:9.2f}s")
+        if args.show_misses:
+            for row, result in covered:
+                if result["emotion"] != row["emotion"]:
+                    print(f"           ✗ {row['message'][:40]!r} {row['emoji']} -> {result['emotion']} "
+                          f"(label {row['emotion']}, confidence {result['confidence']})")
+
+    started = time.perf_counter()
+    for message, emoji in zip(messages, emojis):
+        scorer.score(message, emoji)
+    single_us = (time.perf_counter() - started) / len(sample) * 1e6
+
+    batch_messages, batch_emojis = messages * args.batch_copies, emojis * args.batch_copies
+    started = time.perf_counter()
+    scorer.score_batch(batch_messages, batch_emojis)
+    batch_us = (time.perf_counter() - started) / len(batch_messages) * 1e6
+    print(f"score():       {single_us:7.1f}µs per message")
+    print(f"score_batch(): {batch_us:7.1f}µs per message ({len(batch_messages)} messages)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""เวลาสร้าง response ของประวัติ 90 วัน: ทางเดิม (ทุก field + แปลงทีละ entry + json) เทียบกับ projection + serializer.py
+
+    python benchmarks/bench_serializer.py --per-day 20 --repeat 50
+
+ข้อมูลสังเคราะห์ 90 วัน × --per-day entry เป็นเอกสารแบบที่ save_emotion_entry บันทึก (ObjectId, created_at, user_id, ...)
+- /history90: เดิม = เอกสารเต็มผ่าน DefaultJSONProvider ของ Flask (sort_keys, ensure_ascii)
+  ใหม่ = เฉพาะ HISTORY90_FIELDS ผ่าน serializer.dumps_bytes
+- evaluate: เดิม = loop safe_entry + build_history_payload, ใหม่ = เฉพาะ EVALUATE_HISTORY_FIELDS ส่งเข้า build_history_payload ตรง ๆ
+ทางใหม่วัดทั้ง backend json และ orjson (ถ้าติดตั้งไว้) รายงาน ms ต่อ response และขนาด body
+--db วัด get_emotion_history (MongoDB จำลองหรือ BENCH_MONGODB_URI) แบบไม่มีและมี projection เพิ่ม
+"""
+import argparse
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+import common  # noqa: F401  (ตั้ง sys.path)
+import serializer
+from app import EVALUATE_HISTORY_FIELDS, HISTORY90_FIELDS
+from history_prompt import build_history_payload
+
+EMOTIONS = [("มีความสุข", "😀", 85), ("เศร้า", "😢", 25), ("เครียด", "😞", 35), ("เฉย ๆ", "😐", 55)]
+MESSAGES = ["วันนี้ทำงานทั้งวันเหนื่อยมาก", "ได้กินข้าวกับเพื่อนสนุกดี", "นอนไม่หลับเลยทั้งคืน คิดเรื่องงาน",
+            "ออกไปวิ่งตอนเย็น อากาศดี", "ประชุมยาวจนปวดหัว"]
+
+
+def make_history(days, per_day, user_id="bench-user"):
+    """เอกสารเต็มเรียงใหม่ไปเก่า เหมือน find() ที่ไม่มี projection"""
+    rng = random.Random(7)
+    now = datetime.utcnow()
+    history = []
+    for day in range(days):
+        date = (now - timedelta(days=day)).strftime("%Y-%m-%d")
+        for i in range(per_day):
+            emotion, emoji, score = rng.choice(EMOTIONS)
+            message = rng.choice(MESSAGES)
+            history.append({
+                "_id": ObjectId(),
+                "date": date,
+                "message": message,
+                "emoji": emoji,
+                "emotion": emotion,
+                "summary": message[:20],
+                "emotionScore": score + rng.randint(-10, 10),
+                "promptVersion": "analyze@b1db4b2e6f97",
+                "user_id": user_id,
+                "created_at": now - timedelta(days=day, minutes=i * 7),
+            })
+    return history
+
+
+def project(history, fields):
+    return [{field: entry[field] for field in fields if field in entry} for entry in history]
+
+
+def legacy_safe_history(history):
+    """loop เดิมใน evaluate_depression_flow ก่อนส่งเข้า build_history_payload"""
+    safe_history = []
+    for entry in history:
+        if not isinstance(entry, dict):
+            continue
+        date_value = entry.get('date')
+        if isinstance(date_value, datetime):
+            date_value = date_value.strftime("%Y-%m-%d")
+        elif date_value is None:
+            date_value = datetime.now().strftime("%Y-%m-%d")
+        safe_history.append({
+            'message': str(entry.get('message', '')),
+            'emoji': str(entry.get('emoji', '')),
+            'date': str(date_value),
+            'emotionScore': int(entry.get('emotionScore', 0)) if isinstance(entry.get('emotionScore'), (int, float)) else 0,
+            'emotion': str(entry.get('emotion', 'N/A')),
+            'summary': str(entry.get('summary', 'N/A')),
+            'analysis': str(entry.get('analysis', '')),
+        })
+    return safe_history
+
+
+def timed(fn, repeat):
+    fn()  # warm-up
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - started) / repeat * 1000, result
+
+
+def with_backend(backend, fn):
+    def run():
+        previous, serializer.BACKEND = serializer.BACKEND, backend
+        try:
+            return fn()
+        finally:
+            serializer.BACKEND = previous
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--per-day", type=int, default=20, help="entry ต่อวัน")
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--db", action="store_true", help="วัด get_emotion_history กับ MongoDB ด้วย")
+    args = parser.parse_args()
+
+    history = make_history(args.days, args.per_day)
+    without_id = [{key: value for key, value in entry.items() if key != "_id"} for entry in history]
+    flask_json = DefaultJSONProvider(Flask("bench"))
+    backends = ["json"] + (["orjson"] if serializer.orjson else [])
+
+    rows = [(
+        "/history90  legacy (all fields, Flask json)",
+        lambda: flask_json.dumps({"history90": without_id, "averageScore": 55.0, "risk": "ต่ำ"},
+                                 separators=(",", ":")).encode("utf-8"),
+    )]
+    projected = project(history, HISTORY90_FIELDS)
+    for backend in backends:
+        rows.append((f"/history90  projected + {backend}", with_backend(backend, lambda: serializer.dumps_bytes(
+            {"history90": projected, "averageScore": 55.0, "risk": "ต่ำ"}))))
+    rows.append(("evaluate    legacy (safe_entry loop)",
+                 with_backend("json", lambda: build_history_payload(legacy_safe_history(without_id))[0])))
+    evaluate_projected = project(history, EVALUATE_HISTORY_FIELDS)
+    for backend in backends:
+        rows.append((f"evaluate    projected + {backend}",
+                     with_backend(backend, lambda: build_history_payload(evaluate_projected)[0])))
+
+    print(f"{len(history)} entries ({args.days} days × {args.per_day}), {args.repeat} runs each, "
+          f"serializer default backend: {serializer.BACKEND}")
+    print(f"{'path':<44} {'ms':>8} {'bytes':>10}")
+    baseline = {}
+    for name, fn in rows:
+        ms, body = timed(fn, args.repeat)
+        size = len(body if isinstance(body, bytes) else body.encode("utf-8"))
+        kind = name.split()[0]
+        baseline.setdefault(kind, ms)
+        print(f"{name:<44} {ms:8.2f} {size:10d}  ×{baseline[kind] / ms:.1f}")
+
+    if args.db:
+        from database import mongodb
+
+        collection = mongodb.db.emotion_history
+        collection.delete_many({"user_id": "bench-user"})
+        collection.insert_many([dict(entry) for entry in history])
+        print(f"\nget_emotion_history ({len(history)} entries)")
+        for name, fields in (("all fields", None), ("HISTORY90_FIELDS", HISTORY90_FIELDS)):
+            ms, result = timed(lambda: mongodb.get_emotion_history("bench-user", days=args.days, fields=fields),
+                               max(args.repeat // 5, 1))
+            print(f"  {name:<20} {ms:8.2f} ms  {len(json.dumps(result, default=str).encode('utf-8')):10d} bytes")
+        collection.delete_many({"user_id": "bench-user"})
+
+
+if __name__ == "__main__":
+    main()
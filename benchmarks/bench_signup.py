@@ -0,0 +1,81 @@
+"""สมัครสมาชิกพร้อมกันหลาย thread แล้วตรวจว่า user_id ไม่ซ้ำและ latency ไม่โตตามจำนวน user
+
+    python benchmarks/bench_signup.py --users 2000 --threads 16
+
+latency ของการจอง ID (next_user_id) แยกรายงานจาก User.create ทั้งก้อน เพราะ mongomock
+ไม่มี index จริง การเช็ก username ซ้ำจึงยังเป็น linear scan ในโหมดนี้
+find_one_and_update ของ mongomock ไม่ atomic ข้าม thread จึงจอง ID ทีละ thread (lock) ในโหมดนี้
+ตัวเลขการแข่งกันจองจริงต้องวัดกับ mongod (BENCH_MONGODB_URI)
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import common
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--existing", type=int, default=50, help="user เดิม (ID แบบ string ตัวเลข) ก่อนเริ่ม")
+    args = parser.parse_args()
+
+    import werkzeug.security
+    from database import mongodb
+    from models import User
+
+    # ตัด pbkdf2 ออกเพื่อให้วัดเฉพาะงานฝั่งฐานข้อมูล
+    werkzeug.security.generate_password_hash = lambda password, method=None: "hash"
+
+    mongodb.db.users.insert_many([
+        {"user_id": str(i), "username": f"legacy{i}", "password": "hash"} for i in range(1, args.existing + 1)
+    ])
+
+    allocate = mongodb.next_user_id
+    allocation_latencies = []
+    lock = None if os.environ.get("BENCH_MONGODB_URI") else threading.Lock()
+
+    def timed_allocate():
+        started = time.perf_counter()
+        if lock:
+            with lock:
+                user_id = allocate()
+        else:
+            user_id = allocate()
+        allocation_latencies.append(time.perf_counter() - started)
+        return user_id
+
+    mongodb.next_user_id = timed_allocate
+
+    def signup(i):
+        started = time.perf_counter()
+        user = User.create(f"stress{i}", "password")
+        return user.id if user else None, time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.threads) as pool:
+        results = list(pool.map(signup, range(args.users)))
+    elapsed = time.perf_counter() - started
+
+    ids = [user_id for user_id, _ in results]
+    latencies = [latency for _, latency in results]
+    decile = max(1, len(latencies) // 10)
+    all_ids = [u["user_id"] for u in mongodb.db.users.find({}, {"user_id": 1})]
+
+    print(f"signups: {args.users} on {args.threads} threads in {elapsed:.2f}s ({args.users / elapsed:.0f}/s)")
+    print(f"failed: {ids.count(None)}, duplicate IDs: {len(all_ids) - len(set(all_ids))}")
+    print(f"ID range: {min(map(int, filter(None, ids)))}..{max(map(int, filter(None, ids)))}")
+    for name, values in (("User.create", latencies), ("next_user_id", allocation_latencies)):
+        print(f"{name:>12} median latency first 10%: {statistics.median(values[:decile]) * 1000:.2f} ms, "
+              f"last 10%: {statistics.median(values[-decile:]) * 1000:.2f} ms")
+    if None in ids or len(all_ids) != len(set(all_ids)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""เปรียบเทียบการคำนวณสถิติ 90 วัน 3 แบบบนข้อมูลสังเคราะห์
+
+    python benchmarks/bench_stats.py --entries 10000
+    MONGODB_URI=mongodb://localhost:27017/kanrawee_bench python benchmarks/bench_stats.py --entries 1000000 --real
+
+- python: find() ทั้งหมดแล้วนับใน Python (วิธีเดิมของ get_user_stats)
+- aggregate: get_user_stats_aggregate (aggregation pipeline ฝั่งเซิร์ฟเวอร์)
+- daily: get_user_stats จาก user_daily_stats
+
+mongomock รัน pipeline ด้วย Python จึงไม่สะท้อนความเร็วของ aggregate จริง ให้ใช้ --real กับ mongod
+เมื่อต้องการวัด network transfer/CPU ฝั่งแอปตามจริง
+"""
+import argparse
+import random
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+if "--real" not in sys.argv:
+    import common  # noqa: F401  (ใช้ mongomock)
+else:
+    import os
+
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+EMOTIONS = ["มีความสุข", "เศร้า", "โกรธ", "เครียด", "เฉยๆ", "ตื่นเต้น"]
+EMOJIS = ["😀", "😢", "😡", "😰", "😐", "🤩"]
+
+
+def python_stats(collection, user_id, days):
+    start_date_str = (datetime.now() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+    history = list(collection.find({"user_id": user_id, "date": {"$gte": start_date_str}}, {"_id": 0}))
+    scores = [e["emotionScore"] for e in history if isinstance(e.get("emotionScore"), (int, float))]
+    emotions = Counter(e["emotion"] for e in history if e.get("emotion"))
+    return {
+        "total_entries": len(history),
+        "average_score": round(sum(scores) / len(scores), 2) if scores else 0,
+        "highest_score": max(scores) if scores else 0,
+        "lowest_score": min(scores) if scores else 0,
+        "days_with_entries": len({e["date"] for e in history if e.get("date")}),
+        "most_common_emotion": emotions.most_common(1)[0][0] if emotions else "N/A",
+    }
+
+
+def seed(db, user_id, entries, batch_size=10000):
+    rng = random.Random(42)
+    today = datetime.now()
+    db.emotion_history.delete_many({"user_id": user_id})
+    db.user_daily_stats.delete_many({"user_id": user_id})
+    batch = []
+    for _ in range(entries):
+        index = rng.randrange(len(EMOTIONS))
+        batch.append({
+            "user_id": user_id,
+            "date": (today - timedelta(days=rng.randrange(120))).strftime("%Y-%m-%d"),
+            "message": "ข้อความทดสอบ " * rng.randint(1, 10),
+            "emoji": EMOJIS[index],
+            "emotion": EMOTIONS[index],
+            "summary": "สรุปทดสอบ",
+            "emotionScore": rng.randint(0, 100),
+            "created_at": datetime.utcnow(),
+        })
+        if len(batch) >= batch_size:
+            db.emotion_history.insert_many(batch)
+            batch = []
+    if batch:
+        db.emotion_history.insert_many(batch)
+
+
+def timed(fn, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=10000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--real", action="store_true", help="ใช้ MONGODB_URI จริงแทน mongomock")
+    args = parser.parse_args()
+
+    from database import mongodb
+
+    user_id = "bench-stats"
+    seed(mongodb.db, user_id, args.entries)
+    mongodb.rebuild_daily_stats(user_id)
+
+    paths = {
+        "python": lambda: python_stats(mongodb.db.emotion_history, user_id, args.days),
+        "aggregate": lambda: mongodb.get_user_stats_aggregate(user_id, args.days),
+        "daily": lambda: mongodb.get_user_stats(user_id, args.days),
+    }
+    print(f"entries: {args.entries}, window: {args.days} days")
+    baseline = None
+    for name, fn in paths.items():
+        elapsed, result = timed(fn, args.repeat)
+        baseline = baseline or elapsed
+        print(f"{name:>9}: {elapsed * 1000:9.1f} ms  ({baseline / elapsed:5.1f}x)  {result}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""เวลาจนเห็นผลแรก (time to first field) ของ /evaluate_depression เทียบกับ /evaluate_depression/stream
+
+    python benchmarks/bench_streaming.py --latency 4 --runs 5
+
+โมเดลปลอมสร้าง JSON ผลประเมินทีละ chunk ใช้เวลารวม --latency วินาที
+แบบเดิมต้องรอจน response ครบ แบบ stream เห็น risk ตั้งแต่ chunk แรก ๆ
+"""
+import argparse
+import json
+import time
+
+import common
+
+EVALUATION = json.dumps({
+    "risk": "ปานกลาง",
+    "reason": "ข้อความช่วงหลังมีความเหนื่อยล้าและนอนไม่หลับซ้ำ ๆ คะแนนอารมณ์เฉลี่ยลดลงต่อเนื่อง " * 3,
+    "advice": "ลองพูดคุยกับคนที่ไว้ใจ และติดต่อสายด่วนสุขภาพจิต 1323 หากรู้สึกแย่ลง " * 2,
+}, ensure_ascii=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=4.0)
+    parser.add_argument("--chunks", type=int, default=20)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    import app as flask_module
+    from database import mongodb
+
+    flask_module.model = common.FakeModel(latency=args.latency, text=EVALUATION, chunks=args.chunks)
+    common.create_user()
+    client = flask_module.app.test_client()
+    client.post("/signin", data={"username": "bench", "password": "bench-password"})
+    client.post("/save", json={"message": "เหนื่อยมาก", "emoji": "😢", "emotionScore": 30, "emotion": "เหนื่อย"})
+
+    def reset_cached_result():
+        mongodb.db.user_evaluations.update_many({}, {"$unset": {"result": ""}})
+
+    buffered, first_fields, streamed = [], [], []
+    for _ in range(args.runs):
+        reset_cached_result()
+        started = time.perf_counter()
+        response = client.post("/evaluate_depression")
+        assert response.status_code == 200, response.get_data(as_text=True)
+        buffered.append(time.perf_counter() - started)
+
+        reset_cached_result()
+        started = time.perf_counter()
+        response = client.post("/evaluate_depression/stream", buffered=False)
+        first_field = None
+        for part in response.response:
+            if first_field is None and b"event: field" in part:
+                first_field = time.perf_counter() - started
+        first_fields.append(first_field)
+        streamed.append(time.perf_counter() - started)
+
+    print(f"model: {args.latency}s over {args.chunks} chunks, {args.runs} runs (median)")
+    print(f"/evaluate_depression         first result {common.percentile(buffered, 50):.2f}s, "
+          f"total {common.percentile(buffered, 50):.2f}s")
+    print(f"/evaluate_depression/stream  first field  {common.percentile(first_fields, 50):.2f}s, "
+          f"total {common.percentile(streamed, 50):.2f}s")
+
+
+if __name__ == "__main__":
+    main()
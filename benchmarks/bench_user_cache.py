@@ -0,0 +1,50 @@
+"""วัด latency ของ request ที่ล็อกอินแล้ว (/history90) เมื่อเปิด/ปิดแคช user ของ user_loader
+
+    python benchmarks/bench_user_cache.py --requests 300 --db-latency 0.005
+"""
+import argparse
+import statistics
+import time
+
+import common
+
+
+def run(client, total):
+    latencies = []
+    for _ in range(total):
+        started = time.perf_counter()
+        client.get("/history90")
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--db-latency", type=float, default=0.005, help="round trip จำลองต่อ operation (วินาที)")
+    args = parser.parse_args()
+
+    import app as flask_module
+    from database import mongodb
+
+    common.create_user()
+    client = flask_module.app.test_client()
+    client.post("/signin", data={"username": "bench", "password": "bench-password"})
+    common.simulate_db_latency(args.db_latency)
+
+    ttl = mongodb.user_cache.ttl_seconds
+    mongodb.user_cache.ttl_seconds = 0  # หมดอายุทันที = ไม่มีแคช
+    without_cache = run(client, args.requests)
+
+    mongodb.user_cache.ttl_seconds = ttl
+    mongodb.user_cache.clear()
+    with_cache = run(client, args.requests)
+
+    for name, values in (("without cache", without_cache), ("with cache", with_cache)):
+        print(f"{name:>14}: median {statistics.median(values) * 1000:7.2f} ms, "
+              f"p95 {common.percentile(values, 95) * 1000:7.2f} ms")
+    print(f"user cache: {mongodb.user_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
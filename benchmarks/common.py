@@ -0,0 +1,120 @@
+"""ตัวช่วยร่วมของ benchmark: MongoDB จำลอง (mongomock) และโมเดล Gemini ปลอมที่มี latency
+
+ต้อง import โมดูลนี้ก่อน app/database เสมอ: database.py ทำ `from pymongo import MongoClient` ตอน import
+จึงต้องแทน pymongo.MongoClient ด้วย mongomock ก่อนหน้านั้น (การเชื่อมต่อจริงเกิดตอนใช้งานครั้งแรก)
+และ app อ่านค่า environment อย่าง GEMINI_API_KEY ตั้งแต่ตอน import
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+os.environ.setdefault("MONGODB_URI", "mongodb://localhost:27017/kanrawee_db")
+os.environ.setdefault("GEMINI_API_KEY", "benchmark-fake-key")
+
+# BENCH_MONGODB_URI=mongodb://localhost:27017/moodmate_bench = วัดกับ mongod จริงแทน mongomock
+if os.environ.get("BENCH_MONGODB_URI"):
+    os.environ["MONGODB_URI"] = os.environ["BENCH_MONGODB_URI"]
+else:
+    try:
+        import mongomock
+        import pymongo
+
+        pymongo.MongoClient = mongomock.MongoClient
+    except ImportError:
+        print("mongomock not installed: benchmarks will use the real MONGODB_URI")
+
+ANALYZE_RESULT = '```json\n{"emotion": "มีความสุข", "summary": "ทดสอบ", "emotionScore": 80}\n```'
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeProviderError(Exception):
+    """จำลอง error 5xx/429 ของ Gemini (governor ลองใหม่ตาม .code)"""
+
+    def __init__(self, code=503):
+        super().__init__(f"fake provider error {code}")
+        self.code = code
+
+
+class FakeModel:
+    """แทน genai.GenerativeModel: หน่วงเวลาตาม latency แล้วคืน JSON คงที่
+
+    jitter = สุ่ม latency เพิ่ม/ลดได้ถึงสัดส่วนนี้, failure_rate = โอกาสที่ call จะ raise FakeProviderError
+    """
+
+    def __init__(self, latency=0.5, text=ANALYZE_RESULT, chunks=8, jitter=0.0, failure_rate=0.0):
+        self.latency = latency
+        self.text = text
+        self.chunks = chunks
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.calls = 0
+
+    def _wait(self):
+        delay = self.latency * (1 + random.uniform(-self.jitter, self.jitter)) if self.jitter else self.latency
+        time.sleep(delay)
+        if self.failure_rate and random.random() < self.failure_rate:
+            raise FakeProviderError()
+
+    def respond(self, prompt):
+        """ข้อความตอบกลับของ prompt (subclass เปลี่ยนตามชนิด prompt ได้)"""
+        return self.text
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        self.calls += 1
+        if stream:
+            return self._stream(self.respond(prompt))
+        self._wait()
+        return FakeResponse(self.respond(prompt))
+
+    def _stream(self, text):
+        """stream=True: แบ่งข้อความเป็น chunks ส่วน latency กระจายเท่า ๆ กันระหว่าง chunk"""
+        size = -(-len(text) // self.chunks)
+        for start in range(0, len(text), size):
+            time.sleep(self.latency / self.chunks)
+            yield FakeResponse(text[start:start + size])
+
+    async def generate_content_async(self, prompt, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return FakeResponse(self.respond(prompt))
+
+
+def simulate_db_latency(seconds):
+    """หน่วงทุก operation ของ mongomock เพื่อจำลอง round trip ไปยัง MongoDB Atlas"""
+    if seconds <= 0:
+        return
+    import mongomock.collection
+
+    for name in ("find", "find_one", "insert_one", "insert_many", "update_one",
+                 "find_one_and_update", "aggregate", "bulk_write", "replace_one"):
+        original = getattr(mongomock.collection.Collection, name)
+
+        def delayed(self, *args, _original=original, **kwargs):
+            time.sleep(seconds)
+            return _original(self, *args, **kwargs)
+
+        setattr(mongomock.collection.Collection, name, delayed)
+
+
+def create_user(username="bench", password="bench-password"):
+    from models import User
+
+    return User.get_by_username(username) or User.create(username, password)
+
+
+def percentile(values, pct):
+    if not values:
+        return 0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
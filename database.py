@@ -1,28 +1,347 @@
 import os
+import threading
+import time
 from datetime import datetime, timedelta
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure, OperationFailure
+from pymongo import MongoClient, ASCENDING, DESCENDING, ReturnDocument, monitoring
+from pymongo.errors import BulkWriteError, ConnectionFailure, DuplicateKeyError, OperationFailure
 from dotenv import load_dotenv
 import urllib.parse
+import base64
+import json
+from bson import ObjectId
+from llm_cache import ResponseCache
+from log import get_logger
+from metrics import ERRORS, MONGODB_SECONDS
 
 load_dotenv()
 
+logger = get_logger("database")
+
+# จำนวนครั้งที่ create_user ลองจอง user_id ใหม่เมื่อ ID ชนกับ user เดิม
+USER_ID_ATTEMPTS = 5
+
+# index ที่ทุก query หลักต้องใช้: collection -> [(keys, options)]
+# ensure_indexes() สร้างให้ตอนเชื่อมต่อ (create_index ไม่ทำอะไรถ้ามีอยู่แล้ว)
+INDEXES = {
+    "emotion_history": [
+        # created_at อยู่ใน index ด้วยเพื่อให้ keyset pagination (date, created_at) ไม่ต้อง sort ในหน่วยความจำ
+        ([("user_id", ASCENDING), ("date", DESCENDING), ("created_at", DESCENDING)], {"name": "user_id_date_created_at"}),
+    ],
+    "users": [
+        ([("username", ASCENDING)], {"name": "username_unique", "unique": True}),
+        ([("user_id", ASCENDING)], {"name": "user_id_unique", "unique": True}),
+    ],
+    "user_daily_stats": [
+        ([("user_id", ASCENDING), ("date", DESCENDING)], {"name": "user_id_date_unique", "unique": True}),
+    ],
+    "user_evaluations": [
+        ([("user_id", ASCENDING)], {"name": "user_id_unique", "unique": True}),
+    ],
+    "llm_jobs": [
+        # worker หยิบงานที่ถึงเวลาแล้วเรียงตาม visible_at
+        ([("status", ASCENDING), ("visible_at", ASCENDING)], {"name": "status_visible_at"}),
+        # งานที่เสร็จแล้วมี expires_at (งานที่ยังไม่เสร็จไม่มี field นี้จึงไม่ถูกลบ)
+        ([("expires_at", ASCENDING)], {"name": "expires_at_ttl", "expireAfterSeconds": 0}),
+    ],
+    "llm_cache": [
+        ([("expires_at", ASCENDING)], {"name": "expires_at_ttl", "expireAfterSeconds": 0}),
+    ],
+}
+
+# ชื่ออารมณ์/อีโมจิถูกใช้เป็นชื่อ field ใน user_daily_stats จึงต้องเลี่ยง "." และ "$" นำหน้า
+_FIELD_ESCAPES = {".": "\uff0e", "$": "\uff04"}
+
+def stats_field_name(label):
+    name = str(label).replace(".", _FIELD_ESCAPES["."])
+    if name.startswith("$"):
+        name = _FIELD_ESCAPES["$"] + name[1:]
+    return name
+
+def stats_field_label(name):
+    label = name.replace(_FIELD_ESCAPES["."], ".")
+    if label.startswith(_FIELD_ESCAPES["$"]):
+        label = "$" + label[1:]
+    return label
+
+def daily_stats_update(entry_data):
+    """คืน (filter, update) สำหรับเพิ่ม entry หนึ่งรายการเข้า user_daily_stats"""
+    inc = {"entries": 1}
+    update = {"$inc": inc, "$set": {"updated_at": datetime.utcnow()}}
+
+    score = entry_data.get("emotionScore")
+    if isinstance(score, (int, float)) and not isinstance(score, bool):
+        inc["score_sum"] = score
+        inc["score_count"] = 1
+        update["$min"] = {"min_score": score}
+        update["$max"] = {"max_score": score}
+
+    if entry_data.get("emotion"):
+        inc[f"emotions.{stats_field_name(entry_data['emotion'])}"] = 1
+    if entry_data.get("emoji"):
+        inc[f"emojis.{stats_field_name(entry_data['emoji'])}"] = 1
+
+    return {"user_id": entry_data["user_id"], "date": entry_data.get("date")}, update
+
+def merge_daily_stats_updates(entries):
+    """รวม update ของหลาย entry ที่ตกวันเดียวกันให้เหลือ 1 update ต่อ (user_id, date)"""
+    merged = {}
+    for entry in entries:
+        stats_filter, update = daily_stats_update(entry)
+        key = (stats_filter["user_id"], stats_filter["date"])
+        if key not in merged:
+            merged[key] = (stats_filter, update)
+            continue
+        current = merged[key][1]
+        for field, value in update["$inc"].items():
+            current["$inc"][field] = current["$inc"].get(field, 0) + value
+        for op, pick in (("$min", min), ("$max", max)):
+            for field, value in update.get(op, {}).items():
+                current.setdefault(op, {})
+                current[op][field] = pick(current[op].get(field, value), value)
+    return list(merged.values())
+
+# field ของ entry ที่ daily_stats_update ใช้ (โหลดเท่านี้ตอน backfill)
+DAILY_STATS_FIELDS = ("date", "emotionScore", "emotion", "emoji")
+
+def daily_stats_document(stats_filter, update):
+    """แปลง (filter, update) จาก merge_daily_stats_updates เป็นเอกสาร user_daily_stats ทั้งก้อน (ใช้กับ replace_one)"""
+    document = dict(stats_filter, updated_at=update["$set"]["updated_at"])
+    for field, value in update["$inc"].items():
+        parent, _, child = field.partition(".")
+        if child:
+            document.setdefault(parent, {})[child] = value
+        else:
+            document[field] = value
+    for op in ("$min", "$max"):
+        document.update(update.get(op, {}))
+    return document
+
+def history_fingerprint_update(user_id, count, last_entry_at):
+    """คืน (filter, update) ที่เลื่อน fingerprint ประวัติของ user (จำนวน entry + created_at ล่าสุด)
+
+    ผลประเมินใน user_evaluations ใช้ได้ต่อเมื่อ fingerprint ยังตรงกับตอนที่ประเมิน
+    """
+    return {"user_id": str(user_id)}, {"$inc": {"entries": count}, "$max": {"last_entry_at": last_entry_at}}
+
+def encode_history_cursor(entry):
+    """สร้าง cursor ของหน้าถัดไปจาก entry สุดท้าย (keyset: date, created_at, _id)"""
+    created_at = entry.get("created_at")
+    payload = {
+        "d": entry.get("date"),
+        "c": created_at.isoformat() if isinstance(created_at, datetime) else None,
+        "i": str(entry["_id"]),
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload).encode("utf-8")).decode("ascii")
+
+def decode_history_cursor(cursor):
+    """แปลง cursor กลับเป็น (date, created_at, _id); ถ้า cursor ไม่ถูกต้องจะ raise ValueError"""
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        created_at = datetime.fromisoformat(payload["c"]) if payload.get("c") else None
+        return payload["d"], created_at, ObjectId(payload["i"])
+    except Exception as e:
+        raise ValueError(f"Invalid history cursor: {e}") from e
+
+class DatabaseUnavailableError(Exception):
+    """ติดต่อ MongoDB ไม่ได้ (ต่างจากหาข้อมูลไม่พบ) route ควรตอบ 503 แทนการทำเหมือนไม่มีข้อมูล"""
+
+def duplicate_key_field(error):
+    """field แรกของ unique index ที่ชนจาก DuplicateKeyError (None ถ้า server ไม่บอก keyPattern เช่น mongomock)"""
+    key_pattern = (error.details or {}).get("keyPattern") or {}
+    return next(iter(key_pattern), None)
+
+def db_error(operation, action, error, component="mongodb"):
+    """log error ของ method ใน MongoDB แล้วนับใน moodmate_errors_total"""
+    logger.error("❌ Error %s: %s", action, error)
+    ERRORS.inc(component=component, operation=operation)
+
+def plan_stages(plan):
+    """ดึงชื่อ stage ทั้งหมดจาก winningPlan ของ explain() (รวม inputStage ที่ซ้อนกัน)"""
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        # รูปแบบ explain ของ MongoDB 7+ (slot-based engine) ห่อ plan ไว้ใน queryPlan
+        for key in ("queryPlan", "inputStage"):
+            stages.extend(plan_stages(plan.get(key)))
+        for child in plan.get("inputStages", []):
+            stages.extend(plan_stages(child))
+    return stages
+
+class CommandTimer(monitoring.CommandListener):
+    """จับเวลาทุกคำสั่งที่ส่งถึง MongoDB (find, insert, update, aggregate, ...) ลง metrics"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGODB_SECONDS.observe(event.duration_micros / 1e6, command=event.command_name, outcome="ok")
+
+    def failed(self, event):
+        MONGODB_SECONDS.observe(event.duration_micros / 1e6, command=event.command_name, outcome="error")
+        ERRORS.inc(component="mongodb", operation=event.command_name)
+
+class PoolStats(monitoring.ConnectionPoolListener):
+    """นับการยืม/คืน connection ของ pool และเวลาที่ต้องรอ connection (ใช้ประกอบการเลือกจำนวน worker)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.checked_out = 0
+            self.max_checked_out = 0
+            self.checkouts = 0
+            self.checkout_failures = {}
+            self.wait_ms_sum = 0.0
+            self.max_wait_ms = 0.0
+            self.created = 0
+            self.closed = 0
+            self.cleared = 0
+
+    # checkout เริ่มและจบใน thread เดียวกัน จึงจับเวลาด้วย thread-local
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_checked_out(self, event):
+        wait_ms = (time.perf_counter() - getattr(self._local, "started", time.perf_counter())) * 1000
+        with self._lock:
+            self.checked_out += 1
+            self.max_checked_out = max(self.max_checked_out, self.checked_out)
+            self.checkouts += 1
+            self.wait_ms_sum += wait_ms
+            self.max_wait_ms = max(self.max_wait_ms, wait_ms)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            self.checkout_failures[event.reason] = self.checkout_failures.get(event.reason, 0) + 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self.checked_out = max(self.checked_out - 1, 0)
+
+    def connection_created(self, event):
+        with self._lock:
+            self.created += 1
+
+    def connection_closed(self, event):
+        with self._lock:
+            self.closed += 1
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self.cleared += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "checked_out": self.checked_out,
+                "max_checked_out": self.max_checked_out,
+                "checkouts": self.checkouts,
+                "checkout_failures": dict(self.checkout_failures),
+                "average_wait_ms": round(self.wait_ms_sum / self.checkouts, 3) if self.checkouts else None,
+                "max_wait_ms": round(self.max_wait_ms, 3),
+                "connections_created": self.created,
+                "connections_closed": self.closed,
+                "pool_cleared": self.cleared,
+            }
+
+def pool_options():
+    """ขนาด pool และ timeout ของ MongoClient จาก environment (ค่าเริ่มต้นเดียวกับ PyMongo ยกเว้น timeout)"""
+    return {
+        "maxPoolSize": int(os.environ.get("MONGODB_MAX_POOL_SIZE", 100)),
+        "minPoolSize": int(os.environ.get("MONGODB_MIN_POOL_SIZE", 0)),
+        "maxIdleTimeMS": int(os.environ.get("MONGODB_MAX_IDLE_TIME_MS", 0)) or None,
+        "waitQueueTimeoutMS": int(os.environ.get("MONGODB_WAIT_QUEUE_TIMEOUT_MS", 0)) or None,
+        "serverSelectionTimeoutMS": int(os.environ.get("MONGODB_SERVER_SELECTION_TIMEOUT_MS", 5000)),
+    }
+
 class MongoDB:
+    """เชื่อมต่อ MongoDB แบบ lazy: ครั้งแรกที่มีการใช้ client/db ใน process นั้น
+
+    - ปลอดภัยกับ gunicorn แบบ pre-fork: ถ้า pid เปลี่ยน (process ลูก) จะทิ้ง client ของ process แม่แล้วต่อใหม่
+    - request ที่มาระหว่างที่ thread อื่นกำลังเชื่อมต่อ (เช่น warm_up) จะรอผลสูงสุด MONGODB_CONNECT_WAIT วินาที
+    - thread ตรวจสุขภาพ ping ทุก MONGODB_HEALTH_INTERVAL วินาทีเพื่อเก็บสถานะ ping ไม่ผ่านไม่ปิด client
+      (PyMongo ต่อใหม่เองเมื่อเซิร์ฟเวอร์กลับมา)
+    - ถ้าเชื่อมต่อครั้งแรกไม่ได้ client เป็น None (route ใช้โหมด fallback, หน้าที่ต้องล็อกอินตอบ 503)
+      และลองต่อใหม่ทุก MONGODB_RECONNECT_INTERVAL วินาที ทั้งจาก thread ตรวจสุขภาพและตอนมีการใช้ client
+    """
+
     def __init__(self):
-        self.client = None
-        self.db = None
-        self.connect()
+        self._client = None
+        self._db = None
+        self._pid = os.getpid()
+        self._connect_lock = threading.Lock()
+        self._next_connect_at = 0.0
+        self._health_thread = None
+        self._indexes_ready = False
+        self.reconnect_interval = float(os.environ.get("MONGODB_RECONNECT_INTERVAL", 10))
+        self.connect_wait = float(os.environ.get("MONGODB_CONNECT_WAIT", 10))
+        self.health_interval = float(os.environ.get("MONGODB_HEALTH_INTERVAL", 30))
+        self.pool_stats = PoolStats()
+        self.health = {"connects": 0, "connect_failures": 0, "health_failures": 0,
+                       "last_ping_ms": None, "last_error": None}
+        # user_loader ของ Flask-Login เรียก get_user_by_id ทุก request จึงแคชไว้ช่วงสั้น ๆ
+        self.user_cache = ResponseCache(
+            max_size=int(os.environ.get("USER_CACHE_SIZE", 1024)),
+            ttl_seconds=int(os.environ.get("USER_CACHE_TTL", 60)),
+        )
+
+    @property
+    def client(self):
+        self._ensure_connected()
+        return self._client
+
+    @property
+    def db(self):
+        self._ensure_connected()
+        return self._db
+
+    def _ensure_connected(self):
+        if self._pid != os.getpid():
+            # process ลูกหลัง fork: socket/lock ของ client เดิมเป็นของ process แม่ ห้ามใช้ต่อ
+            self._pid = os.getpid()
+            self._client = self._db = None
+            self._health_thread = None
+            self._next_connect_at = 0.0
+            self.pool_stats.reset()
+        if self._client is not None or time.monotonic() < self._next_connect_at:
+            return
+        # thread อื่นกำลังเชื่อมต่ออยู่: รอผลของการเชื่อมต่อนั้น (มีเวลาจำกัด) แทนการทำเหมือนไม่มีฐานข้อมูล
+        if not self._connect_lock.acquire(timeout=self.connect_wait):
+            return
+        try:
+            if self._client is None and time.monotonic() >= self._next_connect_at:
+                self.connect()
+        finally:
+            self._connect_lock.release()
 
     def connect(self):
         """เชื่อมต่อกับ MongoDB Atlas"""
+        client = None
         try:
             # ใช้ MONGODB_URI จากไฟล์ .env
             uri = os.environ.get("MONGODB_URI")
             if not uri:
-                print("MONGODB_URI not found in environment variables")
+                logger.warning("MONGODB_URI not found in environment variables")
+                self._next_connect_at = float("inf")
                 return False
 
-            print(f"Attempting to connect to MongoDB...")
+            logger.info("Attempting to connect to MongoDB...")
             
             # แก้ไข URI หากมี username/password ที่ต้อง encode
             if "mongodb+srv://" in uri and "@" in uri:
@@ -38,25 +357,132 @@ class MongoDB:
                         host_and_params = auth_and_host[1]
                         uri = f"mongodb+srv://{encoded_username}:{encoded_password}@{host_and_params}"
 
-            self.client = MongoClient(uri, serverSelectionTimeoutMS=5000)
-            self.db = self.client.kanrawee_db
+            client = MongoClient(uri, event_listeners=[self.pool_stats, CommandTimer()], **pool_options())
             
             # ทดสอบการเชื่อมต่อ
-            self.client.admin.command('ping')
-            print("Connected to MongoDB successfully")
+            client.admin.command('ping')
+            self._client = client
+            self._db = client.kanrawee_db
+            self.health["connects"] += 1
+            logger.info("Connected to MongoDB successfully")
+            if not self._indexes_ready:
+                self._indexes_ready = self.ensure_indexes()
+            self._start_health_checks()
             return True
             
         except ConnectionFailure as e:
-            print(f"Failed to connect to MongoDB: {e}")
+            logger.error("Failed to connect to MongoDB: %s", e)
+            self._connect_failed(client, e)
             return False
         except Exception as e:
-            print(f"Error connecting to MongoDB: {e}")
-            print("Suggestion: Check your MongoDB Atlas credentials and IP whitelist")
-            print("💡 App will use JSON fallback mode")
+            logger.error("Error connecting to MongoDB: %s", e)
+            logger.info("Suggestion: Check your MongoDB Atlas credentials and IP whitelist")
+            logger.info("💡 App will use JSON fallback mode")
+            self._connect_failed(client, e)
             return False
 
-    def get_emotion_history(self, user_id, days=90):
-        """ดึงประวัติอารมณ์ของ user ใน N วันที่ผ่านมา"""
+    def _connect_failed(self, client, error):
+        if client is not None:
+            client.close()
+        self.health["connect_failures"] += 1
+        self.health["last_error"] = str(error)
+        self._start_health_checks()
+        # request อื่นไม่ต้องรอ serverSelectionTimeout ซ้ำจนกว่าจะถึงรอบลองใหม่
+        self._next_connect_at = time.monotonic() + self.reconnect_interval
+
+    def _start_health_checks(self):
+        if self.health_interval <= 0 or (self._health_thread and self._health_thread.is_alive()):
+            return
+        self._health_thread = threading.Thread(target=self._health_loop, args=(os.getpid(),),
+                                               name="mongodb-health", daemon=True)
+        self._health_thread.start()
+
+    def _health_loop(self, pid):
+        while self._pid == pid:
+            time.sleep(self.health_interval if self._client is not None else self.reconnect_interval)
+            if self._pid != pid:
+                return
+            if self._client is not None:
+                self.ping()
+                continue
+            with self._connect_lock:
+                if self._client is None:
+                    self.connect()
+
+    def ping(self):
+        """ping MongoDB แล้วเก็บผลไว้ใน health (ไม่ปิด client: PyMongo ต่อใหม่เองเมื่อเซิร์ฟเวอร์กลับมา)"""
+        client = self._client
+        if client is None:
+            return False
+        started = time.perf_counter()
+        try:
+            client.admin.command("ping")
+        except Exception as e:
+            logger.warning("⚠️ MongoDB health check failed: %s", e)
+            self.health["health_failures"] += 1
+            self.health["last_error"] = str(e)
+            self.health["last_ping_ms"] = None
+            return False
+        self.health["last_ping_ms"] = round((time.perf_counter() - started) * 1000, 3)
+        return True
+
+    @property
+    def connected(self):
+        """เชื่อมต่ออยู่ใน process นี้หรือไม่ (ไม่ทำให้เกิดการเชื่อมต่อใหม่)"""
+        return self._client is not None and self._pid == os.getpid()
+
+    def stats(self):
+        """สถานะการเชื่อมต่อและ pool (ไม่ทำให้เกิดการเชื่อมต่อใหม่)"""
+        options = pool_options()
+        return {
+            "connected": self.connected,
+            "pid": self._pid,
+            "pool": dict(self.pool_stats.stats(), max_pool_size=options["maxPoolSize"],
+                         min_pool_size=options["minPoolSize"]),
+            "health": dict(self.health, interval=self.health_interval),
+        }
+
+    def ensure_indexes(self):
+        """สร้าง index ตาม INDEXES (idempotent)"""
+        if not self.client or self.db is None:
+            return False
+
+        ok = True
+        for collection_name, indexes in INDEXES.items():
+            for keys, options in indexes:
+                try:
+                    self.db[collection_name].create_index(keys, **options)
+                except OperationFailure as e:
+                    # เช่น มีข้อมูลซ้ำอยู่แล้วจนสร้าง unique index ไม่ได้ ให้แอปทำงานต่อแต่แจ้งเตือนไว้
+                    logger.warning("⚠️ Could not create index %s.%s: %s", collection_name, options['name'], e)
+                    ok = False
+        return ok
+
+    def hot_queries(self, user_id="1", username="__explain__"):
+        """query ที่ถูกเรียกบ่อย สำหรับตรวจ query plan: [(ชื่อ, cursor)]"""
+        start_date_str = (datetime.now() - timedelta(days=89)).strftime("%Y-%m-%d")
+        history_query = {"user_id": str(user_id), "date": {"$gte": start_date_str}}
+        return [
+            ("emotion_history.by_user_date", self.db.emotion_history.find(history_query).sort("date", -1)),
+            ("emotion_history.page", self.db.emotion_history.find(history_query).sort(
+                [("date", DESCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]
+            ).limit(51)),
+            ("user_daily_stats.by_user_date", self.db.user_daily_stats.find(history_query).sort("date", -1)),
+            ("users.by_username", self.db.users.find({"username": username})),
+            ("users.by_user_id", self.db.users.find({"user_id": str(user_id)})),
+            ("user_evaluations.by_user_id", self.db.user_evaluations.find({"user_id": str(user_id)})),
+        ]
+
+    def check_query_plans(self):
+        """รัน explain() กับ hot_queries แล้วคืน {ชื่อ: [stage ทั้งหมดใน winning plan]}"""
+        plans = {}
+        for name, cursor in self.hot_queries():
+            explain = cursor.explain()
+            plans[name] = plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {}))
+        return plans
+
+    def get_emotion_history(self, user_id, days=90, fields=None):
+        """ดึงประวัติอารมณ์ของ user ใน N วันที่ผ่านมา (fields = ดึงเฉพาะ field เหล่านี้, None = ทุก field ยกเว้น _id)"""
         try:
             if not self.client or self.db is None:
                 return []
@@ -74,31 +500,56 @@ class MongoDB:
             }
             
             # เรียงตามวันที่ใหม่ไปเก่า
-            results = list(collection.find(query, {"_id": 0}).sort("date", -1))
+            projection = dict.fromkeys(fields, 1) if fields else {}
+            projection["_id"] = 0
+            results = list(collection.find(query, projection).sort("date", -1))
             
-            # จัดการข้อมูลเก่าที่อาจไม่มี emotion และ summary fields
-            processed_results = []
-            for entry in results:
-                # ถ้าไม่มี emotion หรือ summary field ให้ใช้ค่า default
-                if 'emotion' not in entry and entry.get('analysis'):
-                    entry['emotion'] = entry.get('analysis', 'N/A')[:50] + "..."  # ตัดสั้น
-                elif 'emotion' not in entry:
-                    entry['emotion'] = 'N/A'
-                    
-                if 'summary' not in entry and entry.get('analysis'):
-                    entry['summary'] = entry.get('analysis', 'N/A')[:100] + "..."  # ตัดสั้น
-                elif 'summary' not in entry:
-                    entry['summary'] = 'N/A'
-                    
-                processed_results.append(entry)
-            
-            print(f"📊 Found {len(processed_results)} emotion entries for user {user_id} in last {days} days")
-            return processed_results
+            # entry เก่าที่ไม่มี emotion/summary ถูกเติมถาวรด้วย reanalysis.py จึงไม่ต้องแก้ทีละ entry ตอนอ่าน
+            logger.debug("📊 Found %d emotion entries for user %s in last %d days", len(results), user_id, days)
+            return results
             
         except Exception as e:
-            print(f"❌ Error fetching emotion history: {e}")
+            db_error("get_emotion_history", "fetching emotion history", e)
             return []
 
+    def _history_query(self, user_id, days, cursor=None):
+        start_date_str = (datetime.now() - timedelta(days=days-1)).strftime("%Y-%m-%d")
+        query = {"user_id": str(user_id), "date": {"$gte": start_date_str}}
+        if cursor:
+            date, created_at, last_id = decode_history_cursor(cursor)
+            query["$or"] = [
+                {"date": {"$lt": date}},
+                {"date": date, "created_at": {"$lt": created_at}},
+                {"date": date, "created_at": created_at, "_id": {"$lt": last_id}},
+            ]
+        return query
+
+    def iter_emotion_history(self, user_id, days=90, cursor=None, limit=None):
+        """ไล่ประวัติอารมณ์จาก pymongo cursor ทีละ entry (ไม่โหลดทั้งหมดเข้าหน่วยความจำ)
+
+        แต่ละ entry ยังมี _id อยู่เพื่อใช้สร้าง cursor ของหน้าถัดไป
+        """
+        if not self.client or self.db is None:
+            return
+
+        query = self._history_query(user_id, days, cursor)
+        results = self.db.emotion_history.find(query).sort(
+            [("date", DESCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)]
+        )
+        if limit:
+            results = results.limit(limit)
+        yield from results
+
+    def get_emotion_history_page(self, user_id, days=90, cursor=None, limit=50):
+        """ดึงประวัติอารมณ์ทีละหน้า คืน (entries, next_cursor); next_cursor เป็น None เมื่อหมดแล้ว"""
+        # ดึงเกินมา 1 รายการเพื่อรู้ว่ายังมีหน้าถัดไปหรือไม่
+        entries = list(self.iter_emotion_history(user_id, days, cursor, limit + 1))
+        next_cursor = encode_history_cursor(entries[limit - 1]) if len(entries) > limit else None
+        entries = entries[:limit]
+        for entry in entries:
+            entry.pop("_id", None)
+        return entries, next_cursor
+
     def save_emotion_entry(self, user_id, entry_data):
         """บันทึกข้อมูลอารมณ์ของ user"""
         try:
@@ -113,19 +564,144 @@ class MongoDB:
             
             # บันทึกลงฐานข้อมูล
             result = collection.insert_one(entry_data)
-            print(f"✅ Emotion entry saved for user {user_id} with ID: {result.inserted_id}")
+            logger.debug("✅ Emotion entry saved for user %s with ID: %s", user_id, result.inserted_id)
+
+        except Exception as e:
+            db_error("save_emotion_entry", "saving emotion entry", e)
+            return False
+
+        # entry ถูกบันทึกแล้ว: ถ้าคืน False client จะส่งซ้ำจน entry ซ้ำ จึงเขียนสถิติและ fingerprint แบบ best-effort
+        # สถิติที่ขาดถูกเติมภายหลังโดย get_user_stats (backfill_daily_stats)
+        try:
+            self._update_daily_stats(entry_data)
+        except Exception as e:
+            db_error("save_emotion_entry", "updating daily stats", e)
+        try:
+            self.db.user_evaluations.update_one(
+                *history_fingerprint_update(user_id, 1, entry_data['created_at']), upsert=True
+            )
+        except Exception as e:
+            db_error("save_emotion_entry", "updating history fingerprint", e)
+        return True
+
+    def _update_daily_stats(self, entry_data):
+        """อัพเดทสถิติรายวันใน user_daily_stats แบบ incremental (ไม่ต้องอ่านประวัติทั้งหมด)"""
+        self.db.user_daily_stats.update_one(*daily_stats_update(entry_data), upsert=True)
+
+    def get_daily_stats(self, user_id, days=90):
+        """ดึงสถิติรายวันของ user ใน N วันที่ผ่านมา (สูงสุด N เอกสาร)"""
+        try:
+            if not self.client or self.db is None:
+                return []
+
+            start_date_str = (datetime.now() - timedelta(days=days-1)).strftime("%Y-%m-%d")
+            query = {"user_id": str(user_id), "date": {"$gte": start_date_str}}
+            return list(self.db.user_daily_stats.find(query, {"_id": 0}).sort("date", -1))
+
+        except Exception as e:
+            db_error("get_daily_stats", "fetching daily stats", e)
+            return []
+
+    def get_stats_summary(self, user_id, days=90):
+        """รวมสถิติรายวันเป็นสรุปช่วง N วัน"""
+        summary = {
+            "total_entries": 0,
+            "score_sum": 0,
+            "score_count": 0,
+            "highest_score": None,
+            "lowest_score": None,
+            "days_with_entries": 0,
+            "emotion_counts": {},
+        }
+        for day in self.get_daily_stats(user_id, days):
+            if not day.get("entries"):
+                continue
+            summary["total_entries"] += day["entries"]
+            summary["days_with_entries"] += 1
+            if day.get("score_count"):
+                summary["score_sum"] += day["score_sum"]
+                summary["score_count"] += day["score_count"]
+                if summary["highest_score"] is None or day["max_score"] > summary["highest_score"]:
+                    summary["highest_score"] = day["max_score"]
+                if summary["lowest_score"] is None or day["min_score"] < summary["lowest_score"]:
+                    summary["lowest_score"] = day["min_score"]
+            for emotion, count in day.get("emotions", {}).items():
+                summary["emotion_counts"][emotion] = summary["emotion_counts"].get(emotion, 0) + count
+        return summary
+
+    def rebuild_daily_stats(self, user_id=None):
+        """สร้าง user_daily_stats ใหม่จาก emotion_history (ใช้กับข้อมูลเก่าที่บันทึกก่อนมีตารางนี้)"""
+        try:
+            if not self.client or self.db is None:
+                return False
+
+            query = {"user_id": str(user_id)} if user_id is not None else {}
+            self.db.user_daily_stats.delete_many(query)
+            rebuilt = 0
+            for entry in self.db.emotion_history.find(query, {"_id": 0}):
+                if entry.get("user_id") is None:
+                    continue
+                self._update_daily_stats(entry)
+                rebuilt += 1
+
+            logger.info("✅ Rebuilt daily stats from %d emotion entries", rebuilt)
             return True
-            
+
         except Exception as e:
-            print(f"❌ Error saving emotion entry: {e}")
+            db_error("rebuild_daily_stats", "rebuilding daily stats", e)
             return False
 
+    def backfill_daily_stats(self, user_id, history):
+        """เติม user_daily_stats จากประวัติที่โหลดมาแล้ว (ต้องมี date, emotionScore, emotion, emoji)
+
+        ใช้เมื่อจำนวน entry ในสถิติไม่ตรงกับประวัติ เช่น entry ที่บันทึกก่อนมี user_daily_stats
+        สร้างใหม่เฉพาะวันที่จำนวนไม่ตรง คืนจำนวนวันที่สร้างใหม่
+        """
+        try:
+            if not self.client or self.db is None or not history:
+                return 0
+
+            user_id = str(user_id)
+            by_date = {}
+            for entry in history:
+                if entry.get("date"):
+                    by_date.setdefault(entry["date"], []).append(dict(entry, user_id=user_id))
+            counts = {
+                day["date"]: day.get("entries", 0)
+                for day in self.db.user_daily_stats.find(
+                    {"user_id": user_id, "date": {"$in": list(by_date)}}, {"date": 1, "entries": 1}
+                )
+            }
+            stale = [entries for date, entries in by_date.items() if counts.get(date) != len(entries)]
+            # แทนเอกสารของวันทั้งก้อนในคำสั่งเดียว: $inc ของ /save ที่เข้ามาพร้อมกันจะไม่หายระหว่างลบกับสร้างใหม่
+            for stats_filter, update in merge_daily_stats_updates(entry for entries in stale for entry in entries):
+                self.db.user_daily_stats.replace_one(
+                    stats_filter, daily_stats_document(stats_filter, update), upsert=True
+                )
+            if stale:
+                logger.info("✅ Backfilled daily stats for user %s: %d days", user_id, len(stale))
+            return len(stale)
+
+        except Exception as e:
+            db_error("backfill_daily_stats", "backfilling daily stats", e)
+            return 0
+
+    def count_emotion_entries(self, user_id, days=90):
+        """จำนวน entry ของ user ใน N วันที่ผ่านมา (นับจาก index user_id + date ไม่โหลดเอกสาร)"""
+        start_date_str = (datetime.now() - timedelta(days=days-1)).strftime("%Y-%m-%d")
+        return self.db.emotion_history.count_documents({"user_id": str(user_id), "date": {"$gte": start_date_str}})
+
     def get_user_stats(self, user_id, days=90):
-        """คำนวณสถิติอารมณ์ของ user"""
+        """คำนวณสถิติอารมณ์ของ user จาก user_daily_stats"""
         try:
-            history = self.get_emotion_history(str(user_id), days)
+            summary = self.get_stats_summary(user_id, days)
+            if self.client and summary["total_entries"] != self.count_emotion_entries(user_id, days):
+                # สถิติไม่ครบ (เช่น entry ที่บันทึกก่อนมี user_daily_stats): เติมจากประวัติครั้งเดียวแล้วอ่านใหม่
+                history = self.get_emotion_history(user_id, days, fields=DAILY_STATS_FIELDS)
+                if self.backfill_daily_stats(user_id, history):
+                    summary = self.get_stats_summary(user_id, days)
             
-            if not history:
+            if not summary["total_entries"]:
                 return {
                     "total_entries": 0,
                     "average_score": 0,
@@ -135,29 +711,24 @@ class MongoDB:
                     "most_common_emotion": "N/A"
                 }
 
-            scores = [entry.get("emotionScore", 0) for entry in history if isinstance(entry.get("emotionScore"), (int, float))]
-            emotions = [entry.get("emotion", "") for entry in history if entry.get("emotion")]
-            unique_dates = set(entry.get("date", "") for entry in history if entry.get("date"))
-            
             # หาอารมณ์ที่พบบ่อยที่สุด
+            emotion_counts = summary["emotion_counts"]
             most_common_emotion = "N/A"
-            if emotions:
-                emotion_counts = {}
-                for emotion in emotions:
-                    emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
+            if emotion_counts:
                 most_common_emotion = max(emotion_counts.keys(), key=lambda x: emotion_counts[x])
             
+            scored = summary["score_count"]
             return {
-                "total_entries": len(history),
-                "average_score": round(sum(scores) / len(scores), 2) if scores else 0,
-                "highest_score": max(scores) if scores else 0,
-                "lowest_score": min(scores) if scores else 0,
-                "days_with_entries": len(unique_dates),
-                "most_common_emotion": most_common_emotion
+                "total_entries": summary["total_entries"],
+                "average_score": round(summary["score_sum"] / scored, 2) if scored else 0,
+                "highest_score": summary["highest_score"] if scored else 0,
+                "lowest_score": summary["lowest_score"] if scored else 0,
+                "days_with_entries": summary["days_with_entries"],
+                "most_common_emotion": stats_field_label(most_common_emotion)
             }
             
         except Exception as e:
-            print(f"❌ Error calculating user stats: {e}")
+            db_error("get_user_stats", "calculating user stats", e)
             return {
                 "total_entries": 0,
                 "average_score": 0,
@@ -167,60 +738,113 @@ class MongoDB:
                 "most_common_emotion": "N/A"
             }
 
-    def migrate_json_data(self, json_file_path):
-        """ย้ายข้อมูลจาก JSON file ไปยัง MongoDB (ใช้ครั้งเดียว)"""
+    def get_user_stats_aggregate(self, user_id, days=90):
+        """คำนวณสถิติอารมณ์ของ user ด้วย aggregation pipeline ฝั่ง MongoDB (ส่งกลับแค่สรุป)"""
+        empty_stats = {
+            "total_entries": 0,
+            "average_score": 0,
+            "highest_score": 0,
+            "lowest_score": 0,
+            "days_with_entries": 0,
+            "most_common_emotion": "N/A"
+        }
         try:
-            import json
-            
+            if not self.client or self.db is None:
+                return empty_stats
+
+            start_date_str = (datetime.now() - timedelta(days=days-1)).strftime("%Y-%m-%d")
+            # นับเฉพาะคะแนนที่เป็นตัวเลข ($avg/$max/$min ข้ามค่า null)
+            numeric_score = {"$cond": [{"$isNumber": "$emotionScore"}, "$emotionScore", None]}
+            pipeline = [
+                {"$match": {"user_id": str(user_id), "date": {"$gte": start_date_str}}},
+                {"$facet": {
+                    "scores": [
+                        {"$group": {
+                            "_id": None,
+                            "total_entries": {"$sum": 1},
+                            "average_score": {"$avg": numeric_score},
+                            "highest_score": {"$max": numeric_score},
+                            "lowest_score": {"$min": numeric_score},
+                            "dates": {"$addToSet": "$date"},
+                        }},
+                        {"$project": {
+                            "_id": 0,
+                            "total_entries": 1,
+                            "average_score": 1,
+                            "highest_score": 1,
+                            "lowest_score": 1,
+                            "days_with_entries": {"$size": "$dates"},
+                        }},
+                    ],
+                    "emotions": [
+                        {"$match": {"emotion": {"$nin": [None, ""]}}},
+                        # เท่ากับ {"$sortByCount": "$emotion"} แต่เขียนแบบเต็มเพื่อให้ใช้กับ mongomock ได้
+                        {"$group": {"_id": "$emotion", "count": {"$sum": 1}}},
+                        {"$sort": {"count": -1}},
+                        {"$limit": 1},
+                    ],
+                }},
+            ]
+            result = next(self.db.emotion_history.aggregate(pipeline), None)
+
+            if not result or not result["scores"]:
+                return empty_stats
+
+            scores = result["scores"][0]
+            return {
+                "total_entries": scores["total_entries"],
+                "average_score": round(scores["average_score"], 2) if scores.get("average_score") is not None else 0,
+                "highest_score": scores.get("highest_score") if scores.get("highest_score") is not None else 0,
+                "lowest_score": scores.get("lowest_score") if scores.get("lowest_score") is not None else 0,
+                "days_with_entries": scores["days_with_entries"],
+                "most_common_emotion": result["emotions"][0]["_id"] if result["emotions"] else "N/A"
+            }
+
+        except Exception as e:
+            db_error("get_user_stats_aggregate", "aggregating user stats", e)
+            return empty_stats
+
+    def migrate_json_data(self, json_file_path, batch_size=1000, checkpoint_path=None):
+        """ย้ายข้อมูลจาก JSON file ไปยัง MongoDB (ใช้ครั้งเดียว) ดู migration.py"""
+        try:
+            from migration import migrate_json_file
+
             if not os.path.exists(json_file_path):
-                print(f"❌ JSON file not found: {json_file_path}")
+                logger.error("❌ JSON file not found: %s", json_file_path)
                 return False
 
-            with open(json_file_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-
             if not self.client or self.db is None:
                 return False
 
-            collection = self.db.emotion_history
-            migrated_count = 0
-
-            # ถ้าข้อมูลเป็น dict (แยกตาม user)
-            if isinstance(data, dict):
-                for user_id, entries in data.items():
-                    for entry in entries:
-                        entry['user_id'] = user_id
-                        entry['created_at'] = datetime.utcnow()
-                        collection.insert_one(entry)
-                        migrated_count += 1
-
-            # ถ้าข้อมูลเป็น list (รูปแบบเก่า)
-            elif isinstance(data, list):
-                for entry in data:
-                    entry['user_id'] = "1"  # กำหนดให้ user id เริ่มต้น
-                    entry['created_at'] = datetime.utcnow()
-                    collection.insert_one(entry)
-                    migrated_count += 1
-
-            print(f"✅ Migrated {migrated_count} emotion entries to MongoDB")
+            migrate_json_file(self, json_file_path, batch_size, checkpoint_path)
             return True
 
         except Exception as e:
-            print(f"❌ Error migrating JSON data: {e}")
+            db_error("migrate_json_data", "migrating JSON data", e)
             return False
 
     def get_user_by_id(self, user_id):
-        """ดึงข้อมูล user ตาม ID"""
+        """ดึงข้อมูล user ตาม ID (raise DatabaseUnavailableError ถ้าติดต่อ MongoDB ไม่ได้ ไม่ให้ user ที่ล็อกอิน
+        อยู่ถูกมองเป็น anonymous)"""
+        if not self.client or self.db is None:
+            raise DatabaseUnavailableError("MongoDB is not connected")
         try:
-            if not self.client or self.db is None:
-                return None
+
+            user_data = self.user_cache.get(user_id)
+            if user_data is not None:
+                return user_data
 
             collection = self.db.users
             user_data = collection.find_one({"user_id": user_id}, {"_id": 0})
+            if user_data is not None:
+                self.user_cache.set(user_id, user_data)
             return user_data
             
+        except ConnectionFailure as e:
+            db_error("get_user_by_id", "fetching user by ID", e)
+            raise DatabaseUnavailableError(str(e)) from e
         except Exception as e:
-            print(f"❌ Error fetching user by ID: {e}")
+            db_error("get_user_by_id", "fetching user by ID", e)
             return None
 
     def get_user_by_username(self, username):
@@ -234,37 +858,94 @@ class MongoDB:
             return user_data
             
         except Exception as e:
-            print(f"❌ Error fetching user by username: {e}")
+            db_error("get_user_by_username", "fetching user by username", e)
             return None
 
     def create_user(self, user_id, username, hashed_password):
-        """สร้าง user ใหม่"""
+        """สร้าง user ใหม่ คืน user_id ที่บันทึกจริง (อาจต่างจากที่ส่งมาถ้า ID ชน) หรือ None ถ้าสร้างไม่ได้"""
         try:
             if not self.client or self.db is None:
-                return False
+                return None
 
             collection = self.db.users
             
             # ตรวจสอบว่า username ซ้ำหรือไม่
             if self.get_user_by_username(username):
-                print(f"⚠️ Username '{username}' already exists")
-                return False
-            
-            user_data = {
-                "user_id": user_id,
-                "username": username,
-                "password": hashed_password,
-                "created_at": datetime.utcnow(),
-                "last_login": None
-            }
-            
-            result = collection.insert_one(user_data)
-            print(f"✅ User created successfully: {username} (ID: {result.inserted_id})")
-            return True
+                logger.info("⚠️ Username '%s' already exists", username)
+                return None
+
+            for _ in range(USER_ID_ATTEMPTS):
+                user_data = {
+                    "user_id": user_id,
+                    "username": username,
+                    "password": hashed_password,
+                    "created_at": datetime.utcnow(),
+                    "last_login": None
+                }
+                try:
+                    result = collection.insert_one(user_data)
+                except DuplicateKeyError as e:
+                    field = duplicate_key_field(e)
+                    if field is None:
+                        field = "username" if self.get_user_by_username(username) else "user_id"
+                    if field != "user_id":
+                        # สมัครพร้อมกันด้วย username เดียวกัน: unique index กันไว้
+                        logger.info("⚠️ Username '%s' already exists", username)
+                        return None
+                    # user_id ชนกับ user เดิม (เช่น ID ที่สร้างก่อนมี counters): จอง ID ใหม่แล้วลองอีกครั้ง
+                    logger.warning("⚠️ User ID %s already taken, allocating a new one", user_id)
+                    user_id = self.next_user_id()
+                    if user_id is None:
+                        return None
+                    continue
+                self.user_cache.invalidate(user_id)
+                logger.info("✅ User created successfully: %s (ID: %s)", username, result.inserted_id)
+                return user_id
+
+            logger.error("❌ Could not allocate a free user ID for '%s'", username)
+            return None
             
         except Exception as e:
-            print(f"❌ Error creating user: {e}")
-            return False
+            db_error("create_user", "creating user", e)
+            return None
+
+    def next_user_id(self):
+        """จอง user_id ถัดไปแบบ atomic จาก collection counters (ไม่ต้อง scan users)"""
+        try:
+            if not self.client or self.db is None:
+                return None
+
+            counter = self.db.counters.find_one_and_update(
+                {"_id": "user_id"},
+                {"$inc": {"seq": 1}},
+                return_document=ReturnDocument.AFTER
+            )
+            if counter is None:
+                # ครั้งแรก: เริ่มนับต่อจาก user_id ตัวเลขที่มากที่สุดของ user เดิม
+                # $max ทำให้หลาย process seed พร้อมกันได้โดยค่าไม่ถอยหลัง
+                self.db.counters.update_one(
+                    {"_id": "user_id"},
+                    {"$max": {"seq": self._max_numeric_user_id()}},
+                    upsert=True
+                )
+                counter = self.db.counters.find_one_and_update(
+                    {"_id": "user_id"},
+                    {"$inc": {"seq": 1}},
+                    return_document=ReturnDocument.AFTER
+                )
+            return str(counter["seq"])
+
+        except Exception as e:
+            db_error("next_user_id", "allocating user ID", e)
+            return None
+
+    def _max_numeric_user_id(self):
+        max_id = 0
+        for user in self.db.users.find({}, {"_id": 0, "user_id": 1}):
+            user_id = str(user.get("user_id", ""))
+            if user_id.isdigit():
+                max_id = max(max_id, int(user_id))
+        return max_id
 
     def update_last_login(self, user_id):
         """อัพเดทเวลาล็อกอินล่าสุด"""
@@ -277,10 +958,11 @@ class MongoDB:
                 {"user_id": user_id},
                 {"$set": {"last_login": datetime.utcnow()}}
             )
+            self.user_cache.invalidate(user_id)
             return result.modified_count > 0
             
         except Exception as e:
-            print(f"❌ Error updating last login: {e}")
+            db_error("update_last_login", "updating last login", e)
             return False
 
     def get_all_users(self):
@@ -294,7 +976,7 @@ class MongoDB:
             return users
             
         except Exception as e:
-            print(f"❌ Error fetching all users: {e}")
+            db_error("get_all_users", "fetching all users", e)
             return []
 
     def migrate_users_to_mongodb(self, in_memory_users):
@@ -304,28 +986,129 @@ class MongoDB:
                 return False
 
             collection = self.db.users
+
+            # ตรวจสอบว่ามี user ไหนอยู่ใน MongoDB แล้วบ้างด้วย query เดียว
+            existing_ids = {
+                user["user_id"]
+                for user in collection.find({"user_id": {"$in": list(in_memory_users)}}, {"_id": 0, "user_id": 1})
+            }
+            new_users = [
+                {
+                    "user_id": user_id,
+                    "username": user.username,
+                    "password": user.password,
+                    "created_at": datetime.utcnow(),
+                    "last_login": None
+                }
+                for user_id, user in in_memory_users.items()
+                if user_id not in existing_ids
+            ]
+
             migrated_count = 0
+            if new_users:
+                try:
+                    migrated_count = len(collection.insert_many(new_users, ordered=False).inserted_ids)
+                except BulkWriteError as e:
+                    # username ซ้ำกับ user ที่มีอยู่ (unique index) ข้ามไป ที่เหลือยัง insert ได้
+                    migrated_count = e.details.get("nInserted", 0)
+                    logger.warning("⚠️ Skipped %d users that already exist", len(e.details.get('writeErrors', [])))
+
+            logger.info("✅ Migrated %d users to MongoDB", migrated_count)
+            return True
+
+        except Exception as e:
+            db_error("migrate_users_to_mongodb", "migrating users", e)
+            return False
+
+    def get_evaluation_state(self, user_id):
+        """ดึง fingerprint ประวัติปัจจุบันและผลประเมินล่าสุด (ถ้ามี) ของ user"""
+        try:
+            if not self.client or self.db is None:
+                return None
+
+            return self.db.user_evaluations.find_one({"user_id": str(user_id)}, {"_id": 0})
+
+        except Exception as e:
+            db_error("get_evaluation_state", "fetching evaluation state", e)
+            return None
+
+    def save_evaluation(self, user_id, fingerprint, result, prompt_version=None):
+        """บันทึกผลประเมินพร้อม fingerprint ของประวัติที่ใช้ประเมิน และรุ่นของ prompt"""
+        try:
+            if not self.client or self.db is None:
+                return False
+
+            self.db.user_evaluations.update_one(
+                {"user_id": str(user_id)},
+                {"$set": {
+                    "result": result,
+                    "result_fingerprint": fingerprint,
+                    "prompt_version": prompt_version,
+                    "evaluated_at": datetime.utcnow(),
+                }},
+                upsert=True
+            )
+            return True
+
+        except Exception as e:
+            db_error("save_evaluation", "saving evaluation", e)
+            return False
+
+    def get_cached_response(self, key):
+        """ดึงผลลัพธ์ AI ที่แคชไว้ใน MongoDB"""
+        try:
+            if not self.client or self.db is None:
+                return None
+
+            doc = self.db.llm_cache.find_one({"_id": key})
+            # TTL monitor ของ MongoDB ลบเอกสารทุก ~60 วินาที จึงต้องเช็กเวลาหมดอายุเองด้วย
+            if not doc or doc.get("expires_at", datetime.min) <= datetime.utcnow():
+                return None
+            return doc.get("value")
+
+        except Exception as e:
+            db_error("get_cached_response", "fetching cached response", e, component="cache")
+            return None
+
+    def save_cached_response(self, key, value, ttl_seconds):
+        """บันทึกผลลัพธ์ AI ลง MongoDB พร้อมเวลาหมดอายุ"""
+        try:
+            if not self.client or self.db is None:
+                return False
 
-            for user_id, user in in_memory_users.items():
-                # ตรวจสอบว่ามี user นี้ใน MongoDB แล้วหรือไม่
-                existing_user = self.get_user_by_id(user_id)
-                if not existing_user:
-                    user_data = {
-                        "user_id": user_id,
-                        "username": user.username,
-                        "password": user.password,
-                        "created_at": datetime.utcnow(),
-                        "last_login": None
-                    }
-                    collection.insert_one(user_data)
-                    migrated_count += 1
-
-            print(f"✅ Migrated {migrated_count} users to MongoDB")
+            self.db.llm_cache.replace_one(
+                {"_id": key},
+                {
+                    "_id": key,
+                    "value": value,
+                    "expires_at": datetime.utcnow() + timedelta(seconds=ttl_seconds),
+                },
+                upsert=True
+            )
             return True
 
         except Exception as e:
-            print(f"❌ Error migrating users: {e}")
+            db_error("save_cached_response", "saving cached response", e, component="cache")
             return False
 
 # สร้าง instance เดียวใช้ทั่วทั้งแอป
 mongodb = MongoDB()
+
+if __name__ == "__main__":
+    # python database.py check-indexes : สร้าง index แล้วตรวจว่าไม่มี hot query ไหนเป็น COLLSCAN
+    import sys
+
+    if sys.argv[1:] != ["check-indexes"]:
+        print("Usage: python database.py check-indexes")
+        sys.exit(2)
+    if not mongodb.client:
+        print("❌ MongoDB not available")
+        sys.exit(1)
+
+    mongodb.ensure_indexes()
+    failed = False
+    for name, stages in mongodb.check_query_plans().items():
+        status = "❌ COLLSCAN" if "COLLSCAN" in stages else "✅"
+        failed = failed or "COLLSCAN" in stages
+        print(f"{status} {name}: {' -> '.join(stages)}")
+    sys.exit(1 if failed else 0)
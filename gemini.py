@@ -0,0 +1,139 @@
+"""Gemini client แบบ lazy: import google.generativeai (~1 วินาที) และ configure ตอนเรียกใช้ครั้งแรก
+
+LazyModel ใช้แทน genai.GenerativeModel ได้ (generate_content, generate_content_async)
+bool(model) ตรวจแค่ว่ามี GEMINI_API_KEY โดยไม่ import SDK การ import app จึงเร็ว และ /healthz ตอบได้ทันที
+ถ้าต้องการจ่ายค่า import ล่วงหน้า (เช่นใน gunicorn master ก่อน fork) ให้เรียก model.load()
+
+GEMINI_CONTEXT_CACHE=1: prompt ที่สร้างจาก template (ดู prompts.py) จะส่ง prefix คงที่เป็น cached content
+ของ Gemini ครั้งเดียวต่อ version ของ template แล้วส่งเฉพาะ suffix ในแต่ละ call (token ของ prefix คิดราคา cache)
+Gemini รับ cache ที่ยาวถึงขั้นต่ำของแต่ละรุ่นเท่านั้น (หลักพัน token) prefix ที่สร้าง cache ไม่ได้จะถูกจำไว้
+และส่ง prompt เต็มตามเดิม ส่วน prefix ที่เหมือนกันทุก call ยังได้ implicit caching ของ Gemini โดยไม่ต้องเปิดค่านี้
+"""
+import asyncio
+import os
+import threading
+import time
+from datetime import timedelta
+
+from log import get_logger
+
+logger = get_logger("gemini")
+
+
+CONTEXT_CACHE = os.environ.get("GEMINI_CONTEXT_CACHE", "0") == "1"
+CONTEXT_CACHE_TTL = int(os.environ.get("GEMINI_CONTEXT_CACHE_TTL", 3600))
+
+
+class LazyModel:
+    def __init__(self, model_name, api_key_env="GEMINI_API_KEY", context_cache=CONTEXT_CACHE,
+                 context_cache_ttl=CONTEXT_CACHE_TTL):
+        self.model_name = model_name
+        self.api_key_env = api_key_env
+        self._model = None
+        self._lock = threading.Lock()
+        self.load_seconds = None
+        self.error = None
+        self.context_cache = context_cache
+        self.context_cache_ttl = context_cache_ttl
+        # version_id ของ template -> (GenerativeModel ที่ผูกกับ cache, หมดอายุเมื่อ) หรือ None ถ้าสร้างไม่ได้
+        self._context_caches = {}
+        self._context_lock = threading.Lock()
+        self.context_totals = {"created": 0, "failed": 0, "hits": 0, "prefix_chars_saved": 0}
+        if not os.environ.get(api_key_env):
+            self.error = f"{api_key_env} not found"
+            logger.error("❌ %s not found", api_key_env)
+
+    def __bool__(self):
+        return self.error is None
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    def load(self):
+        """import SDK และสร้าง GenerativeModel (ครั้งเดียวต่อ process, thread อื่นที่เรียกพร้อมกันรอผลเดียวกัน)"""
+        if self._model is not None:
+            return self._model
+        with self._lock:
+            if self._model is None:
+                if self.error is not None:
+                    raise RuntimeError(f"Gemini API is not configured: {self.error}")
+                started = time.perf_counter()
+                try:
+                    import google.generativeai as genai
+
+                    genai.configure(api_key=os.environ[self.api_key_env])  # type: ignore
+                    self._model = genai.GenerativeModel(self.model_name)  # type: ignore
+                except Exception as e:
+                    self.error = str(e)
+                    logger.error("❌ Error configuring Gemini API: %s", e)
+                    raise
+                self.load_seconds = time.perf_counter() - started
+                logger.info("Gemini client ready (%s) in %.2fs", self.model_name, self.load_seconds)
+        return self._model
+
+    def _cached_model(self, template):
+        """GenerativeModel ที่ใช้ cached content ของ prefix นี้ (สร้างใหม่ก่อนหมดอายุ) หรือ None"""
+        now = time.monotonic()
+        entry = self._context_caches.get(template.version_id, ())
+        if entry is None:
+            return None
+        if entry and entry[1] > now:
+            return entry[0]
+        with self._context_lock:
+            entry = self._context_caches.get(template.version_id, ())
+            if entry is None or (entry and entry[1] > now):
+                return entry and entry[0]
+            try:
+                import google.generativeai as genai
+                from google.generativeai import caching
+
+                cache = caching.CachedContent.create(
+                    model=f"models/{self.model_name}",
+                    display_name=template.version_id,
+                    system_instruction=template.prefix,
+                    ttl=timedelta(seconds=self.context_cache_ttl),
+                )
+                model = genai.GenerativeModel.from_cached_content(cache)
+            except Exception as e:
+                self._context_caches[template.version_id] = None
+                self.context_totals["failed"] += 1
+                logger.warning("⚠️ Context cache unavailable for %s, sending full prompts: %s", template.version_id, e)
+                return None
+            # สร้างใหม่เมื่อผ่านไป 90% ของ TTL กัน cache หมดอายุระหว่าง call
+            self._context_caches[template.version_id] = (model, now + self.context_cache_ttl * 0.9)
+            self.context_totals["created"] += 1
+            logger.info("Context cache created for %s (%d chars)", template.version_id, len(template.prefix))
+            return model
+
+    def _target(self, prompt):
+        """(model, contents) ที่จะเรียกจริง: ถ้ามี context cache ของ prefix จะส่งเฉพาะส่วนที่เหลือของ prompt"""
+        model = self.load()
+        template = getattr(prompt, "template", None)
+        if not self.context_cache or template is None or not prompt.startswith(template.prefix):
+            return model, prompt
+        cached = self._cached_model(template)
+        if cached is None:
+            return model, prompt
+        with self._context_lock:
+            self.context_totals["hits"] += 1
+            self.context_totals["prefix_chars_saved"] += len(template.prefix)
+        return cached, str(prompt[len(template.prefix):])
+
+    def generate_content(self, prompt, **kwargs):
+        model, contents = self._target(prompt)
+        return model.generate_content(contents, **kwargs)
+
+    async def generate_content_async(self, prompt, **kwargs):
+        if self._model is not None and not self.context_cache:
+            model, contents = self._model, prompt
+        else:
+            # import SDK / สร้าง context cache ครั้งแรกใช้เวลานาน: ทำใน thread เพื่อไม่ให้ event loop ค้าง
+            model, contents = await asyncio.to_thread(self._target, prompt)
+        return await model.generate_content_async(contents, **kwargs)
+
+    def stats(self):
+        return {"model": self.model_name, "loaded": self.loaded, "load_seconds": self.load_seconds,
+                "error": self.error,
+                "context_cache": dict(self.context_totals, enabled=self.context_cache,
+                                      templates=len(self._context_caches))}
@@ -0,0 +1,260 @@
+import asyncio
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class OverloadedError(Exception):
+    """รับงานเรียก LLM เพิ่มไม่ได้ (คิวเต็ม หรือรอจนเลย deadline)"""
+
+
+def is_retryable(error):
+    """429 และ 5xx จาก provider ควรลองใหม่ (google.api_core exceptions มี .code เป็น HTTP status)"""
+    code = getattr(error, "code", None)
+    if not isinstance(code, int):
+        code = getattr(error, "status_code", None)
+    return isinstance(code, int) and (code == 429 or 500 <= code < 600)
+
+
+class TokenBucket:
+    """จำกัดอัตรา rate ครั้ง/วินาที โดยยอมให้ burst ได้ถึง capacity"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, deadline):
+        """จอง token หนึ่งอัน คืนเวลาที่ต้องรอ (วินาที) หรือ None ถ้ารอไม่ทัน deadline"""
+        if self.rate <= 0:
+            return 0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            wait = 0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+            if now + wait > deadline:
+                return None
+            # token ติดลบได้ = จองคิวไว้แล้ว ผู้มาทีหลังจะต้องรอนานขึ้นตามลำดับ
+            self._tokens -= 1
+            return wait
+
+
+class _Waiter:
+    def __init__(self, wake):
+        self.wake = wake
+        self.granted = False
+
+
+class ModelGovernor:
+    """ควบคุมการเรียก Gemini: token bucket + จำนวน call พร้อมกันสูงสุด + คิวรอแบบมีขอบเขต
+
+    ผู้ที่ต้องรอถูกจัดคิวแยกตาม user และปล่อยแบบ round-robin เพื่อไม่ให้ user คนเดียวยึดทุก slot
+    รอเกิน max_wait หรือคิวเต็มจะได้ OverloadedError ทันทีแทนการค้างจน timeout
+    error 429/5xx จะถูกลองใหม่พร้อม backoff แบบสุ่ม (full jitter) ภายใน deadline เดิม
+    """
+
+    def __init__(self, rate=5.0, burst=10, max_in_flight=8, max_queue=64, max_wait=20.0,
+                 max_retries=3, base_backoff=0.5, max_backoff=8.0):
+        self.bucket = TokenBucket(rate, burst)
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._waiting = 0
+        # user -> deque ของ waiter; ลำดับของ key คือลำดับ round-robin
+        self._queues = OrderedDict()
+        self.admitted = 0
+        self.rejected = 0
+        self.retries = 0
+        self.failures = 0
+
+    # ----- slot (max in flight) -----
+
+    def _try_enter(self, user_key, wake):
+        """เข้า slot ทันทีถ้าว่าง (คืน None) ไม่เช่นนั้นเข้าคิวแล้วคืน waiter"""
+        with self._lock:
+            if self._in_flight < self.max_in_flight and not self._waiting:
+                self._in_flight += 1
+                return None
+            if self._waiting >= self.max_queue:
+                self.rejected += 1
+                raise OverloadedError("LLM wait queue is full")
+            waiter = _Waiter(wake)
+            self._queues.setdefault(user_key, deque()).append(waiter)
+            self._waiting += 1
+            return waiter
+
+    def _abandon(self, user_key, waiter):
+        """ถอน waiter ที่หมดเวลา คืน True ถ้าได้ slot ไปแล้วพอดี"""
+        with self._lock:
+            if waiter.granted:
+                return True
+            queue = self._queues.get(user_key)
+            if queue is not None and waiter in queue:
+                queue.remove(waiter)
+                self._waiting -= 1
+                if not queue:
+                    del self._queues[user_key]
+            self.rejected += 1
+            return False
+
+    def _release(self):
+        with self._lock:
+            self._in_flight -= 1
+            if not self._queues:
+                return
+            user_key, queue = next(iter(self._queues.items()))
+            waiter = queue.popleft()
+            if queue:
+                self._queues.move_to_end(user_key)
+            else:
+                del self._queues[user_key]
+            self._waiting -= 1
+            self._in_flight += 1
+            waiter.granted = True
+        waiter.wake()
+
+    def _acquire(self, user_key, deadline):
+        event = threading.Event()
+        waiter = self._try_enter(user_key, event.set)
+        if waiter is not None:
+            event.wait(max(0, deadline - time.monotonic()))
+            if not waiter.granted and not self._abandon(user_key, waiter):
+                raise OverloadedError("Timed out waiting for an LLM slot")
+        self._take_token(deadline)
+
+    async def _acquire_async(self, user_key, deadline):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        waiter = self._try_enter(user_key, wake)
+        if waiter is not None:
+            try:
+                await asyncio.wait_for(future, max(0, deadline - time.monotonic()))
+            except asyncio.TimeoutError:
+                if not self._abandon(user_key, waiter):
+                    raise OverloadedError("Timed out waiting for an LLM slot")
+            except asyncio.CancelledError:
+                # ผู้เรียกถูกยกเลิก (เช่น client ตัดการเชื่อมต่อ) ต้องคืน slot ที่อาจได้มาแล้ว
+                if self._abandon(user_key, waiter):
+                    self._release()
+                raise
+        wait = self._reserve_token(deadline)
+        if wait:
+            try:
+                await asyncio.sleep(wait)
+            except asyncio.CancelledError:
+                self._release()
+                raise
+
+    def _reserve_token(self, deadline):
+        wait = self.bucket.reserve(deadline)
+        if wait is None:
+            with self._lock:
+                self.rejected += 1
+            self._release()
+            raise OverloadedError("LLM rate limit would be exceeded before the deadline")
+        with self._lock:
+            self.admitted += 1
+        return wait
+
+    def _take_token(self, deadline):
+        wait = self._reserve_token(deadline)
+        if wait:
+            time.sleep(wait)
+
+    # ----- retries -----
+
+    def _backoff(self, attempt, error, deadline):
+        """เวลาที่ต้องรอก่อนลองใหม่ หรือ None ถ้าไม่ควรลองใหม่"""
+        if attempt >= self.max_retries or not is_retryable(error):
+            return None
+        delay = random.uniform(0, min(self.max_backoff, self.base_backoff * 2 ** attempt))
+        if time.monotonic() + delay > deadline:
+            return None
+        with self._lock:
+            self.retries += 1
+        return delay
+
+    def call(self, fn, user_key=None):
+        deadline = time.monotonic() + self.max_wait
+        attempt = 0
+        while True:
+            self._acquire(user_key, deadline)
+            try:
+                return fn()
+            except Exception as e:
+                delay = self._backoff(attempt, e, deadline)
+                if delay is None:
+                    with self._lock:
+                        self.failures += 1
+                    raise
+            finally:
+                self._release()
+            time.sleep(delay)
+            attempt += 1
+
+    async def call_async(self, coro_fn, user_key=None):
+        deadline = time.monotonic() + self.max_wait
+        attempt = 0
+        while True:
+            await self._acquire_async(user_key, deadline)
+            try:
+                return await coro_fn()
+            except Exception as e:
+                delay = self._backoff(attempt, e, deadline)
+                if delay is None:
+                    with self._lock:
+                        self.failures += 1
+                    raise
+            finally:
+                self._release()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    def stream(self, open_fn, user_key=None):
+        """generator สำหรับ streaming: ถือ slot ไว้จนอ่าน chunk ครบ และลองใหม่เมื่อ 429/5xx เหมือน call
+        แต่เฉพาะ error ที่เกิดก่อน chunk แรก (หลังจากนั้นผู้รับได้ข้อความบางส่วนไปแล้ว จึง raise ให้ผู้เรียกจัดการ)"""
+        deadline = time.monotonic() + self.max_wait
+        attempt = 0
+        while True:
+            self._acquire(user_key, deadline)
+            started = False
+            try:
+                for chunk in open_fn():
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                delay = None if started else self._backoff(attempt, e, deadline)
+                if delay is None:
+                    with self._lock:
+                        self.failures += 1
+                    raise
+            finally:
+                self._release()
+            time.sleep(delay)
+            attempt += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": self._in_flight,
+                "queued": self._waiting,
+                "queued_users": len(self._queues),
+                "admitted": self.admitted,
+                "rejected": self.rejected,
+                "retries": self.retries,
+                "failures": self.failures,
+            }
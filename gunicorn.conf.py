@@ -0,0 +1,27 @@
+"""ค่า gunicorn (gunicorn อ่านไฟล์นี้เองเมื่อรันจากโฟลเดอร์โปรเจกต์)
+
+    gunicorn app:app                                      # WSGI
+    gunicorn asgi:app -k uvicorn.workers.UvicornWorker    # ASGI
+
+GUNICORN_PRELOAD=1: master import แอปและ Gemini SDK ครั้งเดียวก่อน fork (worker ใหม่เริ่มเร็ว ใช้หน่วยความจำร่วมกัน)
+WARM_UP=1 (ค่าเริ่มต้น): worker แต่ละตัวเชื่อมต่อ MongoDB และโหลด Gemini ใน background ทันทีหลัง fork
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 8000)}"
+workers = int(os.environ.get("WEB_CONCURRENCY", 2))
+preload_app = os.environ.get("GUNICORN_PRELOAD", "0") == "1"
+
+
+def when_ready(server):
+    if preload_app:
+        import app
+
+        app.preload()
+
+
+def post_fork(server, worker):
+    if os.environ.get("WARM_UP", "1") == "1":
+        import app
+
+        app.warm_up()
@@ -0,0 +1,163 @@
+import unicodedata
+from collections import Counter
+from datetime import datetime, timedelta
+
+import serializer
+from llm_cache import normalize_text
+
+# ประมาณจำนวน token จากจำนวนตัวอักษร (ภาษาไทยใช้ token ต่อตัวอักษรมากกว่าภาษาอังกฤษ จึงประมาณแบบเผื่อไว้)
+# ไม่เรียก model.count_tokens เพราะเป็น network call อีกหนึ่งรอบต่อ request
+CHARS_PER_TOKEN = 3
+MAX_MESSAGE_CHARS = 280
+MAX_SUMMARY_CHARS = 160
+SHORT_MESSAGE_CHARS = 140
+MIN_MESSAGE_CHARS = 40
+# จำนวนวันล่าสุดที่พยายามคงไว้แบบเต็มก่อนจะเริ่มตัดสรุปรายวันที่เก่าที่สุดทิ้ง
+MIN_RECENT_DAYS = 3
+TOP_EMOJIS = 3
+# จำนวน entry ตัวอย่างที่ใช้ประมาณขนาดเดิมของประวัติใน report
+BEFORE_SAMPLE_ENTRIES = 32
+
+# อธิบายรูปแบบข้อมูลให้โมเดล (ต่อท้าย prompt template ก่อนข้อมูลผู้ใช้)
+HISTORY_FORMAT_NOTE = """รูปแบบข้อมูลผู้ใช้:
+- recent: บันทึกล่าสุดแบบเต็ม (ข้อความยาวถูกตัดด้วย …) ถ้ามี repeat แปลว่าวันนั้นพิมพ์ข้อความเดียวกันซ้ำตามจำนวนนั้น
+- daily: สรุปรายวันของช่วงก่อนหน้า entries = จำนวนบันทึก, avgScore = emotionScore เฉลี่ย,
+  emotion = อารมณ์ที่พบบ่อยที่สุด, emojis = จำนวนอีโมจิแต่ละแบบ"""
+
+
+def estimate_tokens(text):
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def dumps_compact(value):
+    return serializer.dumps(value)
+
+
+def estimate_indented_chars(history, sample_size=BEFORE_SAMPLE_ENTRIES):
+    """ขนาดโดยประมาณ (ตัวอักษร) ของ history เมื่อ dump แบบ indent=2 จาก entry ตัวอย่างที่กระจายทั้งช่วง
+    ใช้แค่รายงานว่าย่อไปเท่าไร จึงไม่ serialize ประวัติทั้งก้อนทุก request"""
+    if not history:
+        return 2
+    sample = history[::max(1, len(history) // sample_size)]
+    return round(len(serializer.dumps(sample, indent=True)) * len(history) / len(sample))
+
+
+def _truncate(text, limit):
+    text = str(text or "")
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def _dedupe_key(entry):
+    """ข้อความที่ต่างกันแค่ตัวพิมพ์ ช่องว่าง หรือเครื่องหมายวรรคตอน ถือว่าซ้ำกัน (เทียบภายในวันเดียวกัน)"""
+    text = "".join(
+        char for char in normalize_text(entry.get("message")).casefold()
+        if not unicodedata.category(char).startswith(("P", "S"))
+    )
+    return entry.get("date"), entry.get("emoji"), " ".join(text.split())
+
+
+def dedupe_entries(entries):
+    """รวม entry ที่ซ้ำกันเป็นรายการเดียวพร้อมจำนวนครั้ง คืน list ของ (entry, repeat) ตามลำดับเดิม"""
+    groups = {}
+    for entry in entries:
+        key = _dedupe_key(entry)
+        if key in groups:
+            groups[key][1] += 1
+        else:
+            groups[key] = [entry, 1]
+    return [tuple(group) for group in groups.values()]
+
+
+def compact_entry(entry, repeat=1, message_chars=MAX_MESSAGE_CHARS):
+    item = {
+        "date": entry.get("date"),
+        "emoji": entry.get("emoji"),
+        "emotion": entry.get("emotion"),
+        "emotionScore": entry.get("emotionScore"),
+        "message": _truncate(entry.get("message"), message_chars),
+        "summary": _truncate(entry.get("summary"), MAX_SUMMARY_CHARS),
+    }
+    # entry เก่าที่ไม่มี message มีแต่ analysis แบบข้อความยาว
+    if not item["message"] and entry.get("analysis"):
+        item["analysis"] = _truncate(entry["analysis"], message_chars)
+    if repeat > 1:
+        item["repeat"] = repeat
+    return item
+
+
+def aggregate_day(date, entries):
+    scores = [e["emotionScore"] for e in entries
+              if isinstance(e.get("emotionScore"), (int, float)) and not isinstance(e.get("emotionScore"), bool)]
+    emotions = Counter(e["emotion"] for e in entries if e.get("emotion") and e.get("emotion") != "N/A")
+    emojis = Counter(e["emoji"] for e in entries if e.get("emoji"))
+    return {
+        "date": date,
+        "entries": len(entries),
+        "avgScore": round(sum(scores) / len(scores), 1) if scores else None,
+        "emotion": emotions.most_common(1)[0][0] if emotions else None,
+        "emojis": dict(emojis.most_common(TOP_EMOJIS)),
+    }
+
+
+def build_history_payload(history, token_budget=6000, recent_days=14, today=None):
+    """ย่อประวัติ (list ของ safe entry เรียงใหม่ไปเก่า) ให้อยู่ใน token_budget
+
+    entry ใน recent_days วันล่าสุดส่งแบบเต็ม (ตัดข้อความยาว + รวมข้อความซ้ำ) ส่วนที่เก่ากว่าส่งเป็นสรุปรายวัน
+    ถ้ายังเกิน budget จะตัดข้อความให้สั้นลง ทยอยย้ายวันที่เก่าที่สุดของ recent ไปเป็นสรุปรายวัน
+    (คงไว้อย่างน้อย MIN_RECENT_DAYS วัน) แล้วจึงตัดสรุปรายวันที่เก่าที่สุดทิ้ง คืน (payload_text, report)
+    """
+    today = today or datetime.now()
+    cutoff = (today - timedelta(days=recent_days - 1)).strftime("%Y-%m-%d")
+
+    by_date = {}
+    for entry in history:
+        by_date.setdefault(str(entry.get("date")), []).append(entry)
+    dates = sorted(by_date, reverse=True)
+    recent_dates = [date for date in dates if date >= cutoff]
+    daily = [aggregate_day(date, by_date[date]) for date in dates if date < cutoff]
+
+    recent_entries = [entry for date in recent_dates for entry in by_date[date]]
+    deduped = dedupe_entries(recent_entries)
+    duplicates_merged = len(recent_entries) - len(deduped)
+    message_chars = MAX_MESSAGE_CHARS
+
+    def render():
+        recent = [compact_entry(entry, repeat, message_chars) for entry, repeat in deduped]
+        return dumps_compact({"recent": recent, "daily": daily})
+
+    payload = render()
+    def move_oldest_recent_day():
+        date = recent_dates.pop()
+        daily.insert(0, aggregate_day(date, by_date[date]))
+        return [(entry, repeat) for entry, repeat in deduped if str(entry.get("date")) != date]
+
+    while estimate_tokens(payload) > token_budget:
+        if message_chars > SHORT_MESSAGE_CHARS:
+            message_chars = SHORT_MESSAGE_CHARS
+        elif len(recent_dates) > MIN_RECENT_DAYS:
+            deduped = move_oldest_recent_day()
+        elif daily:
+            daily.pop()
+        elif len(recent_dates) > 1:
+            deduped = move_oldest_recent_day()
+        elif message_chars > MIN_MESSAGE_CHARS:
+            message_chars = max(MIN_MESSAGE_CHARS, message_chars // 2)
+        else:
+            break
+        payload = render()
+
+    # ขนาดเดิมตอนส่งประวัติทั้งหมดแบบ indent=2 (ใช้รายงานว่าย่อไปเท่าไร)
+    before_chars = estimate_indented_chars(history)
+    report = {
+        "entries": len(history),
+        "recent_entries": len(deduped),
+        "duplicates_merged": duplicates_merged,
+        "daily_aggregates": len(daily),
+        "before_chars": before_chars,
+        "after_chars": len(payload),
+        "before_tokens": -(-before_chars // CHARS_PER_TOKEN),
+        "after_tokens": estimate_tokens(payload),
+        "token_budget": token_budget,
+        "within_budget": estimate_tokens(payload) <= token_budget,
+    }
+    return payload, report
@@ -0,0 +1,284 @@
+"""คิวงานเรียก LLM แบบ background (/analyze, /evaluate_depression ที่ส่ง header Prefer: respond-async)
+
+- MongoJobStore: เก็บงานใน collection llm_jobs ใช้ได้หลาย process/เครื่อง ไม่ต้องมี broker แยก
+- MemoryJobStore: คิวในหน่วยความจำสำหรับรันเครื่องเดียว (งานหายเมื่อ restart)
+
+worker จองงานด้วย visibility timeout: ถ้า worker ตายกลางทาง งานจะกลับมาให้ worker อื่นหยิบเมื่อหมดเวลา
+handler ที่ raise exception จะถูกลองใหม่หลัง retry_delay * attempts วินาที จนครบ max_attempts
+
+รัน worker แยกจาก web process (ต้องใช้ JOB_BACKEND=mongo และตั้ง JOB_WORKERS=0 ที่ web):
+
+    python jobs.py --workers 4
+"""
+import argparse
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import ConnectionFailure
+
+from log import get_logger
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+FINISHED = (DONE, FAILED)
+
+logger = get_logger("jobs")
+
+
+def new_job(kind, user_id, payload, max_attempts):
+    now = datetime.utcnow()
+    return {
+        "_id": uuid.uuid4().hex,
+        "kind": kind,
+        "user_id": str(user_id),
+        "payload": payload,
+        "status": QUEUED,
+        "attempts": 0,
+        "max_attempts": max_attempts,
+        "result": None,
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+        "visible_at": now,
+    }
+
+
+def public_job(job):
+    """ข้อมูลงานที่ส่งให้ client (ไม่มี payload/worker)"""
+    return {
+        "job_id": job["_id"],
+        "kind": job["kind"],
+        "status": job["status"],
+        "attempts": job["attempts"],
+        "result": job.get("result"),
+        "error": job.get("error"),
+        "created_at": job["created_at"].isoformat(),
+        "updated_at": job["updated_at"].isoformat(),
+    }
+
+
+class MemoryJobStore:
+    def __init__(self):
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def insert(self, job):
+        with self._lock:
+            self._jobs[job["_id"]] = dict(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def claim(self, worker_id, visibility_timeout):
+        now = datetime.utcnow()
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items() if job.get("expires_at", now) < now]
+            for job_id in expired:
+                del self._jobs[job_id]
+            ready = [job for job in self._jobs.values() if job["status"] not in FINISHED and job["visible_at"] <= now]
+            if not ready:
+                return None
+            job = min(ready, key=lambda j: j["visible_at"])
+            job.update(status=RUNNING, worker=worker_id, updated_at=now,
+                       visible_at=now + timedelta(seconds=visibility_timeout))
+            job["attempts"] += 1
+            return dict(job)
+
+    def finish(self, job, fields):
+        """อัพเดทงานเฉพาะเมื่อยังถือ lease อยู่ (worker และ attempts ตรงกับตอนจอง)"""
+        with self._lock:
+            current = self._jobs.get(job["_id"])
+            if current is None or current.get("worker") != job["worker"] or current["attempts"] != job["attempts"]:
+                return False
+            current.update(fields)
+            return True
+
+
+class MongoJobStore:
+    def __init__(self, database, collection_name="llm_jobs"):
+        self.database = database
+        self.collection_name = collection_name
+
+    @property
+    def collection(self):
+        # ดึง collection ทุกครั้ง: database เชื่อมต่อแบบ lazy และอาจต่อใหม่ (หลัง fork หรือ health check ไม่ผ่าน)
+        db = self.database.db
+        if db is None:
+            raise ConnectionFailure("MongoDB not available")
+        return db[self.collection_name]
+
+    def insert(self, job):
+        self.collection.insert_one(job)
+
+    def get(self, job_id):
+        return self.collection.find_one({"_id": job_id})
+
+    def claim(self, worker_id, visibility_timeout):
+        now = datetime.utcnow()
+        # งาน running ที่ visible_at ผ่านไปแล้ว = worker เดิมหมดเวลา (อาจตายไปแล้ว) หยิบใหม่ได้
+        return self.collection.find_one_and_update(
+            {"status": {"$in": [QUEUED, RUNNING]}, "visible_at": {"$lte": now}},
+            {
+                "$set": {
+                    "status": RUNNING,
+                    "worker": worker_id,
+                    "updated_at": now,
+                    "visible_at": now + timedelta(seconds=visibility_timeout),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("visible_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def finish(self, job, fields):
+        result = self.collection.update_one(
+            {"_id": job["_id"], "worker": job["worker"], "attempts": job["attempts"]},
+            {"$set": fields},
+        )
+        return result.modified_count == 1
+
+
+class JobQueue:
+    """รับงานเข้าคิวและรัน handler ด้วย worker thread (เริ่มเมื่อมีงานแรกเข้ามา)"""
+
+    def __init__(self, store, workers=2, visibility_timeout=120, max_attempts=3, retry_delay=5,
+                 result_ttl=24 * 3600, poll_interval=1.0):
+        self.store = store
+        self.workers = workers
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self.handlers = {}
+        self._threads = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._worker_prefix = f"{socket.gethostname()}:{uuid.uuid4().hex[:8]}"
+        self.enqueued = 0
+        self.completed = 0
+        self.retried = 0
+        self.failed = 0
+
+    def register(self, kind, handler):
+        """handler(job) คืนผลลัพธ์ที่ต้องเก็บ (ต้องแปลงเป็น BSON/JSON ได้) หรือ raise เพื่อให้ลองใหม่"""
+        self.handlers[kind] = handler
+
+    def enqueue(self, kind, user_id, payload=None):
+        job = new_job(kind, user_id, payload, self.max_attempts)
+        self.store.insert(job)
+        with self._lock:
+            self.enqueued += 1
+        self._ensure_workers()
+        self._wake.set()
+        return job["_id"]
+
+    def get(self, job_id):
+        return self.store.get(job_id)
+
+    def _ensure_workers(self):
+        with self._lock:
+            self._threads = [thread for thread in self._threads if thread.is_alive()]
+            for _ in range(self.workers - len(self._threads)):
+                thread = threading.Thread(target=self.run_worker, name="llm-job-worker", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def run_worker(self, stop=None):
+        worker_id = f"{self._worker_prefix}:{threading.get_ident()}"
+        while stop is None or not stop.is_set():
+            try:
+                job = self.store.claim(worker_id, self.visibility_timeout)
+            except Exception as e:
+                logger.error("❌ Error claiming job: %s", e)
+                job = None
+            if job is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            self._process(job)
+
+    def _finished_fields(self, **fields):
+        now = datetime.utcnow()
+        return dict(fields, updated_at=now, expires_at=now + timedelta(seconds=self.result_ttl))
+
+    def _process(self, job):
+        handler = self.handlers.get(job["kind"])
+        if handler is None or job["attempts"] > job["max_attempts"]:
+            error = f"Unknown job kind: {job['kind']}" if handler is None else "Too many attempts"
+            self._finish(job, self._finished_fields(status=FAILED, error=error), "failed")
+            return
+
+        try:
+            result = handler(job)
+        except Exception as e:
+            now = datetime.utcnow()
+            if job["attempts"] < job["max_attempts"]:
+                logger.warning("⚠️ Job %s attempt %d failed, retrying: %s", job['_id'], job['attempts'], e)
+                retry_at = now + timedelta(seconds=self.retry_delay * job["attempts"])
+                self._finish(job, {"status": QUEUED, "error": str(e), "updated_at": now, "visible_at": retry_at},
+                             "retried")
+            else:
+                logger.error("❌ Job %s failed: %s", job['_id'], e)
+                self._finish(job, self._finished_fields(status=FAILED, error=str(e)), "failed")
+            return
+        self._finish(job, self._finished_fields(status=DONE, result=result, error=None), "completed")
+
+    def _finish(self, job, fields, counter):
+        try:
+            if not self.store.finish(job, fields):
+                # lease หมดอายุระหว่างทำงาน worker อื่นรับงานนี้ไปแล้ว
+                logger.warning("⚠️ Job %s lease lost, result discarded", job['_id'])
+                return
+        except Exception as e:
+            logger.error("❌ Error updating job %s: %s", job['_id'], e)
+            return
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": type(self.store).__name__,
+                "workers": len([thread for thread in self._threads if thread.is_alive()]),
+                "enqueued": self.enqueued,
+                "completed": self.completed,
+                "retried": self.retried,
+                "failed": self.failed,
+            }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    import app as flask_module
+
+    queue = flask_module.job_queue
+    if not isinstance(queue.store, MongoJobStore):
+        print("❌ Standalone workers need JOB_BACKEND=mongo")
+        raise SystemExit(1)
+
+    print(f"✅ Running {args.workers} job workers")
+    threads = [threading.Thread(target=queue.run_worker, daemon=True) for _ in range(args.workers)]
+    for thread in threads:
+        thread.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        print("✅ Job workers stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import hashlib
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+def normalize_text(value):
+    """ทำให้ข้อความอยู่ในรูปแบบเดียวกันก่อนนำไปคำนวณ key (NFC + ยุบช่องว่าง)"""
+    if value is None:
+        return ""
+    text = unicodedata.normalize("NFC", str(value))
+    return " ".join(text.split())
+
+
+def make_cache_key(model_name, *parts):
+    """สร้าง key แบบ content-addressed จากชื่อโมเดลและข้อมูลที่ใช้สร้าง prompt"""
+    hasher = hashlib.sha256()
+    hasher.update(normalize_text(model_name).encode("utf-8"))
+    for part in parts:
+        # ใช้ตัวคั่นที่ไม่มีในข้อความปกติ กัน ("ab", "c") ชนกับ ("a", "bc")
+        hasher.update(b"\x1f")
+        hasher.update(normalize_text(part).encode("utf-8"))
+    return hasher.hexdigest()
+
+
+class ResponseCache:
+    """แคชแบบ LRU + TTL ในหน่วยความจำ และชั้น MongoDB (ไม่บังคับ)
+
+    ใช้กับผลลัพธ์จาก Gemini และข้อมูล user ของ Flask-Login (MongoDB.user_cache)
+    """
+
+    def __init__(self, max_size=1024, ttl_seconds=3600, store=None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        # store ต้องมี get_cached_response(key) และ save_cached_response(key, value, ttl)
+        self.store = store
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.store_hits = 0
+
+    def get(self, key):
+        """คืนค่าที่แคชไว้ หรือ None ถ้าไม่มี/หมดอายุ"""
+        now = time.monotonic()
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                expires_at, value = item
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    self.memory_hits += 1
+                    return value
+                del self._entries[key]
+
+        value = self.store.get_cached_response(key) if self.store is not None else None
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.store_hits += 1
+            self._remember(key, value, now)
+        return value
+
+    def set(self, key, value):
+        """บันทึกผลลัพธ์ลงแคชทั้งสองชั้น"""
+        with self._lock:
+            self._remember(key, value, time.monotonic())
+        if self.store is not None:
+            self.store.save_cached_response(key, value, self.ttl_seconds)
+
+    def invalidate(self, key):
+        """ลบ key ออกจากชั้นหน่วยความจำ"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        """สถิติ hit/miss สำหรับดูว่าแคชช่วยลดการเรียก Gemini ได้แค่ไหน"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_hits": self.memory_hits,
+                "store_hits": self.store_hits,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0,
+            }
+
+    def _remember(self, key, value, now):
+        self._entries[key] = (now + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
@@ -0,0 +1,194 @@
+"""ตัววิเคราะห์อารมณ์แบบ local (lexicon ไทย/อังกฤษ + ขั้วของอีโมจิ) สำหรับข้อความสั้นที่ชัดเจน
+
+ใช้ตัดสินใจว่า /analyze และ reanalysis.py ต้องเรียก Gemini หรือไม่: ถ้า confidence >= threshold
+จะใช้ผลจากที่นี่แทน คำนวณแบบ vectorized ด้วย NumPy (matrix ของจำนวนคำที่พบ x คุณสมบัติของคำ)
+ปรับ threshold ได้จากรายงานความแม่นยำเทียบ latency ใน benchmarks/bench_local_scorer.py
+"""
+import hashlib
+import json
+import re
+
+import numpy as np
+
+NEUTRAL = "เฉยๆ"
+EMOTIONS = ["มีความสุข", "รัก", "เศร้า", "โกรธ", "กลัว", "ผิดหวัง", "เหนื่อย", "เบื่อ", "สงสัย", NEUTRAL]
+
+# คำ -> (อารมณ์, ขั้วอารมณ์ -1..1) อารมณ์เป็น None = คำที่ต้องจับไว้ก่อนเพื่อไม่ให้คำสั้นกว่าที่ซ่อนอยู่ข้างในถูกนับ
+# (เช่น "สุขภาพ" มี "สุข", "รักษา" มี "รัก")
+LEXICON = {
+    "มีความสุข": ("มีความสุข", 1.0), "สุข": ("มีความสุข", 0.8), "ดีใจ": ("มีความสุข", 1.0),
+    "สนุก": ("มีความสุข", 0.8), "ยิ้ม": ("มีความสุข", 0.6), "หัวเราะ": ("มีความสุข", 0.7),
+    "สบายใจ": ("มีความสุข", 0.7), "ชอบ": ("มีความสุข", 0.5), "เยี่ยม": ("มีความสุข", 0.8),
+    "ดีมาก": ("มีความสุข", 0.8), "ดี": ("มีความสุข", 0.4), "ผ่อนคลาย": ("มีความสุข", 0.6),
+    "ภูมิใจ": ("มีความสุข", 0.8), "โชคดี": ("มีความสุข", 0.7), "แฮปปี้": ("มีความสุข", 0.9),
+    "สำเร็จ": ("มีความสุข", 0.6), "ขอบคุณ": ("มีความสุข", 0.4), "ฟิน": ("มีความสุข", 0.8),
+    "happy": ("มีความสุข", 1.0), "glad": ("มีความสุข", 0.8), "great": ("มีความสุข", 0.8),
+    "awesome": ("มีความสุข", 0.9), "fun": ("มีความสุข", 0.7), "joy": ("มีความสุข", 0.9),
+    "excited": ("มีความสุข", 0.8), "good": ("มีความสุข", 0.5), "amazing": ("มีความสุข", 0.9),
+    "wonderful": ("มีความสุข", 0.9), "proud": ("มีความสุข", 0.8), "relaxed": ("มีความสุข", 0.6),
+    "lucky": ("มีความสุข", 0.7), "nice": ("มีความสุข", 0.5), "yay": ("มีความสุข", 0.8),
+
+    "รัก": ("รัก", 0.9), "น่ารัก": ("รัก", 0.7), "อบอุ่น": ("รัก", 0.7), "คิดถึง": ("รัก", 0.3),
+    "love": ("รัก", 0.9), "adore": ("รัก", 0.9), "miss you": ("รัก", 0.4),
+
+    "เศร้า": ("เศร้า", -0.9), "เสียใจ": ("เศร้า", -0.9), "ร้องไห้": ("เศร้า", -0.9),
+    "เหงา": ("เศร้า", -0.7), "ท้อ": ("เศร้า", -0.7), "หมดหวัง": ("เศร้า", -1.0),
+    "สิ้นหวัง": ("เศร้า", -1.0), "เจ็บปวด": ("เศร้า", -0.8), "อกหัก": ("เศร้า", -0.9),
+    "หดหู่": ("เศร้า", -0.9), "ไม่อยากอยู่": ("เศร้า", -1.0),
+    "sad": ("เศร้า", -0.9), "cry": ("เศร้า", -0.8), "crying": ("เศร้า", -0.9),
+    "lonely": ("เศร้า", -0.7), "depressed": ("เศร้า", -1.0), "hopeless": ("เศร้า", -1.0),
+    "heartbroken": ("เศร้า", -0.9), "unhappy": ("เศร้า", -0.8), "upset": ("เศร้า", -0.7),
+
+    "โกรธ": ("โกรธ", -0.9), "โมโห": ("โกรธ", -0.9), "หงุดหงิด": ("โกรธ", -0.7),
+    "รำคาญ": ("โกรธ", -0.6), "เกลียด": ("โกรธ", -0.9), "แค้น": ("โกรธ", -0.9),
+    "angry": ("โกรธ", -0.9), "mad": ("โกรธ", -0.8), "furious": ("โกรธ", -1.0),
+    "annoyed": ("โกรธ", -0.6), "hate": ("โกรธ", -0.9), "irritated": ("โกรธ", -0.6),
+
+    "กลัว": ("กลัว", -0.8), "กังวล": ("กลัว", -0.7), "ตกใจ": ("กลัว", -0.6),
+    "เครียด": ("กลัว", -0.7), "วิตก": ("กลัว", -0.8), "ประหม่า": ("กลัว", -0.5),
+    "scared": ("กลัว", -0.8), "afraid": ("กลัว", -0.8), "anxious": ("กลัว", -0.7),
+    "worried": ("กลัว", -0.7), "nervous": ("กลัว", -0.5), "stressed": ("กลัว", -0.7),
+    "panic": ("กลัว", -0.9), "fear": ("กลัว", -0.8),
+
+    "ผิดหวัง": ("ผิดหวัง", -0.8), "แย่": ("ผิดหวัง", -0.7), "เสียดาย": ("ผิดหวัง", -0.5),
+    "พลาด": ("ผิดหวัง", -0.5), "disappointed": ("ผิดหวัง", -0.8), "bad": ("ผิดหวัง", -0.6),
+    "terrible": ("ผิดหวัง", -0.9), "awful": ("ผิดหวัง", -0.9),
+
+    "เหนื่อย": ("เหนื่อย", -0.6), "เพลีย": ("เหนื่อย", -0.6), "หมดแรง": ("เหนื่อย", -0.7),
+    "ล้า": ("เหนื่อย", -0.5), "ง่วง": ("เหนื่อย", -0.3), "tired": ("เหนื่อย", -0.6),
+    "exhausted": ("เหนื่อย", -0.8), "sleepy": ("เหนื่อย", -0.3),
+
+    "เบื่อ": ("เบื่อ", -0.5), "bored": ("เบื่อ", -0.5), "boring": ("เบื่อ", -0.5),
+
+    "สงสัย": ("สงสัย", -0.1), "งง": ("สงสัย", -0.2), "confused": ("สงสัย", -0.3), "curious": ("สงสัย", 0.1),
+
+    "เฉยๆ": (NEUTRAL, 0.0), "ปกติ": (NEUTRAL, 0.0), "ธรรมดา": (NEUTRAL, 0.0),
+    "okay": (NEUTRAL, 0.1), "ok": (NEUTRAL, 0.1), "normal": (NEUTRAL, 0.0),
+
+    "สุขภาพ": (None, 0.0), "รักษา": (None, 0.0), "ดีเลย์": (None, 0.0),
+}
+
+# อีโมจิ -> (อารมณ์, ขั้วอารมณ์) รวมอีโมจิทั้ง 8 ตัวในหน้า index.html
+EMOJI_POLARITY = {
+    "😀": ("มีความสุข", 0.9), "😄": ("มีความสุข", 0.9), "😁": ("มีความสุข", 0.9), "😊": ("มีความสุข", 0.8),
+    "🙂": ("มีความสุข", 0.5), "😂": ("มีความสุข", 0.8), "🥳": ("มีความสุข", 1.0),
+    "😍": ("รัก", 0.9), "🥰": ("รัก", 0.9), "❤": ("รัก", 0.8),
+    "😢": ("เศร้า", -0.8), "😭": ("เศร้า", -1.0), "😔": ("เศร้า", -0.7), "💔": ("เศร้า", -0.9),
+    "😡": ("โกรธ", -0.9), "😠": ("โกรธ", -0.8), "🤬": ("โกรธ", -1.0),
+    "😱": ("กลัว", -0.8), "😨": ("กลัว", -0.7), "😰": ("กลัว", -0.7),
+    "😞": ("ผิดหวัง", -0.7), "😩": ("เหนื่อย", -0.7), "😫": ("เหนื่อย", -0.7), "😴": ("เหนื่อย", -0.3),
+    "🤔": ("สงสัย", -0.1), "😐": (NEUTRAL, 0.0),
+}
+
+THAI_NEGATIONS = ("ไม่", "ไม่ค่อย", "ไม่ได้", "ไม่เคย")
+ENGLISH_NEGATIONS = {"not", "no", "never", "dont", "don't", "didnt", "didn't", "isnt", "isn't",
+                     "wasnt", "wasn't", "cant", "can't", "cannot", "hardly"}
+THAI_INTENSIFIERS = ("มากๆ", "มาก", "สุดๆ", "ที่สุด", "จัง", "สุด")
+ENGLISH_INTENSIFIERS = {"very", "so", "really", "extremely", "super", "too"}
+INTENSITY = 1.4
+
+# อีโมจิที่ผู้ใช้เลือกมีน้ำหนักเท่ากับคำที่ชัดเจนหนึ่งคำ
+EMOJI_WEIGHT = 1.0
+# ข้อความยาวมักมีหลายอารมณ์ปนกัน ให้ Gemini วิเคราะห์เสมอ
+MAX_MESSAGE_CHARS = 80
+DEFAULT_THRESHOLD = 0.7
+
+
+def _is_ascii(term):
+    return all(ord(char) < 128 for char in term)
+
+
+class LocalScorer:
+    def __init__(self, lexicon=LEXICON, emojis=EMOJI_POLARITY, max_chars=MAX_MESSAGE_CHARS):
+        self.max_chars = max_chars
+        terms = dict(lexicon)
+        terms.update(emojis)
+        self.terms = list(terms)
+        self.index = {term: i for i, term in enumerate(self.terms)}
+        self.emoji_terms = np.array([term in emojis for term in self.terms])
+        # บันทึกเป็น promptVersion ของผลที่ตอบเอง (เปลี่ยนเมื่อแก้ lexicon/อีโมจิ)
+        digest = hashlib.sha256(json.dumps(terms, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+        self.version = f"local_scorer@{digest[:12]}"
+
+        emotion_index = {emotion: i for i, emotion in enumerate(EMOTIONS)}
+        self.valence = np.array([terms[term][1] for term in self.terms], dtype=np.float64)
+        # น้ำหนักหลักฐานของแต่ละอารมณ์ต่อคำ: คำที่ขั้วชัดมีน้ำหนักมาก คำกลาง ๆ มีน้ำหนักขั้นต่ำ 0.5
+        self.evidence = np.zeros((len(self.terms), len(EMOTIONS)))
+        for i, term in enumerate(self.terms):
+            emotion, valence = terms[term]
+            if emotion is not None:
+                self.evidence[i, emotion_index[emotion]] = max(abs(valence), 0.5)
+
+        # ยาวก่อนสั้น เพื่อให้ "ดีใจ" ถูกจับก่อน "ดี" และภาษาอังกฤษต้องเป็นคำเต็ม
+        thai = sorted((t for t in self.terms if not _is_ascii(t)), key=len, reverse=True)
+        english = sorted((t for t in self.terms if _is_ascii(t)), key=len, reverse=True)
+        self._thai_re = re.compile("|".join(map(re.escape, thai)))
+        self._english_re = re.compile(r"\b(?:" + "|".join(map(re.escape, english)) + r")\b")
+
+    def _matches(self, text):
+        """คืน [(index ของคำ, น้ำหนัก, ถูกปฏิเสธหรือไม่)] ของคำที่พบใน text"""
+        text = text.replace("\ufe0f", "")
+        lowered = text.lower()
+        found = []
+        for match in self._thai_re.finditer(text):
+            before = text[max(0, match.start() - 8):match.start()]
+            after = text[match.end():match.end() + 5]
+            negated = any(before.endswith(neg) or before.endswith(neg + " ") for neg in THAI_NEGATIONS)
+            weight = INTENSITY if after.lstrip().startswith(THAI_INTENSIFIERS) else 1.0
+            found.append((self.index[match.group()], weight, negated))
+        for match in self._english_re.finditer(lowered):
+            previous = lowered[:match.start()].split()[-2:]
+            negated = any(word in ENGLISH_NEGATIONS for word in previous)
+            weight = INTENSITY if previous and previous[-1] in ENGLISH_INTENSIFIERS else 1.0
+            found.append((self.index[match.group()], weight, negated))
+        return found
+
+    def _features(self, messages, emojis):
+        """matrix จำนวนคำที่พบ (n x จำนวนคำ) แยกคำปกติ คำที่ถูกปฏิเสธ และอีโมจิที่ผู้ใช้เลือก"""
+        shape = (len(messages), len(self.terms))
+        plain, negated, chosen = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+        for row, (message, emoji) in enumerate(zip(messages, emojis)):
+            for column, weight, is_negated in self._matches(message or ""):
+                (negated if is_negated else plain)[row, column] += weight
+            for column, weight, _ in self._matches(emoji or ""):
+                if self.emoji_terms[column]:
+                    chosen[row, column] += EMOJI_WEIGHT * weight
+        return plain, negated, chosen
+
+    def score_batch(self, messages, emojis):
+        """วิเคราะห์หลายข้อความพร้อมกัน คืน list ของ {"emotion", "emotionScore", "confidence"}"""
+        if not messages:
+            return []
+        plain, negated, chosen = self._features(messages, emojis)
+        text_valence = plain @ self.valence - 0.5 * (negated @ self.valence)
+        emoji_valence = chosen @ self.valence
+        valence = text_valence + emoji_valence
+        scores = np.clip(np.rint(50 + 50 * np.tanh(valence / 1.5)), 0, 100).astype(int)
+
+        evidence = (plain + chosen) @ self.evidence
+        total = evidence.sum(axis=1)
+        best = evidence.argmax(axis=1)
+        share = np.divide(evidence.max(axis=1), total, out=np.zeros_like(total), where=total > 0)
+        strength = 1 - np.exp(-total / 1.2)
+        # คำที่ถูกปฏิเสธ ("ไม่ดี", "not happy") บอกขั้วได้แต่ไม่บอกอารมณ์ชัด จึงลดความมั่นใจลง
+        uncertain = negated @ np.maximum(np.abs(self.valence), 0.5)
+        certainty = np.divide(total, total + uncertain, out=np.zeros_like(total), where=total > 0)
+        # ข้อความกับอีโมจิขัดกัน (เช่น "ดีใจมาก 😭") มักเป็นประชด/ซับซ้อน ให้ Gemini ตัดสิน
+        conflict = (text_valence * emoji_valence < 0) & (np.abs(text_valence) > 0.3)
+        lengths = np.array([len(message or "") for message in messages])
+        confidence = strength * share * certainty * np.where(conflict, 0.4, 1.0) * (lengths <= self.max_chars)
+
+        return [
+            {
+                "emotion": EMOTIONS[best[i]] if total[i] > 0 else NEUTRAL,
+                "emotionScore": int(scores[i]),
+                "confidence": round(float(confidence[i]), 3),
+            }
+            for i in range(len(messages))
+        ]
+
+    def score(self, message, emoji=""):
+        return self.score_batch([message], [emoji])[0]
+
+
+scorer = LocalScorer()
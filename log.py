@@ -0,0 +1,56 @@
+"""logger ของแอป: มีระดับ และเขียนลง stdout ผ่านคิวด้วย thread แยก (request ไม่ต้องรอ I/O)
+
+    LOG_LEVEL=DEBUG | INFO | WARNING | ERROR | OFF   (ค่าเริ่มต้น INFO)
+
+ข้อความที่ต่ำกว่าระดับที่ตั้งไว้จะไม่ถูก format เลย จึงควรส่งค่าแยกแบบ logger.debug("... %s", value)
+แทน f-string ส่วน dump ขนาดใหญ่ให้ครอบด้วย logger.isEnabledFor(logging.DEBUG)
+"""
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+
+_root = logging.getLogger("moodmate")
+_root.propagate = False
+_queue_handler = None
+_listener = None
+
+
+def _start_listener():
+    """เริ่ม thread ที่เขียน log (เรียกใหม่ใน process ลูกหลัง fork เพราะ thread ไม่ถูกคัดลอกไปด้วย)"""
+    global _listener
+    records = queue.SimpleQueue()
+    _queue_handler.queue = records
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    _listener = logging.handlers.QueueListener(records, output)
+    _listener.start()
+
+
+def flush():
+    """เขียน log ที่ค้างในคิวให้หมดแล้วหยุด thread (เรียกตอนปิดโปรแกรม)"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+if LOG_LEVEL == "OFF":
+    # สูงกว่าทุกระดับ: isEnabledFor เป็น False ทุกครั้ง ไม่มีการสร้าง LogRecord
+    _root.setLevel(logging.CRITICAL + 1)
+else:
+    _root.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+    _queue_handler = logging.handlers.QueueHandler(queue.SimpleQueue())
+    _root.addHandler(_queue_handler)
+    _start_listener()
+    atexit.register(flush)
+    if hasattr(os, "register_at_fork"):
+        os.register_at_fork(after_in_child=_start_listener)
+
+
+def get_logger(name):
+    return _root.getChild(name)
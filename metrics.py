@@ -0,0 +1,156 @@
+"""ตัวเก็บ metrics ในหน่วยความจำและแปลงเป็น Prometheus text format สำหรับ /metrics
+
+- Counter: ค่าที่เพิ่มขึ้นอย่างเดียว (จำนวน error, จำนวน token)
+- Histogram: การกระจายของเวลา (latency ของ route, Gemini, MongoDB, JSON) จับเวลาด้วย `with histogram.time(...)`
+- register_collector: ค่าที่อ่านจาก stats() เดิมของแคช/คิวตอน scrape (ไม่ต้องนับซ้ำใน hot path)
+
+ค่าเป็นของแต่ละ process (แบบเดียวกับ /debug/cache) ถ้ารันหลาย worker ให้ Prometheus scrape ทุก process
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+# วินาที: ครอบคลุมตั้งแต่ query MongoDB (ms) ถึง Gemini ที่ตอบช้า (หลายสิบวินาที)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+_registry = []
+_collectors = []
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def values(self):
+        """สำเนาค่าทั้งหมด {tuple ของค่า label: ค่า} (สำหรับ /debug/cache)"""
+        with self._lock:
+            return dict(self._values)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [จำนวนในแต่ละ bucket (ไม่สะสม), ผลรวม, จำนวนทั้งหมด]
+        self._values = {}
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = i
+                break
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels):
+        series = self._values.get(tuple(str(labels.get(name, "")) for name in self.labelnames))
+        return series[2] if series else 0
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else _format_value(float(bound))
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', le)])} {cumulative}")
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+                lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+def register_collector(fn):
+    """fn() คืน [(name, type, help, [(labels dict, value)])] ถูกเรียกทุกครั้งที่ render()"""
+    _collectors.append(fn)
+    return fn
+
+
+def render():
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    for collector in _collectors:
+        try:
+            families = collector()
+        except Exception as e:
+            families = [("moodmate_metrics_collector_errors", "gauge", f"collector {collector.__name__} failed: {e}", [({}, 1)])]
+        for name, kind, help_text, samples in families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, value in samples:
+                if value is None:
+                    continue
+                lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+# metrics ที่ใช้ร่วมกันหลายโมดูล
+REQUEST_SECONDS = Histogram("moodmate_http_request_duration_seconds", "Time to produce a response per route",
+                            ("route", "method", "status"))
+GEMINI_SECONDS = Histogram("moodmate_gemini_call_duration_seconds", "Gemini generate_content latency",
+                           ("mode", "outcome"))
+MONGODB_SECONDS = Histogram("moodmate_mongodb_command_duration_seconds", "MongoDB command latency (server round trip)",
+                            ("command", "outcome"))
+JSON_SECONDS = Histogram("moodmate_json_duration_seconds", "JSON serialization and parsing time", ("kind",),
+                         buckets=(0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5))
+LLM_CHARS = Counter("moodmate_llm_chars_total", "Characters sent to / received from Gemini", ("direction",))
+LLM_TOKENS = Counter("moodmate_llm_tokens_total", "Tokens reported by Gemini usage_metadata", ("direction",))
+ERRORS = Counter("moodmate_errors_total", "Errors by component and operation", ("component", "operation"))
@@ -0,0 +1,224 @@
+"""ย้ายประวัติอารมณ์จากไฟล์ JSON (export เก่า) เข้า MongoDB แบบ batch
+
+    python migration.py emotion_history.json --batch-size 1000 --checkpoint migration.checkpoint.json
+
+- อ่านไฟล์ทีละส่วน (ไม่ json.load ทั้งไฟล์) รองรับทั้งรูปแบบ {user_id: [entries]} และ [entries]
+- เขียนด้วย insert_many(ordered=False) ทีละ batch และอัพเดท user_daily_stats แบบรวมต่อวัน
+- บันทึก checkpoint หลังทุก batch ถ้า process ตายกลางทางให้รันคำสั่งเดิมซ้ำเพื่อทำต่อ
+  แต่ละ entry ได้ _id ที่คำนวณจากไฟล์+ลำดับ จึงรันซ้ำ batch เดิมได้โดยไม่เกิดข้อมูลซ้ำ
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+# user id ของไฟล์รูปแบบเก่า (list ของ entries ไม่แยกตาม user)
+LEGACY_USER_ID = "1"
+DUPLICATE_KEY = 11000
+
+
+class _StreamReader:
+    """อ่าน JSON จากไฟล์ทีละ chunk แล้ว decode ทีละค่าด้วย raw_decode"""
+
+    def __init__(self, f, chunk_size=64 * 1024):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        more = self.f.read(self.chunk_size)
+        self.buf = self.buf[self.pos:] + more
+        self.pos = 0
+        return bool(more)
+
+    def peek(self):
+        """คืนตัวอักษรถัดไปที่ไม่ใช่ช่องว่าง ('' เมื่อจบไฟล์)"""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"Expected {char!r} but found {found!r}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                # ค่ายังไม่ครบใน buffer: อ่านเพิ่มแล้วลองใหม่ (ถ้าจบไฟล์แล้วแปลว่า JSON เสีย)
+                if not self._fill():
+                    raise
+                continue
+            self.pos = end
+            return value
+
+    def array_items(self):
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.value()
+            separator = self.peek()
+            self.pos += 1
+            if separator == "]":
+                return
+            if separator != ",":
+                raise ValueError(f"Expected ',' or ']' but found {separator!r}")
+
+
+def iter_json_entries(f, chunk_size=64 * 1024):
+    """ไล่ (user_id, entry) จากไฟล์ JSON โดยไม่โหลดทั้งไฟล์"""
+    reader = _StreamReader(f, chunk_size)
+    first = reader.peek()
+    if first == "":
+        return
+    if first == "[":
+        for entry in reader.array_items():
+            yield LEGACY_USER_ID, entry
+        return
+
+    reader.expect("{")
+    if reader.peek() == "}":
+        return
+    while True:
+        user_id = reader.value()
+        reader.expect(":")
+        for entry in reader.array_items():
+            yield str(user_id), entry
+        separator = reader.peek()
+        reader.pos += 1
+        if separator == "}":
+            return
+        if separator != ",":
+            raise ValueError(f"Expected ',' or '}}' but found {separator!r}")
+
+
+def entry_object_id(source_key, index):
+    """_id ที่คำนวณซ้ำได้จากไฟล์ต้นทาง+ลำดับ ทำให้ insert ซ้ำแล้วชน duplicate key แทนที่จะได้ข้อมูลซ้ำ"""
+    return ObjectId(hashlib.sha256(f"{source_key}:{index}".encode("utf-8")).digest()[:12])
+
+
+def load_checkpoint(path, source_key):
+    if not path or not os.path.exists(path):
+        return 0
+    with open(path, "r", encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    if checkpoint.get("source") != source_key:
+        print(f"⚠️ Checkpoint {path} belongs to another file, starting from the beginning")
+        return 0
+    return checkpoint.get("done", 0)
+
+
+def save_checkpoint(path, source_key, done):
+    if not path:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"source": source_key, "done": done, "updated_at": datetime.utcnow().isoformat()}, f)
+    os.replace(tmp_path, path)
+
+
+def _write_batch(db, batch):
+    """insert batch แบบ ordered=False แล้วอัพเดทสถิติรายวันเฉพาะ entry ที่ insert สำเร็จ"""
+    from database import history_fingerprint_update, merge_daily_stats_updates
+
+    failed = set()
+    try:
+        db.emotion_history.insert_many(batch, ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            if error.get("code") != DUPLICATE_KEY:
+                raise
+            failed.add(error["index"])
+
+    inserted = [entry for index, entry in enumerate(batch) if index not in failed]
+    # entries ใน batch มักตกอยู่ไม่กี่วัน จึงรวมเป็น update เดียวต่อ (user_id, date)
+    for stats_filter, update in merge_daily_stats_updates(inserted):
+        db.user_daily_stats.update_one(stats_filter, update, upsert=True)
+
+    # ประวัติเปลี่ยน ผลประเมินที่แคชไว้ของ user เหล่านี้ต้องไม่ถูกใช้ซ้ำ
+    fingerprints = {}
+    for entry in inserted:
+        count, last_entry_at = fingerprints.get(entry["user_id"], (0, entry["created_at"]))
+        fingerprints[entry["user_id"]] = (count + 1, max(last_entry_at, entry["created_at"]))
+    for user_id, (count, last_entry_at) in fingerprints.items():
+        db.user_evaluations.update_one(*history_fingerprint_update(user_id, count, last_entry_at), upsert=True)
+    return len(inserted)
+
+
+def migrate_json_file(mongodb, json_file_path, batch_size=1000, checkpoint_path=None, log_every=10):
+    """ย้าย entries จากไฟล์ JSON เข้า emotion_history คืนจำนวนที่ insert ใหม่"""
+    source_key = os.path.abspath(json_file_path)
+    skip = load_checkpoint(checkpoint_path, source_key)
+    if skip:
+        print(f"⏩ Resuming after {skip} entries")
+
+    started = time.perf_counter()
+    done = skip
+    inserted = 0
+    batches = 0
+    batch = []
+
+    with open(json_file_path, "r", encoding="utf-8") as f:
+        for index, (user_id, entry) in enumerate(iter_json_entries(f)):
+            if index < skip:
+                continue
+            entry["_id"] = entry_object_id(source_key, index)
+            entry["user_id"] = user_id
+            entry["created_at"] = datetime.utcnow()
+            batch.append(entry)
+            if len(batch) >= batch_size:
+                inserted += _write_batch(mongodb.db, batch)
+                done += len(batch)
+                batch = []
+                batches += 1
+                save_checkpoint(checkpoint_path, source_key, done)
+                if batches % log_every == 0:
+                    rate = (done - skip) / (time.perf_counter() - started)
+                    print(f"📦 {done} entries processed ({rate:,.0f} rows/sec)")
+
+    if batch:
+        inserted += _write_batch(mongodb.db, batch)
+        done += len(batch)
+        save_checkpoint(checkpoint_path, source_key, done)
+
+    elapsed = time.perf_counter() - started
+    rate = (done - skip) / elapsed if elapsed else 0
+    print(f"✅ Migrated {inserted} new emotion entries ({done - skip} read) in {elapsed:.1f}s, {rate:,.0f} rows/sec")
+    return inserted
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("json_file")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--checkpoint", default=None, help="ไฟล์ checkpoint (default: <json_file>.checkpoint.json)")
+    args = parser.parse_args()
+
+    from database import mongodb
+
+    if not mongodb.client:
+        print("❌ MongoDB not available")
+        raise SystemExit(1)
+    checkpoint = args.checkpoint or f"{args.json_file}.checkpoint.json"
+    migrate_json_file(mongodb, args.json_file, args.batch_size, checkpoint)
+
+
+if __name__ == "__main__":
+    main()
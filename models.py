@@ -8,18 +8,17 @@ class User(UserMixin):
 
     @staticmethod
     def get(user_id):
-        """ดึง user จาก MongoDB"""
+        """ดึง user จาก MongoDB (ถ้า MongoDB ไม่พร้อมจะ raise DatabaseUnavailableError ไม่ใช่ return None
+        เพื่อไม่ให้ user ที่ล็อกอินอยู่ถูกพาไปหน้า signin)"""
         from database import mongodb
         
-        if mongodb.client:
-            user_data = mongodb.get_user_by_id(user_id)
-            if user_data:
-                return User(
-                    user_data['user_id'],
-                    user_data['username'], 
-                    user_data['password']
-                )
-        # หาก MongoDB ไม่พร้อม ให้ return None
+        user_data = mongodb.get_user_by_id(user_id)
+        if user_data:
+            return User(
+                user_data['user_id'],
+                user_data['username'], 
+                user_data['password']
+            )
         return None
 
     @staticmethod
@@ -46,8 +45,9 @@ class User(UserMixin):
         
         # Generate user ID
         if mongodb.client:
-            all_users = mongodb.get_all_users()
-            user_id = str(len(all_users) + 1)
+            user_id = mongodb.next_user_id()
+            if user_id is None:
+                return None
         else:
             # MongoDB not available, cannot create user
             return None
@@ -56,8 +56,8 @@ class User(UserMixin):
         
         # พยายามบันทึกลง MongoDB ก่อน
         if mongodb.client:
-            success = mongodb.create_user(user_id, username, hashed_password)
-            if success:
+            user_id = mongodb.create_user(user_id, username, hashed_password)
+            if user_id:
                 return User(user_id, username, hashed_password)
         
         # หาก MongoDB ไม่พร้อม ให้ return None
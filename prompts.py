@@ -0,0 +1,113 @@
+"""registry ของ prompt template: อ่าน/เตรียมครั้งเดียวแล้วเก็บไว้ในหน่วยความจำ และโหลดใหม่เมื่อไฟล์ถูกแก้
+
+    PROMPT_RELOAD_INTERVAL=2   ตรวจ mtime ของไฟล์ template ห่างกันอย่างน้อยกี่วินาที (0 = ไม่โหลดใหม่)
+
+template แบ่งเป็น prefix คงที่ (คำสั่ง ตัวอย่าง รูปแบบข้อมูล) กับ suffix สั้น ๆ ที่มีค่าของแต่ละ request
+prefix อยู่หน้าสุดเสมอ request ที่ใช้ template เดียวกันจึงขึ้นต้นเหมือนกันทุกตัวอักษร (Gemini cache prefix ได้
+ดู GEMINI_CONTEXT_CACHE ใน gemini.py) ส่วน version_id ("analyze@<hash>") เปลี่ยนทุกครั้งที่เนื้อหาเปลี่ยน
+และถูกบันทึกไปกับผลวิเคราะห์/ผลประเมิน เพื่อรู้ว่าผลแต่ละรายการมาจาก prompt รุ่นไหน
+"""
+import hashlib
+import os
+import textwrap
+import threading
+import time
+
+from log import get_logger
+
+logger = get_logger("prompts")
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class PromptTemplate:
+    def __init__(self, template_id, prefix, suffix=""):
+        self.id = template_id
+        self.prefix = prefix
+        self.suffix = suffix
+        digest = hashlib.sha256(f"{prefix}\0{suffix}".encode("utf-8")).hexdigest()
+        self.version = digest[:12]
+        self.version_id = f"{template_id}@{self.version}"
+
+    def render(self, **values):
+        """prefix + suffix ที่แทนค่าแล้ว (str.format แทนค่าเฉพาะใน suffix ค่าที่มี { } ไม่กระทบ)"""
+        return self.prefix + self.suffix.format(**values)
+
+
+class PromptRegistry:
+    def __init__(self, reload_interval=2.0):
+        self.reload_interval = reload_interval
+        self.reloads = 0
+        self._templates = {}
+        # template_id -> {"path", "static_tail", "suffix", "mtime", "next_check"} ของ template ที่มาจากไฟล์
+        self._sources = {}
+        self._lock = threading.Lock()
+
+    def register(self, template_id, prefix, suffix=""):
+        """template ในโค้ด: ตัดย่อหน้าร่วมของ prefix ออกครั้งเดียวตอน import (ไม่ส่งช่องว่างนำหน้าไปทุก call)"""
+        template = PromptTemplate(template_id, textwrap.dedent(prefix).lstrip("\n"), suffix)
+        self._templates[template_id] = template
+        return template
+
+    def register_file(self, template_id, path, static_tail="", suffix=""):
+        """template จากไฟล์ (path สัมพันธ์กับโฟลเดอร์โปรเจกต์ ไม่ขึ้นกับ working directory)
+        prefix = เนื้อหาไฟล์ + static_tail, อ่านไฟล์ตอน get() ครั้งแรก"""
+        self._sources[template_id] = {
+            "path": path if os.path.isabs(path) else os.path.join(BASE_DIR, path),
+            "static_tail": static_tail,
+            "suffix": suffix,
+            "mtime": None,
+            "next_check": 0.0,
+        }
+
+    def get(self, template_id):
+        """template ล่าสุด (raise FileNotFoundError ถ้าไฟล์ของ template ไม่มีตั้งแต่แรก, KeyError ถ้าไม่รู้จัก id)"""
+        source = self._sources.get(template_id)
+        if source is not None:
+            template = self._templates.get(template_id)
+            if template is None or (self.reload_interval > 0 and time.monotonic() >= source["next_check"]):
+                self._reload(template_id, source)
+        return self._templates[template_id]
+
+    def _reload(self, template_id, source):
+        with self._lock:
+            now = time.monotonic()
+            if template_id in self._templates and now < source["next_check"]:
+                return  # thread อื่นเพิ่งตรวจไป
+            source["next_check"] = now + self.reload_interval
+            try:
+                mtime = os.stat(source["path"]).st_mtime_ns
+                if mtime == source["mtime"]:
+                    return
+                with open(source["path"], "r", encoding="utf-8") as f:
+                    text = f.read()
+            except OSError as e:
+                if template_id not in self._templates:
+                    raise FileNotFoundError(f"Prompt file not found: {source['path']}") from e
+                # ไฟล์หาย/อ่านไม่ได้ระหว่างแก้: ใช้ template เดิมต่อ
+                logger.warning("⚠️ Could not reload prompt %s, keeping the loaded version: %s", template_id, e)
+                return
+            template = PromptTemplate(template_id, text + source["static_tail"], source["suffix"])
+            previous = self._templates.get(template_id)
+            source["mtime"] = mtime
+            if previous is not None and previous.version == template.version:
+                return  # แค่ touch ไฟล์ เนื้อหาเดิม
+            self._templates[template_id] = template
+            if previous is not None:
+                self.reloads += 1
+                logger.info("🔄 Prompt %s reloaded: %s -> %s", template_id, previous.version, template.version)
+
+    def stats(self):
+        return {
+            "reloads": self.reloads,
+            "reload_interval": self.reload_interval,
+            "templates": {
+                template_id: {"version": template.version_id, "prefix_chars": len(template.prefix),
+                              "source": self._sources[template_id]["path"] if template_id in self._sources
+                              else "inline"}
+                for template_id, template in self._templates.items()
+            },
+        }
+
+
+registry = PromptRegistry(reload_interval=float(os.environ.get("PROMPT_RELOAD_INTERVAL", 2)))
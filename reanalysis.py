@@ -0,0 +1,266 @@
+"""วิเคราะห์ entry เก่าใน emotion_history ที่ยังไม่มี emotion/summary ใหม่ แล้วบันทึกผลกลับ
+
+    python reanalysis.py --dry-run
+    python reanalysis.py --workers 4 --rate 2 --batch-size 50
+
+- ไล่ collection ด้วย cursor เรียงตาม _id ทีละ batch
+- วิเคราะห์ด้วย Gemini ผ่าน thread pool ขนาด --workers และจำกัดไม่เกิน --rate call/วินาที
+- เขียนผลกลับด้วย bulk_write (รวมถึงอัพเดท user_daily_stats และล้างผลประเมินที่แคชไว้ของ user นั้น)
+- บันทึก _id ล่าสุดใน checkpoint ทุก batch รันซ้ำเพื่อทำต่อได้ (checkpoint หยุดก่อน entry แรกที่ล้มเหลว
+  รันซ้ำจึงลอง entry นั้นใหม่ ส่วน entry ที่สำเร็จแล้วหลุดจาก LEGACY_QUERY ไม่ถูกทำซ้ำ)
+- entry ที่ไม่มี message ใช้ข้อความจาก analysis แบบตัดสั้นแทน (แบบเดียวกับที่ read path เคยทำทุกครั้ง)
+- ให้คะแนนทั้ง batch ด้วย local_scorer ก่อน entry ที่มั่นใจถึง --local-threshold ไม่ต้องเรียก Gemini
+  (--no-local เพื่อส่งทุก entry ให้ Gemini)
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+LEGACY_QUERY = {"$or": [{"emotion": {"$exists": False}}, {"summary": {"$exists": False}}]}
+PROJECTION = {"message": 1, "emoji": 1, "analysis": 1, "emotion": 1, "summary": 1,
+              "emotionScore": 1, "user_id": 1, "date": 1}
+
+
+class IntervalLimiter:
+    """ปล่อยให้ผ่านได้ไม่เกิน rate ครั้งต่อวินาที (กระจายเท่า ๆ กันระหว่าง thread)"""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate > 0 else 0
+        self._lock = threading.Lock()
+        self._next = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def legacy_fields(entry):
+    """ค่า emotion/summary จาก analysis แบบเดิม (ใช้เมื่อไม่มี message ให้วิเคราะห์)"""
+    analysis = entry.get("analysis") or ""
+    return {
+        "emotion": analysis[:50] + "..." if analysis else "N/A",
+        "summary": analysis[:100] + "..." if analysis else "N/A",
+    }
+
+
+def score_batch_locally(batch, threshold):
+    """ผลของ local_scorer สำหรับ entry ที่มั่นใจถึง threshold (index ใน batch -> ผล)"""
+    from local_scorer import scorer
+
+    candidates = [i for i, entry in enumerate(batch) if entry.get("message")]
+    if threshold is None or not candidates:
+        return {}
+    results = scorer.score_batch([batch[i]["message"] for i in candidates],
+                                 [batch[i].get("emoji", "") for i in candidates])
+    return {
+        # ไม่มีสรุปจาก AI: ใช้ "N/A" (entry จึงหลุดจาก LEGACY_QUERY) และ analyze_entry ไม่ทับ summary ที่มีอยู่แล้ว
+        i: {"emotion": result["emotion"], "summary": "N/A", "emotionScore": result["emotionScore"],
+            "promptVersion": scorer.version}
+        for i, result in zip(candidates, results)
+        if result["confidence"] >= threshold
+    }
+
+
+def analysis_flow(message, emoji):
+    """flow ของ app.run_model_flow: ถาม Gemini แล้วแปลงผลตาม ANALYZE_SCHEMA (ซ่อม JSON ได้ 1 ครั้ง)"""
+    import app
+    from structured_output import ANALYZE_SCHEMA, parse_structured
+
+    text = yield app.build_analyze_prompt(message, emoji)
+    return (yield from parse_structured(text, ANALYZE_SCHEMA, "reanalysis"))
+
+
+def analyze_entry(entry, limiter, local_result=None):
+    """คืน dict ของ field ที่ต้อง $set ให้ entry"""
+    import app
+
+    if local_result is not None:
+        result = local_result
+    elif not entry.get("message"):
+        result = legacy_fields(entry)
+    else:
+        limiter.wait()
+        ai_result = app.run_model_flow(analysis_flow(entry["message"], entry.get("emoji", "")))
+        result = {
+            "emotion": ai_result.get("emotion", "N/A"),
+            "summary": ai_result.get("summary", "N/A"),
+            "emotionScore": ai_result.get("emotionScore", 50),
+            "promptVersion": app.ANALYZE_PROMPT.version_id,
+        }
+    # เติมเฉพาะ field ที่ยังไม่มี ไม่ทับข้อมูลเดิม
+    return {field: value for field, value in result.items() if field not in entry}
+
+
+def stats_update(entry, fields):
+    """update ของ user_daily_stats สำหรับ field ที่เพิ่งเติม (entry ถูกนับจำนวนไปแล้วตอนบันทึก)"""
+    from database import daily_stats_update
+
+    if not entry.get("user_id"):
+        return None
+    stats_filter, update = daily_stats_update({"user_id": entry["user_id"], "date": entry.get("date"), **fields})
+    del update["$inc"]["entries"]
+    if len(update["$inc"]) == 0:
+        return None
+    return UpdateOne(stats_filter, update, upsert=True)
+
+
+def load_checkpoint(path):
+    if not path or not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return ObjectId(json.load(f)["last_id"])
+
+
+def save_checkpoint(path, last_id):
+    if not path:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"last_id": str(last_id), "updated_at": datetime.utcnow().isoformat()}, f)
+    os.replace(tmp_path, path)
+
+
+def last_done_id(batch, results):
+    """_id ของ entry สุดท้ายก่อน entry แรกที่ล้มเหลว (ผลเป็น None) หรือ None ถ้า entry แรกล้มเหลว"""
+    for index, fields in enumerate(results):
+        if fields is None:
+            return batch[index - 1]["_id"] if index else None
+    return batch[-1]["_id"]
+
+
+def iter_batches(cursor, batch_size):
+    batch = []
+    for entry in cursor:
+        batch.append(entry)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def reanalyze(db, workers=4, rate=2.0, batch_size=50, checkpoint_path=None, dry_run=False, limit=0,
+              local_threshold=None):
+    query = dict(LEGACY_QUERY)
+    last_id = load_checkpoint(checkpoint_path)
+    if last_id:
+        query["_id"] = {"$gt": last_id}
+        print(f"⏩ Resuming after _id {last_id}")
+
+    total = db.emotion_history.count_documents(query)
+    if limit:
+        total = min(total, limit)
+    print(f"🔍 {total} entries need re-analysis")
+    if dry_run:
+        for entry in db.emotion_history.find(query, PROJECTION).sort("_id", 1).limit(5):
+            print(f"   {entry['_id']} user={entry.get('user_id')} date={entry.get('date')} "
+                  f"message={str(entry.get('message', ''))[:40]!r}")
+        return {"candidates": total, "updated": 0, "failed": 0, "local": 0}
+
+    limiter = IntervalLimiter(rate)
+    cursor = db.emotion_history.find(query, PROJECTION).sort("_id", 1)
+    if limit:
+        cursor = cursor.limit(limit)
+
+    started = time.perf_counter()
+    processed = updated = failed = local = 0
+    # หลัง entry แรกที่ล้มเหลว checkpoint ไม่เลื่อนอีก ไม่งั้นรอบถัดไปจะข้าม entry นั้นไปถาวร
+    stalled = False
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for batch in iter_batches(cursor, batch_size):
+            local_results = score_batch_locally(batch, local_threshold)
+            local += len(local_results)
+
+            def run(index):
+                entry = batch[index]
+                try:
+                    return analyze_entry(entry, limiter, local_results.get(index))
+                except Exception as e:
+                    print(f"❌ Re-analysis failed for {entry['_id']}: {e}")
+                    return None
+
+            results = list(pool.map(run, range(len(batch))))
+            entry_ops, stats_ops, users = [], [], set()
+            for entry, fields in zip(batch, results):
+                if fields is None:
+                    failed += 1
+                    continue
+                if not fields:
+                    continue
+                entry_ops.append(UpdateOne({"_id": entry["_id"]}, {"$set": fields}))
+                if entry.get("user_id"):
+                    users.add(entry["user_id"])
+                stats_op = stats_update(entry, fields)
+                if stats_op is not None:
+                    stats_ops.append(stats_op)
+
+            if entry_ops:
+                updated += db.emotion_history.bulk_write(entry_ops, ordered=False).modified_count
+            if stats_ops:
+                db.user_daily_stats.bulk_write(stats_ops, ordered=False)
+            if users:
+                db.user_evaluations.bulk_write(
+                    [UpdateOne({"user_id": user_id}, {"$unset": {"result": ""}}) for user_id in sorted(users)],
+                    ordered=False,
+                )
+
+            processed += len(batch)
+            if not stalled:
+                done_id = last_done_id(batch, results)
+                if done_id is not None:
+                    save_checkpoint(checkpoint_path, done_id)
+                stalled = None in results
+            rate_done = processed / (time.perf_counter() - started)
+            print(f"📦 {processed}/{total} processed, {updated} updated, {failed} failed, "
+                  f"{local} scored locally ({rate_done:.1f} entries/sec)")
+
+    print(f"✅ Re-analysis finished: {updated} updated, {failed} failed, {local} scored locally")
+    if stalled and checkpoint_path:
+        print("⚠️ Checkpoint stops before the first failed entry: run again to retry failed entries")
+    return {"candidates": total, "updated": updated, "failed": failed, "local": local}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=2.0, help="จำนวน call สูงสุดต่อวินาที (0 = ไม่จำกัด)")
+    parser.add_argument("--batch-size", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=0, help="ประมวลผลไม่เกิน N entry (0 = ทั้งหมด)")
+    parser.add_argument("--checkpoint", default="reanalysis.checkpoint.json")
+    parser.add_argument("--local-threshold", type=float, default=None,
+                        help="confidence ขั้นต่ำที่ใช้ผล local_scorer แทน Gemini (ค่าเริ่มต้น LOCAL_SCORER_THRESHOLD หรือ 0.7)")
+    parser.add_argument("--no-local", action="store_true", help="ไม่ใช้ local_scorer ส่งทุก entry ให้ Gemini")
+    parser.add_argument("--dry-run", action="store_true", help="นับและแสดงตัวอย่างเท่านั้น ไม่เรียก AI และไม่เขียนข้อมูล")
+    args = parser.parse_args()
+
+    from database import mongodb
+    from local_scorer import DEFAULT_THRESHOLD
+
+    local_threshold = None
+    if not args.no_local:
+        local_threshold = args.local_threshold
+        if local_threshold is None:
+            local_threshold = float(os.environ.get("LOCAL_SCORER_THRESHOLD", DEFAULT_THRESHOLD))
+
+    if not mongodb.client:
+        print("❌ MongoDB not available")
+        raise SystemExit(1)
+    reanalyze(mongodb.db, args.workers, args.rate, args.batch_size,
+              None if args.dry_run else args.checkpoint, args.dry_run, args.limit, local_threshold)
+
+
+if __name__ == "__main__":
+    main()
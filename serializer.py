@@ -0,0 +1,59 @@
+"""แปลงค่าเป็น JSON สำหรับ response และ prompt: ใช้ orjson ถ้าติดตั้งไว้ ไม่งั้นใช้ json ของ stdlib
+
+    JSON_BACKEND=orjson | json   (ค่าเริ่มต้น orjson ถ้า import ได้)
+
+ทั้งสอง backend ให้ผลแบบเดียวกัน: compact (ไม่มีช่องว่าง), UTF-8 ไม่ escape ภาษาไทยเป็น \\uXXXX, ไม่เรียง key
+และแปลงชนิดของ BSON ได้เลยโดยไม่ต้องไล่แปลงทีละ entry: ObjectId -> str, datetime/date -> ISO 8601
+(datetime ที่ไม่มี timezone ถือเป็น UTC ตามที่ pymongo คืนมา), Decimal128/Decimal/UUID -> str
+"""
+import json
+import os
+import uuid
+from datetime import date, datetime, timezone
+from decimal import Decimal
+
+from bson import Decimal128, ObjectId
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = os.environ.get("JSON_BACKEND", "orjson" if orjson else "json")
+if BACKEND == "orjson" and orjson is None:
+    BACKEND = "json"
+
+_ORJSON_OPTIONS = (orjson.OPT_NAIVE_UTC | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+
+def default(value):
+    """ชนิดที่ json แปลงเองไม่ได้ (orjson แปลง datetime/date/UUID เองอยู่แล้ว)"""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return (value if value.tzinfo else value.replace(tzinfo=timezone.utc)).isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (Decimal128, Decimal, uuid.UUID)):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps_bytes(value, indent=False):
+    if BACKEND == "orjson":
+        return orjson.dumps(value, default=default, option=_ORJSON_OPTIONS | (orjson.OPT_INDENT_2 if indent else 0))
+    return dumps(value, indent).encode("utf-8")
+
+
+def dumps(value, indent=False):
+    if BACKEND == "orjson":
+        return dumps_bytes(value, indent).decode("utf-8")
+    if indent:
+        return json.dumps(value, default=default, ensure_ascii=False, indent=2)
+    return json.dumps(value, default=default, ensure_ascii=False, separators=(",", ":"))
+
+
+def loads(data):
+    if BACKEND == "orjson":
+        return orjson.loads(data)
+    return json.loads(data)
@@ -0,0 +1,115 @@
+import asyncio
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# leader เลิกทำกลางคันโดยไม่มีผลหรือ error ที่ควรส่งต่อ
+_ABANDONED = object()
+
+
+class SingleFlight:
+    """รวม call ที่มี key เดียวกันและเกิดพร้อมกันให้เหลือครั้งเดียว
+
+    ผู้เรียกคนแรกของ key จะเป็นคนเรียกจริง คนที่ตามมาระหว่างที่ยังไม่เสร็จจะรอและได้ผลลัพธ์
+    (หรือ exception) ชุดเดียวกัน ใช้ได้ทั้งแบบ thread (do) และ asyncio (do_async)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._async_calls = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        call = self.begin(key)
+        if call is not None:
+            try:
+                result = fn()
+            except BaseException as e:
+                self.finish(key, call, error=e)
+                raise
+            self.finish(key, call, result)
+            return result
+
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                self.coalesced += 1
+        if call is None:
+            # leader เพิ่งทำเสร็จระหว่างนี้: เรียกเองใหม่
+            return self.do(key, fn)
+        call.done.wait()
+        if call.error is _ABANDONED:
+            return self.do(key, fn)
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def begin(self, key):
+        """เป็นผู้เรียกจริงของ key เอง (สำหรับงานที่ได้ผลทีละส่วน เช่น streaming ที่ใช้ do ไม่ได้)
+
+        คืน _Call ถ้าได้เป็น leader (ต้องเรียก finish เสมอ) หรือ None ถ้ามี call ของ key นี้ทำอยู่แล้ว
+        """
+        with self._lock:
+            if key in self._calls:
+                return None
+            call = self._calls[key] = _Call()
+            self.calls += 1
+            return call
+
+    def finish(self, key, call, result=None, error=None):
+        """ส่งผลของ leader ให้ผู้ที่รออยู่ error ที่ไม่ใช่ Exception (เช่น GeneratorExit เมื่อ client ตัดการเชื่อมต่อ)
+        ไม่ส่งต่อ ผู้รอจะเรียกเองใหม่แทน"""
+        call.result = result
+        call.error = error if error is None or isinstance(error, Exception) else _ABANDONED
+        with self._lock:
+            del self._calls[key]
+        call.done.set()
+
+    async def do_async(self, key, coro_fn):
+        loop = asyncio.get_running_loop()
+        future = self._async_calls.get((loop, key))
+        if future is not None:
+            with self._lock:
+                self.coalesced += 1
+            # shield: ผู้รอที่ถูกยกเลิกต้องไม่ยกเลิก call ของคนอื่นไปด้วย
+            result = await asyncio.shield(future)
+            if result is _ABANDONED:
+                # leader ถูกยกเลิก: ผู้รอไม่ได้ถูกยกเลิกด้วย จึงเรียกใหม่ (คนแรกที่มาถึงเป็น leader คนใหม่)
+                return await self.do_async(key, coro_fn)
+            return result
+
+        future = self._async_calls[(loop, key)] = loop.create_future()
+        with self._lock:
+            self.calls += 1
+        try:
+            result = await coro_fn()
+        except Exception as e:
+            future.set_exception(e)
+            # ทำเครื่องหมายว่าอ่าน exception แล้ว กัน warning ตอนไม่มีใครรอ
+            future.exception()
+            raise
+        except BaseException:
+            # CancelledError ฯลฯ ของ leader เอง ไม่ส่งต่อให้ผู้รอ (เหมือน _ABANDONED ของ finish)
+            future.set_result(_ABANDONED)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            del self._async_calls[(loop, key)]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._calls) + len(self._async_calls),
+            }
@@ -0,0 +1,72 @@
+import json
+
+
+def sse_event(event, data):
+    """จัดรูปแบบ Server-Sent Event หนึ่งรายการ (data เป็น JSON บรรทัดเดียว)"""
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+class JsonFieldStream:
+    """แยก field ระดับบนสุดของ JSON object จากข้อความที่ทยอยมาทีละ chunk
+
+    feed() คืน [(name, value)] ของ field ที่ค่าครบแล้ว ทำให้ส่ง `risk` ให้ client ได้ก่อนที่ `reason`
+    และ `advice` จะถูกสร้างเสร็จ ข้อความก่อน `{` (เช่น ```json) ถูกข้ามไป ถ้าเจอ JSON ที่ไม่ถูกต้องจะหยุด
+    แยกเงียบ ๆ (ผู้เรียกยังต้อง parse ข้อความเต็มอีกครั้งตอนจบ)
+    """
+
+    def __init__(self):
+        self.buf = ""
+        self.pos = None
+        self.done = False
+        self.fields = {}
+        self._decoder = json.JSONDecoder()
+
+    def _skip(self, pos, extra=""):
+        while pos < len(self.buf) and (self.buf[pos].isspace() or self.buf[pos] in extra):
+            pos += 1
+        return pos
+
+    def _decode(self, pos):
+        try:
+            return self._decoder.raw_decode(self.buf, pos)
+        except json.JSONDecodeError:
+            return None
+
+    def feed(self, text):
+        self.buf += text
+        found = []
+        if self.pos is None:
+            start = self.buf.find("{")
+            if start < 0:
+                return found
+            self.pos = start + 1
+
+        while not self.done:
+            pos = self._skip(self.pos, ",")
+            if pos >= len(self.buf):
+                break
+            if self.buf[pos] == "}":
+                self.done = True
+                break
+            decoded_key = self._decode(pos)
+            if decoded_key is None:
+                break
+            key, end = decoded_key
+            colon = self._skip(end)
+            if colon >= len(self.buf):
+                break
+            if not isinstance(key, str) or self.buf[colon] != ":":
+                self.done = True
+                break
+            value_start = self._skip(colon + 1)
+            decoded_value = self._decode(value_start) if value_start < len(self.buf) else None
+            if decoded_value is None:
+                break
+            value, value_end = decoded_value
+            # ตัวเลข/true/false ที่อยู่ท้าย buffer อาจยังมาไม่ครบ (เช่น "8" ของ 85) รอ chunk ถัดไปก่อน
+            if value_end >= len(self.buf) and not isinstance(value, (str, dict, list)):
+                break
+            self.pos = value_end
+            self.fields[key] = value
+            found.append((key, value))
+        return found
@@ -0,0 +1,236 @@
+"""แปลงข้อความตอบกลับของ Gemini เป็น JSON ตาม schema โดยไม่ต้องให้ผู้ใช้กดส่งซ้ำ
+
+- JsonPrompt: prompt (ใช้แทน str ได้) ที่แนบ schema ไว้ call_model ใช้เปิด JSON mode ของ Gemini
+  (response_mime_type + response_schema)
+- extract_json: หา JSON object/array ก้อนแรกที่สมบูรณ์ในข้อความ ข้าม ```json, คำอธิบายก่อน/หลังได้
+- coerce: ตรวจและแปลงชนิดตาม schema (เช่น emotionScore "85", 85.0, "85/100" -> 85)
+- parse_structured: ใช้กับ `yield from` ใน flow ถ้า decode ไม่ได้จะส่ง prompt ซ่อม JSON ให้ Gemini 1 ครั้ง
+
+schema ใช้รูปแบบย่อยของ OpenAPI (type/properties/required/items/minimum/maximum) minimum/maximum ใช้แค่ใน coerce
+เพราะ Schema ของ google-generativeai ไม่รู้จัก ตอนส่งให้ Gemini จึงตัดเหลือเฉพาะ key ใน GEMINI_SCHEMA_KEYS
+"""
+import json
+import re
+
+from log import get_logger
+from metrics import JSON_SECONDS, Counter
+
+logger = get_logger("structured_output")
+
+ANALYZE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "emotion": {"type": "string"},
+        "summary": {"type": "string"},
+        "emotionScore": {"type": "integer", "minimum": 0, "maximum": 100},
+    },
+    "required": ["emotion", "summary", "emotionScore"],
+}
+
+ANALYZE_BATCH_SCHEMA = {
+    "type": "array",
+    "items": {
+        "type": "object",
+        "properties": dict(ANALYZE_SCHEMA["properties"], index={"type": "integer"}),
+        "required": ["index"] + ANALYZE_SCHEMA["required"],
+    },
+}
+
+EVALUATION_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "risk": {"type": "string"},
+        "reason": {"type": "string"},
+        "advice": {"type": "string"},
+    },
+    "required": ["risk", "reason", "advice"],
+}
+
+# ข้อความเดิมที่แนบไปกับ prompt ซ่อม (กัน prompt ยาวเกินเมื่อ Gemini ตอบยาวผิดปกติ)
+REPAIR_INPUT_CHARS = 4000
+
+NUMBER_PATTERN = re.compile(r"-?\d+(?:\.\d+)?")
+
+# result: responses, legacy_failures (คำตอบที่วิธีเดิม .replace("```json") + json.loads จะ parse ไม่ได้แล้วตอบ 500),
+# repairs, repaired, failed
+PARSE_RESULTS = Counter("moodmate_structured_output_total", "Model responses decoded per kind and result",
+                        ("kind", "result"))
+PARSE_RESULT_NAMES = ("responses", "legacy_failures", "repairs", "repaired", "failed")
+
+
+class StructuredOutputError(ValueError):
+    pass
+
+
+class JsonPrompt(str):
+    """prompt ที่ต้องการคำตอบเป็น JSON ตาม schema (ส่วนอื่นของโค้ดใช้เป็น str ได้ตามปกติ)
+
+    template = PromptTemplate ที่ใช้สร้าง prompt นี้ (ถ้ามี) ให้ gemini.py แยก prefix คงที่ไป cache ได้
+    """
+
+    def __new__(cls, text, schema, template=None):
+        prompt = super().__new__(cls, text)
+        prompt.schema = schema
+        prompt.template = template
+        return prompt
+
+
+# field ของ protos.Schema ใน google-generativeai 0.8 (key อื่นทำให้ SDK raise "Unknown field for Schema")
+GEMINI_SCHEMA_KEYS = ("type", "format", "description", "nullable", "enum", "items", "max_items", "min_items",
+                      "properties", "required")
+
+
+def gemini_schema(schema):
+    """schema ที่ตัด key ที่ SDK ไม่รับออก (ทุกชั้นของ properties/items)"""
+    result = {key: value for key, value in schema.items() if key in GEMINI_SCHEMA_KEYS}
+    if "properties" in result:
+        result["properties"] = {name: gemini_schema(field) for name, field in result["properties"].items()}
+    if "items" in result:
+        result["items"] = gemini_schema(result["items"])
+    return result
+
+
+def generation_config(prompt):
+    """generation_config สำหรับ JSON mode ของ Gemini หรือ None ถ้า prompt ไม่ได้กำหนด schema"""
+    schema = getattr(prompt, "schema", None)
+    if schema is None:
+        return None
+    return {"response_mime_type": "application/json", "response_schema": gemini_schema(schema)}
+
+
+def extract_json(text, expected_type="object"):
+    """คืนค่า JSON ก้อนแรกที่สมบูรณ์และชนิดตรงกับ expected_type (object/array) ข้อความรอบ ๆ ถูกข้ามไป"""
+    opener = "{" if expected_type == "object" else "["
+    decoder = json.JSONDecoder()
+    start = text.find(opener)
+    while start >= 0:
+        try:
+            value, _ = decoder.raw_decode(text, start)
+        except json.JSONDecodeError:
+            pass
+        else:
+            return value
+        start = text.find(opener, start + 1)
+    raise StructuredOutputError(f"No JSON {expected_type} found in model response")
+
+
+def _coerce_number(value, path, integer):
+    if isinstance(value, bool):
+        raise StructuredOutputError(f"{path}: expected a number, got {value!r}")
+    if isinstance(value, str):
+        match = NUMBER_PATTERN.search(value)
+        if not match:
+            raise StructuredOutputError(f"{path}: expected a number, got {value!r}")
+        value = float(match.group())
+    if not isinstance(value, (int, float)):
+        raise StructuredOutputError(f"{path}: expected a number, got {type(value).__name__}")
+    return int(round(value)) if integer else float(value)
+
+
+def coerce(value, schema, path="$"):
+    """ตรวจ value ตาม schema แล้วคืนค่าที่แปลงชนิดแล้ว (field ที่ไม่อยู่ใน schema คงไว้ตามเดิม)"""
+    kind = schema.get("type")
+    if kind == "object":
+        if not isinstance(value, dict):
+            raise StructuredOutputError(f"{path}: expected an object")
+        missing = [name for name in schema.get("required", []) if value.get(name) is None]
+        if missing:
+            raise StructuredOutputError(f"{path}: missing {', '.join(missing)}")
+        result = dict(value)
+        for name, field_schema in schema.get("properties", {}).items():
+            if result.get(name) is not None:
+                result[name] = coerce(result[name], field_schema, f"{path}.{name}")
+        return result
+    if kind == "array":
+        if not isinstance(value, list):
+            raise StructuredOutputError(f"{path}: expected an array")
+        return [coerce(item, schema.get("items", {}), f"{path}[{i}]") for i, item in enumerate(value)]
+    if kind in ("integer", "number"):
+        number = _coerce_number(value, path, kind == "integer")
+        if "minimum" in schema:
+            number = max(number, schema["minimum"])
+        if "maximum" in schema:
+            number = min(number, schema["maximum"])
+        return number
+    if kind == "string":
+        if isinstance(value, (dict, list)):
+            raise StructuredOutputError(f"{path}: expected a string")
+        return value if isinstance(value, str) else str(value)
+    return value
+
+
+def _legacy_parse_fails(text):
+    try:
+        json.loads(text.strip().replace("```json", "").replace("```", "").strip())
+    except ValueError:
+        return True
+    return False
+
+
+def _count(kind, field):
+    PARSE_RESULTS.inc(kind=kind, result=field)
+
+
+def parse_totals():
+    """จำนวนตาม kind -> result (รูปแบบเดิมของ /debug/cache -> structured_output)"""
+    totals = {}
+    for (kind, field), value in PARSE_RESULTS.values().items():
+        totals.setdefault(kind, dict.fromkeys(PARSE_RESULT_NAMES, 0))[field] = value
+    return totals
+
+
+def _loads_whole(text, expected_type):
+    """ทางเร็ว: ข้อความทั้งก้อนเป็น JSON ชนิดที่ต้องการ (กรณีปกติเมื่อส่ง response_schema) ไม่งั้นคืน None"""
+    try:
+        value = json.loads(text)
+    except ValueError:
+        return None
+    return value if isinstance(value, dict if expected_type == "object" else list) else None
+
+
+def decode(text, schema, kind):
+    """แปลงข้อความตอบกลับเป็นค่าตาม schema (raise StructuredOutputError ถ้าทำไม่ได้)"""
+    _count(kind, "responses")
+    with JSON_SECONDS.time(kind="model_response"):
+        value = _loads_whole(text, schema["type"])
+    if value is None:
+        # ต้องตัดข้อความรอบ ๆ ออก: นับว่าวิธีเดิมจะ parse ได้หรือไม่เฉพาะตอนนี้ (ทางเร็วไม่ต้อง json.loads ซ้ำ)
+        if _legacy_parse_fails(text):
+            _count(kind, "legacy_failures")
+        with JSON_SECONDS.time(kind="model_response"):
+            value = extract_json(text, schema["type"])
+    return coerce(value, schema)
+
+
+def build_repair_prompt(text, schema, error):
+    return JsonPrompt(f"""
+    ข้อความต่อไปนี้ควรเป็น JSON ตาม schema ด้านล่างแต่แปลงไม่ได้ ({error})
+    แก้ให้เป็น JSON ที่ถูกต้องตาม schema โดยคงเนื้อหาเดิมไว้ ตอบกลับเป็น JSON เท่านั้น ห้ามมีข้อความอื่น
+
+    schema:
+    {json.dumps(schema, ensure_ascii=False)}
+
+    ข้อความ:
+    {text[:REPAIR_INPUT_CHARS]}
+    """, schema)
+
+
+def parse_structured(text, schema, kind):
+    """generator สำหรับ `result = yield from parse_structured(...)` ใน flow
+
+    ถ้าแปลงไม่ได้จะ yield prompt ซ่อม JSON หนึ่งครั้ง ถ้ายังไม่ได้อีกจะ raise StructuredOutputError
+    """
+    try:
+        return decode(text, schema, kind)
+    except StructuredOutputError as e:
+        logger.warning("⚠️ Could not parse %s response, asking the model to repair it: %s", kind, e)
+        _count(kind, "repairs")
+        error = e
+    repaired_text = yield build_repair_prompt(text, schema, error)
+    try:
+        result = coerce(extract_json(repaired_text, schema["type"]), schema)
+    except StructuredOutputError:
+        _count(kind, "failed")
+        raise
+    _count(kind, "repaired")
+    return result
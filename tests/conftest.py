@@ -0,0 +1,52 @@
+"""ตั้งค่าร่วมของ test: import โมดูลของโปรเจกต์ได้ และใช้ MongoDB จำลอง (mongomock) แทนเซิร์ฟเวอร์จริง
+
+ต้องทำก่อน import app/database เพราะ MongoDB() สร้าง MongoClient ตอนเชื่อมต่อครั้งแรก
+"""
+import os
+import sys
+
+import mongomock
+import pymongo
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+os.environ["MONGODB_URI"] = "mongodb://localhost:27017/moodmate_test"
+os.environ.setdefault("GEMINI_API_KEY", "test-fake-key")
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+os.environ.setdefault("WARM_UP", "0")
+pymongo.MongoClient = mongomock.MongoClient
+
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+@pytest.fixture
+def fresh_db():
+    """ล้าง collection ของฐานข้อมูลจำลองก่อนแต่ละ test (แล้วสร้าง index กลับ เพื่อให้ unique index ทำงานเหมือนจริง)"""
+    from database import mongodb
+
+    for name in mongodb.db.list_collection_names():
+        mongodb.db.drop_collection(name)
+    mongodb.ensure_indexes()
+    mongodb.user_cache.clear()
+    return mongodb
+
+
+@pytest.fixture
+def client(fresh_db):
+    """test client ของ Flask ที่ล็อกอินเป็น user ใหม่ (client.user)"""
+    import app as flask_module
+    from models import User
+
+    user = User.create("tester", "tester-password")
+    test_client = flask_module.app.test_client()
+    with test_client.session_transaction() as session:
+        session["_user_id"] = user.get_id()
+        session["_fresh"] = True
+    test_client.user = user
+    return test_client
@@ -0,0 +1,86 @@
+import pytest
+
+import app as flask_module
+import reanalysis
+from batching import MicroBatcher
+from conftest import FakeResponse
+
+CONFIDENT = ("วันนี้เศร้ามาก ร้องไห้ทั้งคืน", "😭")
+AMBIGUOUS = ("ประชุมทั้งวัน", "😞")
+MODEL_TEXT = '{"emotion": "เหนื่อย", "summary": "ประชุมทั้งวันจนเหนื่อย", "emotionScore": 40}'
+
+
+class CountingModel:
+    def __init__(self):
+        self.prompts = []
+
+    def generate_content(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return FakeResponse(MODEL_TEXT)
+
+
+@pytest.fixture
+def model(monkeypatch):
+    fake = CountingModel()
+    monkeypatch.setattr(flask_module, "model", fake)
+    monkeypatch.setattr(flask_module, "LOCAL_SCORER", True)
+    flask_module.analyze_cache.clear()
+    return fake
+
+
+def analyze(client, message, emoji):
+    response = client.post("/analyze", json={"message": message, "emoji": emoji})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_local_result_has_no_model_summary(client, model):
+    body = analyze(client, *CONFIDENT)
+    assert body["promptVersion"] == flask_module.local_scorer.version
+    assert body["summary"] == "N/A"
+    assert body["summary"] != CONFIDENT[0]
+    assert model.prompts == []
+
+
+def test_local_scorer_runs_before_cached_model_result(client, model):
+    # ผลของ Gemini ที่แคชไว้ก่อน (เช่น ก่อนเปิด LOCAL_SCORER) ไม่บังข้อความที่ local_scorer ตอบเองได้
+    key = flask_module.make_cache_key(flask_module.MODEL_NAME, "analyze", flask_module.ANALYZE_PROMPT.version_id,
+                                      *CONFIDENT)
+    flask_module.analyze_cache.set(key, {"emotion": "จากแคช", "summary": "s", "emotionScore": 10,
+                                         "promptVersion": flask_module.ANALYZE_PROMPT.version_id})
+    assert analyze(client, *CONFIDENT)["promptVersion"] == flask_module.local_scorer.version
+
+
+def test_unconfident_message_uses_model_then_cache(client, model):
+    first = analyze(client, *AMBIGUOUS)
+    second = analyze(client, *AMBIGUOUS)
+    assert first["summary"] == second["summary"] == "ประชุมทั้งวันจนเหนื่อย"
+    assert first["promptVersion"] == flask_module.ANALYZE_PROMPT.version_id
+    assert len(model.prompts) == 1
+
+
+def test_batched_single_item_records_batch_prompt_version(client, model, monkeypatch):
+    # batch ที่ flush ออกมามีรายการเดียวต้องใช้ prompt เดียวกับ promptVersion ที่บันทึก
+    monkeypatch.setattr(flask_module, "analyze_batcher",
+                        MicroBatcher(flask_module.analyze_batch, max_batch_size=4, max_delay=0.01))
+    body = analyze(client, *AMBIGUOUS)
+    assert body["promptVersion"] == flask_module.ANALYZE_BATCH_PROMPT.version_id
+    assert body["summary"] == "ประชุมทั้งวันจนเหนื่อย"
+    assert [getattr(prompt, "template", None) for prompt in model.prompts] == [flask_module.ANALYZE_BATCH_PROMPT]
+
+
+def test_batch_fallback_uses_batch_prompt(model):
+    # model ตอบ object เดียวแทน array 2 รายการ: แยกผลไม่ได้ จึงเรียกทีละรายการด้วย batch prompt ขนาด 1
+    results = flask_module.analyze_batch([AMBIGUOUS, ("ทำงานล่วงเวลา", "😐")])
+    assert results == [MODEL_TEXT, MODEL_TEXT]
+    assert len(model.prompts) == 3
+    assert all(getattr(prompt, "template", None) is flask_module.ANALYZE_BATCH_PROMPT for prompt in model.prompts)
+
+
+def test_reanalysis_local_result_keeps_existing_summary():
+    entry = {"message": CONFIDENT[0], "emoji": CONFIDENT[1], "summary": "สรุปเดิม"}
+    local = reanalysis.score_batch_locally([entry], threshold=0.0)[0]
+    assert local["summary"] == "N/A"
+    fields = reanalysis.analyze_entry(entry, reanalysis.IntervalLimiter(0), local)
+    assert "summary" not in fields
+    assert fields["emotion"] == local["emotion"]
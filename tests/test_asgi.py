@@ -0,0 +1,45 @@
+import asyncio
+import time
+
+import asgi
+
+SLOW_SECONDS = 0.5
+
+
+def call(scope_path):
+    """ส่ง GET หนึ่ง request ผ่าน ASGI app แล้วคืน (status, body)"""
+    scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+             "scheme": "http", "path": scope_path, "raw_path": scope_path.encode(), "root_path": "",
+             "query_string": b"", "headers": [], "server": ("testserver", 80), "client": ("127.0.0.1", 1234)}
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    async def run():
+        await asgi.app(scope, receive, send)
+        start = next(m for m in messages if m["type"] == "http.response.start")
+        return start["status"], b"".join(m.get("body", b"") for m in messages if m["type"] == "http.response.body")
+
+    return run()
+
+
+def test_bridged_requests_run_concurrently(monkeypatch):
+    def slow_healthz():
+        time.sleep(SLOW_SECONDS)
+        return {"status": "ok"}
+
+    monkeypatch.setitem(asgi.flask_app.view_functions, "healthz", slow_healthz)
+
+    async def both():
+        return await asyncio.gather(call("/healthz"), call("/healthz"))
+
+    started = time.perf_counter()
+    results = asyncio.run(both())
+    elapsed = time.perf_counter() - started
+
+    assert [status for status, _ in results] == [200, 200]
+    assert elapsed < SLOW_SECONDS * 1.8, f"bridged requests ran one after another ({elapsed:.2f}s)"
@@ -0,0 +1,55 @@
+import threading
+
+import pytest
+
+from batching import MicroBatcher
+
+
+def test_items_submitted_together_share_one_batch():
+    batches = []
+
+    def process(items):
+        batches.append(list(items))
+        return [item * 10 for item in items]
+
+    batcher = MicroBatcher(process, max_batch_size=8, max_delay=0.2)
+    futures = [batcher.submit(i) for i in range(3)]
+    assert [future.result(timeout=2) for future in futures] == [0, 10, 20]
+    assert batches == [[0, 1, 2]]
+    assert batcher.stats()["batches"] == 1
+
+
+def test_batches_are_split_at_max_batch_size():
+    sizes = []
+    lock = threading.Lock()
+
+    def process(items):
+        with lock:
+            sizes.append(len(items))
+        return list(items)
+
+    batcher = MicroBatcher(process, max_batch_size=2, max_delay=0.2)
+    futures = [batcher.submit(i) for i in range(5)]
+    assert [future.result(timeout=2) for future in futures] == [0, 1, 2, 3, 4]
+    assert sorted(sizes) == [1, 2, 2]
+
+
+def test_exception_result_fails_only_that_item():
+    batcher = MicroBatcher(lambda items: [ValueError("bad") if item == "bad" else item for item in items],
+                           max_delay=0.2)
+    good, bad = batcher.submit("good"), batcher.submit("bad")
+    assert good.result(timeout=2) == "good"
+    with pytest.raises(ValueError, match="bad"):
+        bad.result(timeout=2)
+
+
+@pytest.mark.parametrize("process, error", [
+    (lambda items: 1 / 0, ZeroDivisionError),
+    (lambda items: items[:1], ValueError),  # ผลลัพธ์ไม่ครบทุก item
+])
+def test_batch_failure_fails_every_item(process, error):
+    batcher = MicroBatcher(process, max_delay=0.2)
+    futures = [batcher.submit(i) for i in range(2)]
+    for future in futures:
+        with pytest.raises(error):
+            future.result(timeout=2)
@@ -0,0 +1,56 @@
+import threading
+import time
+
+import pytest
+
+
+@pytest.fixture
+def disconnected(fresh_db):
+    """ถอด client ของ mongodb ออกชั่วคราว แล้วคืนค่าเดิมหลัง test"""
+    saved = fresh_db._client, fresh_db._db, fresh_db._next_connect_at
+    fresh_db._client = fresh_db._db = None
+    fresh_db.saved_connection = saved[:2]
+    yield fresh_db
+    fresh_db._client, fresh_db._db, fresh_db._next_connect_at = saved
+
+
+def test_request_waits_for_connect_in_progress(client, disconnected):
+    disconnected._next_connect_at = 0.0
+    lock_held = threading.Event()
+
+    def slow_warm_up():
+        with disconnected._connect_lock:
+            lock_held.set()
+            time.sleep(0.3)
+            # mongomock สร้าง store ใหม่ทุก MongoClient จึงคืน client เดิม (ที่มี user ของ test) แทน connect()
+            disconnected._client, disconnected._db = disconnected.saved_connection
+
+    warm_up = threading.Thread(target=slow_warm_up)
+    warm_up.start()
+    lock_held.wait()
+    response = client.get("/history90")
+    warm_up.join()
+
+    assert response.status_code == 200
+    assert disconnected.connected
+
+
+def test_unavailable_database_returns_503_not_signin(client, disconnected):
+    disconnected._next_connect_at = float("inf")
+    for path in ("/history90", "/history90/page"):
+        response = client.get(path)
+        assert response.status_code == 503
+        assert response.headers["Retry-After"]
+    assert client.post("/save", json={"message": "m", "emoji": "😀"}).status_code == 503
+
+
+def test_failed_ping_keeps_client(fresh_db, monkeypatch):
+    client = fresh_db.client
+
+    def fail(*args, **kwargs):
+        raise ConnectionError("ping timed out")
+
+    monkeypatch.setattr(client.admin, "command", fail)
+    assert fresh_db.ping() is False
+    assert fresh_db.client is client
+    assert fresh_db.health["last_error"] == "ping timed out"
@@ -0,0 +1,64 @@
+from datetime import datetime
+
+import pytest
+
+import app as flask_module
+from conftest import FakeResponse
+
+EVALUATION = '{"risk": "ต่ำ", "reason": "อารมณ์ส่วนใหญ่เป็นบวก", "advice": "ดูแลตัวเองต่อไป"}'
+
+
+class EvaluationModel:
+    def __init__(self):
+        self.prompts = []
+
+    def generate_content(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return FakeResponse(EVALUATION)
+
+
+@pytest.fixture
+def model(monkeypatch):
+    fake = EvaluationModel()
+    monkeypatch.setattr(flask_module, "model", fake)
+    return fake
+
+
+def save_entry(db, user_id, message):
+    assert db.save_emotion_entry(user_id, {
+        "date": datetime.now().strftime("%Y-%m-%d"), "message": message, "emoji": "😀",
+        "emotion": "มีความสุข", "summary": "s", "emotionScore": 80,
+    })
+
+
+def evaluate(client):
+    response = client.post("/evaluate_depression")
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_repeat_evaluation_without_new_entries_is_a_hit(client, fresh_db, model):
+    save_entry(fresh_db, client.user.id, "วันนี้ดีมาก")
+    hits = flask_module.EVALUATE_RESULTS.value(result="hits")
+    assert evaluate(client) == evaluate(client)
+    assert len(model.prompts) == 1
+    assert flask_module.EVALUATE_RESULTS.value(result="hits") == hits + 1
+
+
+def test_new_entry_invalidates_the_stored_result(client, fresh_db, model):
+    save_entry(fresh_db, client.user.id, "วันนี้ดีมาก")
+    evaluate(client)
+    save_entry(fresh_db, client.user.id, "ไปเที่ยวทะเล")
+    evaluate(client)
+    assert len(model.prompts) == 2
+    assert "ไปเที่ยวทะเล" in model.prompts[-1]
+
+
+def test_fingerprint_changes_with_each_input():
+    state = {"entries": 3, "last_entry_at": datetime(2024, 1, 1, 12, 0)}
+    base = flask_module.evaluation_fingerprint(state, "v1")
+    assert base == flask_module.evaluation_fingerprint(dict(state), "v1")
+    assert base != flask_module.evaluation_fingerprint(dict(state, entries=4), "v1")
+    assert base != flask_module.evaluation_fingerprint(dict(state, last_entry_at=datetime(2024, 1, 1, 12, 1)), "v1")
+    assert base != flask_module.evaluation_fingerprint(state, "v2")
+    assert flask_module.evaluation_fingerprint(None, "v1") == flask_module.evaluation_fingerprint({}, "v1")
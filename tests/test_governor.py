@@ -0,0 +1,132 @@
+import threading
+import time
+from collections import deque
+
+import pytest
+
+import governor as governor_module
+from governor import ModelGovernor, OverloadedError
+
+
+class QuotaExceeded(Exception):
+    code = 429
+
+
+class ThrottlingModel:
+    """โมเดลปลอมที่รับได้ไม่เกิน quota call ต่อ window วินาที (sliding window) เกินนั้นตอบ 429 ทันที
+    (benchmarks/bench_governor.py ใช้ตัวเดียวกัน)"""
+
+    def __init__(self, latency=0.0, quota=10, window=1.0, text="ok"):
+        self.latency = latency
+        self.quota = quota
+        self.window_seconds = window
+        self.text = text
+        self.window = deque()
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.throttled = 0
+
+    def generate_content(self, prompt, **kwargs):
+        with self.lock:
+            now = time.monotonic()
+            while self.window and self.window[0] <= now - self.window_seconds:
+                self.window.popleft()
+            if len(self.window) >= self.quota:
+                self.throttled += 1
+                raise QuotaExceeded("429 Resource has been exhausted")
+            self.window.append(now)
+            self.calls += 1
+        time.sleep(self.latency)
+        return type("Response", (), {"text": self.text})()
+
+
+def hold_slot(governor):
+    """ถือ slot เดียวของ governor ไว้จนกว่าจะ set event ที่คืนมา"""
+    entered, release = threading.Event(), threading.Event()
+    thread = threading.Thread(target=governor.call, args=(lambda: (entered.set(), release.wait()),))
+    thread.start()
+    entered.wait()
+    return release, thread
+
+
+def wait_queued(governor, count):
+    while governor.stats()["queued"] < count:
+        time.sleep(0.001)
+
+
+def test_rejects_when_queue_is_full():
+    governor = ModelGovernor(rate=0, max_in_flight=1, max_queue=1, max_wait=5)
+    release, holder = hold_slot(governor)
+    queued = threading.Thread(target=governor.call, args=(lambda: None,))
+    queued.start()
+    wait_queued(governor, 1)
+
+    started = time.monotonic()
+    with pytest.raises(OverloadedError):
+        governor.call(lambda: None)
+    assert time.monotonic() - started < 0.5
+    release.set()
+    holder.join()
+    queued.join()
+    assert governor.stats()["rejected"] == 1
+
+
+def test_rejects_after_max_wait():
+    governor = ModelGovernor(rate=0, max_in_flight=1, max_queue=10, max_wait=0.1)
+    release, holder = hold_slot(governor)
+    started = time.monotonic()
+    with pytest.raises(OverloadedError):
+        governor.call(lambda: None)
+    assert 0.1 <= time.monotonic() - started < 1
+    release.set()
+    holder.join()
+    assert governor.stats()["queued"] == 0
+
+
+def test_retries_429_from_throttling_model(monkeypatch):
+    # backoff สูงสุดของแต่ละรอบแทนค่าสุ่ม ให้ผลแน่นอน
+    monkeypatch.setattr(governor_module.random, "uniform", lambda low, high: high)
+    model = ThrottlingModel(quota=1, window=0.1)
+    governor = ModelGovernor(rate=0, max_in_flight=4, max_retries=5, base_backoff=0.05, max_wait=5)
+
+    assert governor.call(lambda: model.generate_content("a").text) == "ok"
+    assert governor.call(lambda: model.generate_content("b").text) == "ok"
+    assert model.throttled >= 1
+    assert model.calls == 2
+    assert governor.stats()["retries"] == model.throttled
+
+
+def test_does_not_retry_client_errors():
+    class BadRequest(Exception):
+        code = 400
+
+    calls = []
+    governor = ModelGovernor(rate=0, max_retries=5, base_backoff=0.01)
+
+    def fail():
+        calls.append(1)
+        raise BadRequest()
+
+    with pytest.raises(BadRequest):
+        governor.call(fail)
+    assert len(calls) == 1
+    assert governor.stats()["failures"] == 1
+
+
+def test_waiting_users_are_served_round_robin():
+    governor = ModelGovernor(rate=0, max_in_flight=1, max_queue=10, max_wait=5)
+    release, holder = hold_slot(governor)
+    order = []
+    threads = []
+    for i, user in enumerate(["heavy", "heavy", "heavy", "light"]):
+        label = f"{user}{i}"
+        thread = threading.Thread(target=governor.call, args=(lambda label=label: order.append(label), user))
+        thread.start()
+        threads.append(thread)
+        wait_queued(governor, i + 1)
+
+    release.set()
+    holder.join()
+    for thread in threads:
+        thread.join()
+    assert order == ["heavy0", "light3", "heavy1", "heavy2"]
@@ -0,0 +1,63 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+
+from database import decode_history_cursor, encode_history_cursor
+
+
+def test_cursor_round_trips():
+    entry = {"_id": ObjectId(), "date": "2024-05-01", "created_at": datetime(2024, 5, 1, 8, 30, 15, 123000)}
+    assert decode_history_cursor(encode_history_cursor(entry)) == (entry["date"], entry["created_at"], entry["_id"])
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "e30=", ""])
+def test_invalid_cursor_raises_value_error(cursor):
+    with pytest.raises(ValueError):
+        decode_history_cursor(cursor)
+
+
+def seed(db, user_id, days=3, per_day=5):
+    now = datetime.utcnow().replace(microsecond=0)
+    same_time = now - timedelta(hours=1)
+    entries = []
+    for day in range(days):
+        date = (datetime.now() - timedelta(days=day)).strftime("%Y-%m-%d")
+        for i in range(per_day):
+            # สอง entry แรกของแต่ละวันมี created_at เท่ากัน: ลำดับต้องตัดสินด้วย _id
+            created_at = same_time if i < 2 else now - timedelta(minutes=i)
+            entries.append({"user_id": str(user_id), "date": date, "message": f"{day}-{i}", "emoji": "😐",
+                            "emotionScore": 50, "created_at": created_at})
+    db.emotion_history.insert_many(entries)
+    return len(entries)
+
+
+def test_pages_cover_history_once_in_order(client, fresh_db):
+    total = seed(fresh_db.db, client.user.id)
+    expected = [entry["message"] for entry in fresh_db.iter_emotion_history(client.user.id)]
+
+    messages, cursor, pages = [], None, 0
+    while True:
+        query = {"limit": 4} if cursor is None else {"limit": 4, "cursor": cursor}
+        body = client.get("/history90/page", query_string=query).get_json()
+        messages.extend(entry["message"] for entry in body["history"])
+        assert all("_id" not in entry for entry in body["history"])
+        pages += 1
+        cursor = body["next"]
+        if cursor is None:
+            break
+
+    assert messages == expected and len(messages) == total
+    assert pages == -(-total // 4)
+
+
+def test_bad_cursor_is_a_client_error(client, fresh_db):
+    assert client.get("/history90/page", query_string={"cursor": "garbage"}).status_code == 400
+
+
+def test_stream_returns_one_json_entry_per_line(client, fresh_db):
+    total = seed(fresh_db.db, client.user.id, days=2, per_day=3)
+    lines = client.get("/history90/stream").get_data(as_text=True).splitlines()
+    assert len(lines) == total
+    assert {json.loads(line)["message"] for line in lines} == {f"{d}-{i}" for d in range(2) for i in range(3)}
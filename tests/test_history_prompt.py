@@ -0,0 +1,27 @@
+from datetime import datetime, timedelta
+
+import history_prompt
+import serializer
+
+
+def make_history(days=90, per_day=10):
+    today = datetime(2026, 1, 31)
+    return [
+        {"date": (today - timedelta(days=day)).strftime("%Y-%m-%d"), "emoji": "😀", "emotion": "มีความสุข",
+         "emotionScore": 60 + (day + i) % 30, "message": f"ข้อความวันที่ {day} รายการ {i} " * (1 + i % 3),
+         "summary": "สรุป", "analysis": ""}
+        for day in range(days) for i in range(per_day)
+    ]
+
+
+def test_report_estimates_original_size_without_serializing_whole_history(monkeypatch):
+    history = make_history()
+    exact = len(serializer.dumps(history, indent=True))
+    sizes = []
+    dumps = serializer.dumps
+    monkeypatch.setattr(serializer, "dumps", lambda value, indent=False: sizes.append(len(value)) or dumps(value, indent))
+
+    _, report = history_prompt.build_history_payload(history, today=datetime(2026, 1, 31))
+
+    assert abs(report["before_chars"] - exact) / exact < 0.05
+    assert max(sizes) < len(history)
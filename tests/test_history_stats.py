@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+
+from database import daily_stats_document, merge_daily_stats_updates
+
+
+def insert_legacy_entries(db, user_id, scores_by_day):
+    """entry ที่บันทึกก่อนมี user_daily_stats (ไม่มีสถิติรายวัน)"""
+    today = datetime.now()
+    db.emotion_history.insert_many([
+        {"user_id": str(user_id), "date": (today - timedelta(days=day)).strftime("%Y-%m-%d"), "message": "m",
+         "emoji": "😀", "emotion": "มีความสุข", "summary": "s", "emotionScore": score, "created_at": datetime.utcnow()}
+        for day, scores in scores_by_day.items() for score in scores
+    ])
+
+
+def new_entry(score=20):
+    return {"date": datetime.now().strftime("%Y-%m-%d"), "message": "m", "emoji": "😢", "emotion": "เศร้า",
+            "summary": "s", "emotionScore": score}
+
+
+def test_history90_averages_loaded_history_without_stats(client, fresh_db):
+    insert_legacy_entries(fresh_db.db, client.user.id, {1: [80, 90], 2: [85], 40: [85]})
+
+    body = client.get("/history90").get_json()
+    assert len(body["history90"]) == 4
+    assert body["averageScore"] == 85
+    assert body["risk"]["level"] == "ปกติ"
+    # /history90 ไม่อ่านหรือเขียน user_daily_stats
+    assert fresh_db.db.user_daily_stats.count_documents({}) == 0
+
+
+def test_user_stats_backfills_legacy_entries(client, fresh_db):
+    insert_legacy_entries(fresh_db.db, client.user.id, {1: [80, 90]})
+    fresh_db.save_emotion_entry(client.user.id, new_entry(20))
+
+    stats = fresh_db.get_user_stats(client.user.id)
+    assert stats["total_entries"] == 3
+    assert stats["average_score"] == round((80 + 90 + 20) / 3, 2)
+    assert (stats["lowest_score"], stats["highest_score"]) == (20, 90)
+    assert fresh_db.get_stats_summary(client.user.id)["total_entries"] == 3
+
+
+def test_save_succeeds_when_stats_write_fails(client, fresh_db, monkeypatch):
+    def broken(entry_data):
+        raise RuntimeError("stats down")
+
+    monkeypatch.setattr(fresh_db, "_update_daily_stats", broken)
+    assert fresh_db.save_emotion_entry(client.user.id, new_entry()) is True
+    assert fresh_db.db.emotion_history.count_documents({}) == 1
+    monkeypatch.undo()
+    assert fresh_db.get_user_stats(client.user.id)["total_entries"] == 1
+
+
+def test_daily_stats_document_matches_incremental_updates(client, fresh_db):
+    entries = [dict(new_entry(score), user_id=str(client.user.id)) for score in (20, 70)]
+    for entry in entries:
+        fresh_db._update_daily_stats(entry)
+    incremental = fresh_db.db.user_daily_stats.find_one({}, {"_id": 0, "updated_at": 0})
+
+    (stats_filter, update), = merge_daily_stats_updates(entries)
+    document = daily_stats_document(stats_filter, update)
+    document.pop("updated_at")
+    assert document == incremental
@@ -0,0 +1,45 @@
+from database import INDEXES, plan_stages
+
+
+def test_plan_stages_classic_explain():
+    plan = {"stage": "LIMIT", "inputStage": {"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}}}
+    assert plan_stages(plan) == ["LIMIT", "FETCH", "IXSCAN"]
+
+
+def test_plan_stages_slot_based_explain_and_or_branches():
+    # MongoDB 7+ ห่อ plan ไว้ใน queryPlan, $or มีหลาย inputStages
+    plan = {"queryPlan": {"stage": "OR", "inputStages": [{"stage": "IXSCAN"}, {"stage": "COLLSCAN"}]},
+            "slotBasedPlan": {"stages": "..."}}
+    assert plan_stages(plan) == ["OR", "IXSCAN", "COLLSCAN"]
+    assert plan_stages(None) == []
+
+
+class ExplainedCursor:
+    def __init__(self, winning_plan):
+        self.winning_plan = winning_plan
+
+    def explain(self):
+        return {"queryPlanner": {"winningPlan": self.winning_plan}}
+
+
+def test_check_query_plans_reports_each_hot_query(fresh_db, monkeypatch):
+    # mongomock ไม่มี explain(): ใช้ผล explain ตัวอย่างแทน cursor จริง
+    monkeypatch.setattr(fresh_db, "hot_queries", lambda: [
+        ("indexed", ExplainedCursor({"stage": "FETCH", "inputStage": {"stage": "IXSCAN"}})),
+        ("scan", ExplainedCursor({"stage": "SORT", "inputStage": {"stage": "COLLSCAN"}})),
+    ])
+    assert fresh_db.check_query_plans() == {"indexed": ["FETCH", "IXSCAN"], "scan": ["SORT", "COLLSCAN"]}
+
+
+def test_hot_queries_cover_every_collection_with_indexes(fresh_db):
+    names = {name.split(".")[0] for name, _ in fresh_db.hot_queries()}
+    assert {"emotion_history", "user_daily_stats", "users", "user_evaluations"} <= names
+
+
+def test_ensure_indexes_creates_declared_indexes(fresh_db):
+    assert fresh_db.ensure_indexes() is True
+    for collection_name, indexes in INDEXES.items():
+        existing = fresh_db.db[collection_name].index_information()
+        for keys, options in indexes:
+            assert options["name"] in existing
+            assert existing[options["name"]]["key"] == keys
@@ -0,0 +1,95 @@
+import pytest
+
+from jobs import DONE, FAILED, QUEUED, RUNNING, JobQueue, MemoryJobStore, MongoJobStore
+
+
+@pytest.fixture(params=["memory", "mongo"])
+def store(request):
+    if request.param == "memory":
+        return MemoryJobStore()
+    return MongoJobStore(request.getfixturevalue("fresh_db"))
+
+
+def make_queue(store, handler, max_attempts=3):
+    # workers=0: ไม่เริ่ม thread ให้ test จองและรันงานเองทีละขั้น
+    queue = JobQueue(store, workers=0, visibility_timeout=60, max_attempts=max_attempts, retry_delay=0)
+    queue.register("analyze", handler)
+    return queue
+
+
+def run_next(queue, worker="w1"):
+    job = queue.store.claim(worker, queue.visibility_timeout)
+    assert job is not None
+    queue._process(job)
+    return queue.get(job["_id"])
+
+
+def test_failed_attempt_is_retried_then_completes(store):
+    attempts = []
+
+    def handler(job):
+        attempts.append(job["attempts"])
+        if len(attempts) == 1:
+            raise RuntimeError("Gemini 503")
+        return {"status_code": 200, "body": {"ok": True}}
+
+    queue = make_queue(store, handler)
+    job_id = queue.enqueue("analyze", "1", {"message": "m"})
+
+    job = run_next(queue)
+    assert (job["status"], job["attempts"], job["error"]) == (QUEUED, 1, "Gemini 503")
+    job = run_next(queue)
+    assert (job["status"], job["attempts"], job["error"]) == (DONE, 2, None)
+    assert job["result"] == {"status_code": 200, "body": {"ok": True}}
+    assert attempts == [1, 2]
+    assert queue.get(job_id)["expires_at"] > job["updated_at"]
+    assert {k: queue.stats()[k] for k in ("completed", "retried", "failed")} == {"completed": 1, "retried": 1, "failed": 0}
+
+
+def test_job_fails_after_max_attempts(store):
+    def handler(job):
+        raise RuntimeError("always")
+
+    queue = make_queue(store, handler, max_attempts=2)
+    queue.enqueue("analyze", "1")
+    run_next(queue)
+    job = run_next(queue)
+    assert (job["status"], job["attempts"]) == (FAILED, 2)
+    assert queue.store.claim("w1", 60) is None
+
+
+def test_running_job_is_hidden_until_its_lease_expires(store):
+    queue = make_queue(store, lambda job: "result")
+    queue.enqueue("analyze", "1")
+    assert store.claim("w1", 60)["status"] == RUNNING
+    assert store.claim("w2", 60) is None
+
+
+def test_expired_lease_moves_job_to_another_worker(store):
+    queue = make_queue(store, lambda job: "result")
+    job_id = queue.enqueue("analyze", "1")
+    # worker แรกจองด้วย lease 0 วินาที (เหมือนค้างจนหมดเวลา) worker ที่สองจึงหยิบงานเดิมได้
+    stale = store.claim("w1", 0)
+    fresh = store.claim("w2", 60)
+    assert fresh["_id"] == job_id and fresh["attempts"] == 2
+
+    queue._process(stale)
+    assert queue.get(job_id)["status"] == RUNNING  # ผลของ worker ที่เสีย lease ถูกทิ้ง
+    queue._process(fresh)
+    assert queue.get(job_id)["status"] == DONE
+    assert queue.stats()["completed"] == 1
+
+
+def test_job_status_route_asks_clients_to_poll(client, monkeypatch):
+    import app as flask_module
+
+    queue = make_queue(MemoryJobStore(), lambda job: {"status_code": 200, "body": {}})
+    monkeypatch.setattr(flask_module, "job_queue", queue)
+    job_id = queue.enqueue("analyze", client.user.id)
+
+    response = client.get(f"/jobs/{job_id}")
+    assert response.get_json()["status"] == QUEUED
+    assert response.headers["Retry-After"] == str(flask_module.JOB_POLL_INTERVAL)
+    run_next(queue)
+    response = client.get(f"/jobs/{job_id}")
+    assert response.get_json()["status"] == DONE and "Retry-After" not in response.headers
@@ -0,0 +1,61 @@
+from datetime import datetime, timedelta
+
+import llm_cache
+from llm_cache import ResponseCache, make_cache_key
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_hit_and_miss():
+    cache = ResponseCache(max_size=4, ttl_seconds=60)
+    key = make_cache_key("model", "analyze", "v1", "ข้อความ", "😀")
+    assert cache.get(key) is None
+    cache.set(key, {"emotion": "สุข"})
+    assert cache.get(key) == {"emotion": "สุข"}
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["memory_hits"]) == (1, 1, 1)
+
+
+def test_key_normalizes_text_but_keeps_part_boundaries():
+    assert make_cache_key("m", "  วันนี้   ดี ") == make_cache_key("m", "วันนี้ ดี")
+    assert make_cache_key("m", "ab", "c") != make_cache_key("m", "a", "bc")
+
+
+def test_entry_expires_after_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_cache.time, "monotonic", clock)
+    cache = ResponseCache(ttl_seconds=60)
+    cache.set("key", "value")
+    clock.now += 59
+    assert cache.get("key") == "value"
+    clock.now += 2
+    assert cache.get("key") is None
+    assert cache.stats()["size"] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ResponseCache(max_size=2, ttl_seconds=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert (cache.get("a"), cache.get("b"), cache.get("c")) == (1, None, 3)
+
+
+def test_store_layer_survives_memory_clear(fresh_db):
+    cache = ResponseCache(ttl_seconds=60, store=fresh_db)
+    cache.set("key", {"emotion": "สุข"})
+    cache.clear()
+    assert cache.get("key") == {"emotion": "สุข"}
+    assert cache.stats()["store_hits"] == 1
+    # เอกสารที่หมดอายุแล้ว (ก่อน TTL monitor ของ MongoDB ลบ) ต้องไม่ถูกใช้
+    fresh_db.db.llm_cache.update_one({"_id": "key"}, {"$set": {"expires_at": datetime.utcnow() - timedelta(seconds=1)}})
+    cache.clear()
+    assert cache.get("key") is None
+
@@ -0,0 +1,49 @@
+import pytest
+
+import app as flask_module
+
+INTERNAL_PATHS = ("/metrics", "/debug/db", "/debug/cache")
+
+
+@pytest.mark.parametrize("path", INTERNAL_PATHS)
+def test_internal_endpoints_are_off_by_default(client, path):
+    assert flask_module.INTERNAL_ENDPOINTS is False
+    assert client.get(path).status_code == 404
+
+
+@pytest.mark.parametrize("path", INTERNAL_PATHS)
+def test_internal_endpoints_can_be_enabled(client, monkeypatch, path):
+    monkeypatch.setattr(flask_module, "INTERNAL_ENDPOINTS", True)
+    assert client.get(path).status_code == 200
+
+
+def test_counter_is_exact_under_threads():
+    import threading
+
+    from metrics import Counter
+
+    counter = Counter("moodmate_test_increments_total", "Test counter", ("result",))
+
+    def work():
+        for _ in range(5000):
+            counter.inc(result="ok")
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counter.value(result="ok") == 40000
+
+
+def test_app_counters_render_once_and_feed_debug_cache(client, monkeypatch):
+    monkeypatch.setattr(flask_module, "INTERNAL_ENDPOINTS", True)
+    monkeypatch.setattr(flask_module, "LOCAL_SCORER", True)
+    before = flask_module.LOCAL_SCORER_RESULTS.value(result="scored")
+    flask_module.score_locally("วันนี้เศร้ามาก ร้องไห้ทั้งคืน", "😭")
+
+    debug = client.get("/debug/cache").get_json()
+    assert debug["local_scorer"]["scored"] == before + 1
+    body = client.get("/metrics").get_data(as_text=True)
+    for name in ("moodmate_local_scorer_total", "moodmate_structured_output_total", "moodmate_evaluate_results_total"):
+        assert body.count(f"# TYPE {name} counter") == 1
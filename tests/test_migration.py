@@ -0,0 +1,72 @@
+import io
+import json
+
+import pytest
+
+import migration
+from migration import LEGACY_USER_ID, iter_json_entries
+
+BY_USER = {
+    "7": [{"date": "2024-01-01", "message": "สวัสดี {ไม่ใช่ JSON}", "emotionScore": 80}],
+    "8": [],
+    "9": [{"date": "2024-01-02", "message": "a", "tags": [1, {"x": "]"}]}, {"date": "2024-01-03", "message": "b"}],
+}
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 64 * 1024])
+def test_iter_json_entries_by_user(chunk_size):
+    text = json.dumps(BY_USER, ensure_ascii=False, indent=2)
+    entries = list(iter_json_entries(io.StringIO(text), chunk_size))
+    assert entries == [(user_id, entry) for user_id, items in BY_USER.items() for entry in items]
+
+
+@pytest.mark.parametrize("chunk_size", [3, 64 * 1024])
+def test_iter_json_entries_legacy_list(chunk_size):
+    items = BY_USER["9"]
+    assert list(iter_json_entries(io.StringIO(json.dumps(items)), chunk_size)) == [(LEGACY_USER_ID, e) for e in items]
+
+
+@pytest.mark.parametrize("text", ["", "  ", "[]", "{}", '{"1": []}'])
+def test_iter_json_entries_empty(text):
+    assert list(iter_json_entries(io.StringIO(text))) == []
+
+
+@pytest.mark.parametrize("text", ['[{"a": 1} {"b": 2}]', '{"1": [{"a": 1}]', '[{"a": '])
+def test_iter_json_entries_rejects_broken_json(text):
+    with pytest.raises(ValueError):
+        list(iter_json_entries(io.StringIO(text), 4))
+
+
+def write_export(tmp_path, count):
+    path = tmp_path / "emotion_history.json"
+    path.write_text(json.dumps({"5": [
+        {"date": "2024-02-01", "message": f"m{i}", "emoji": "😀", "emotion": "สุข", "emotionScore": i}
+        for i in range(count)
+    ]}, ensure_ascii=False), encoding="utf-8")
+    return str(path)
+
+
+def test_resume_after_crash_does_not_duplicate(fresh_db, tmp_path, monkeypatch):
+    source = write_export(tmp_path, 5)
+    checkpoint = str(tmp_path / "checkpoint.json")
+    write_batch = migration._write_batch
+    calls = []
+
+    def crash_after_second_write(db, batch):
+        calls.append(len(batch))
+        written = write_batch(db, batch)
+        if len(calls) == 2:
+            # process ตายหลังเขียน batch ที่สองแต่ก่อนบันทึก checkpoint
+            raise RuntimeError("killed")
+        return written
+
+    monkeypatch.setattr(migration, "_write_batch", crash_after_second_write)
+    with pytest.raises(RuntimeError):
+        migration.migrate_json_file(fresh_db, source, batch_size=2, checkpoint_path=checkpoint)
+    assert json.loads(open(checkpoint, encoding="utf-8").read())["done"] == 2
+
+    monkeypatch.setattr(migration, "_write_batch", write_batch)
+    # รันซ้ำ: ข้าม batch แรกตาม checkpoint, batch ที่สองชน _id เดิมจึงไม่ถูก insert ซ้ำ
+    assert migration.migrate_json_file(fresh_db, source, batch_size=2, checkpoint_path=checkpoint) == 1
+    assert fresh_db.db.emotion_history.count_documents({"user_id": "5"}) == 5
+    assert fresh_db.get_stats_summary("5", days=10000)["total_entries"] == 5
@@ -0,0 +1,96 @@
+import os
+
+import pytest
+
+import prompts
+from prompts import PromptRegistry
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = Clock()
+    monkeypatch.setattr(prompts.time, "monotonic", fake)
+    return fake
+
+
+def write(path, text, mtime_ns):
+    path.write_text(text, encoding="utf-8")
+    os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_file_template_reloads_after_interval(tmp_path, clock):
+    path = tmp_path / "prompt.md"
+    write(path, "คำสั่งรุ่นแรก", 1_000_000_000)
+    registry = PromptRegistry(reload_interval=2)
+    registry.register_file("evaluate", str(path), static_tail="\nข้อมูล:\n", suffix="{history}")
+
+    first = registry.get("evaluate")
+    assert first.render(history="[]") == "คำสั่งรุ่นแรก\nข้อมูล:\n[]"
+
+    write(path, "คำสั่งรุ่นสอง", 2_000_000_000)
+    clock.now += 1
+    assert registry.get("evaluate") is first  # ยังไม่ถึงรอบตรวจ
+    clock.now += 1
+    second = registry.get("evaluate")
+    assert second.prefix.startswith("คำสั่งรุ่นสอง")
+    assert second.version_id != first.version_id
+    assert registry.stats()["reloads"] == 1
+
+
+def test_touch_without_change_keeps_version(tmp_path, clock):
+    path = tmp_path / "prompt.md"
+    write(path, "เหมือนเดิม", 1_000_000_000)
+    registry = PromptRegistry(reload_interval=1)
+    registry.register_file("evaluate", str(path))
+    first = registry.get("evaluate")
+    write(path, "เหมือนเดิม", 3_000_000_000)
+    clock.now += 5
+    assert registry.get("evaluate") is first
+    assert registry.stats()["reloads"] == 0
+
+
+def test_missing_file_keeps_loaded_template(tmp_path, clock):
+    path = tmp_path / "prompt.md"
+    write(path, "คำสั่ง", 1_000_000_000)
+    registry = PromptRegistry(reload_interval=1)
+    registry.register_file("evaluate", str(path))
+    first = registry.get("evaluate")
+    path.unlink()
+    clock.now += 5
+    assert registry.get("evaluate") is first
+
+    registry.register_file("other", str(tmp_path / "missing.md"))
+    with pytest.raises(FileNotFoundError):
+        registry.get("other")
+
+
+def test_reload_disabled_reads_file_once(tmp_path, clock):
+    path = tmp_path / "prompt.md"
+    write(path, "รุ่นแรก", 1_000_000_000)
+    registry = PromptRegistry(reload_interval=0)
+    registry.register_file("evaluate", str(path))
+    first = registry.get("evaluate")
+    write(path, "รุ่นสอง", 2_000_000_000)
+    clock.now += 100
+    assert registry.get("evaluate") is first
+
+
+def test_inline_template_is_dedented_and_versioned():
+    registry = PromptRegistry()
+    template = registry.register("analyze", """
+        คำสั่ง
+          ย่อหน้า
+    """, suffix="ข้อความ: {message}")
+    assert template.prefix == "คำสั่ง\n  ย่อหน้า\n"
+    # ค่า {…} ในข้อความผู้ใช้ไม่ถูกตีความซ้ำ
+    assert template.render(message="{x}") == "คำสั่ง\n  ย่อหน้า\nข้อความ: {x}"
+    assert template.version_id.startswith("analyze@")
+    assert registry.get("analyze") is template
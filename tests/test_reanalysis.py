@@ -0,0 +1,34 @@
+import json
+
+from bson import ObjectId
+
+import app as flask_module
+import reanalysis
+
+
+def test_last_done_id_stops_before_first_failure():
+    batch = [{"_id": i} for i in range(4)]
+    assert reanalysis.last_done_id(batch, [{}, {"emotion": "x"}, {}, {}]) == 3
+    assert reanalysis.last_done_id(batch, [{}, {}, None, {}]) == 1
+    assert reanalysis.last_done_id(batch, [None, {}, {}, {}]) is None
+
+
+class FailingModel:
+    def generate_content(self, prompt, **kwargs):
+        raise ValueError("bad request")
+
+
+def test_failed_entries_are_not_skipped_on_resume(fresh_db, monkeypatch, tmp_path):
+    monkeypatch.setattr(flask_module, "model", FailingModel())
+    start = ObjectId()
+    fresh_db.db.emotion_history.insert_many([
+        {"user_id": "1", "date": "2024-01-01", "message": f"ข้อความ {i}", "emoji": "😐"} for i in range(5)
+    ])
+    checkpoint = tmp_path / "checkpoint.json"
+    reanalysis.save_checkpoint(str(checkpoint), start)
+
+    result = reanalysis.reanalyze(fresh_db.db, workers=2, rate=0, batch_size=2, checkpoint_path=str(checkpoint))
+    assert result["failed"] == 5
+    # checkpoint ไม่เลื่อนผ่าน entry ที่ล้มเหลว รอบถัดไปจึงยังเห็นครบ 5 รายการ
+    assert json.loads(checkpoint.read_text())["last_id"] == str(start)
+    assert reanalysis.reanalyze(fresh_db.db, checkpoint_path=str(checkpoint), dry_run=True)["candidates"] == 5
@@ -0,0 +1,49 @@
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+import pytest
+from bson import ObjectId
+
+import serializer
+
+BACKENDS = ["json"] + (["orjson"] if serializer.orjson else [])
+
+
+@pytest.fixture(params=BACKENDS)
+def backend(request, monkeypatch):
+    monkeypatch.setattr(serializer, "BACKEND", request.param)
+    return request.param
+
+
+def test_bson_types_are_converted(backend):
+    oid = ObjectId("64b7f0c2a1b2c3d4e5f60718")
+    value = {
+        "_id": oid,
+        "created_at": datetime(2024, 5, 1, 8, 30),
+        "aware": datetime(2024, 5, 1, 8, 30, tzinfo=timezone(timedelta(hours=7))),
+        "date": date(2024, 5, 1),
+        "score": Decimal("12.5"),
+    }
+    assert serializer.loads(serializer.dumps(value)) == {
+        "_id": "64b7f0c2a1b2c3d4e5f60718",
+        "created_at": "2024-05-01T08:30:00+00:00",
+        "aware": "2024-05-01T08:30:00+07:00",
+        "date": "2024-05-01",
+        "score": "12.5",
+    }
+
+
+def test_output_is_compact_utf8(backend):
+    text = serializer.dumps({"emotion": "มีความสุข", "ids": [ObjectId("64b7f0c2a1b2c3d4e5f60718")]})
+    assert text == '{"emotion":"มีความสุข","ids":["64b7f0c2a1b2c3d4e5f60718"]}'
+    assert serializer.dumps_bytes({"emotion": "เศร้า"}) == '{"emotion":"เศร้า"}'.encode("utf-8")
+
+
+def test_backends_agree_on_indented_output(backend):
+    value = {"b": 1, "a": [ObjectId("64b7f0c2a1b2c3d4e5f60718")]}
+    assert serializer.dumps(value, indent=True) == '{\n  "b": 1,\n  "a": [\n    "64b7f0c2a1b2c3d4e5f60718"\n  ]\n}'
+
+
+def test_unknown_type_raises(backend):
+    with pytest.raises(TypeError):
+        serializer.dumps({"value": object()})
@@ -0,0 +1,42 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from models import User
+
+
+def test_user_id_collision_allocates_a_new_id(fresh_db):
+    first = User.create("first", "password")
+    # user เดิมที่ถือ ID ถัดไปของ counter อยู่แล้ว (เช่น สร้างก่อนมี counters)
+    taken = str(int(first.id) + 1)
+    fresh_db.db.users.insert_one({"user_id": taken, "username": "legacy", "password": "hash"})
+
+    second = User.create("second", "password")
+    assert second is not None
+    assert second.id not in (first.id, taken)
+    assert fresh_db.db.users.find_one({"username": "second"})["user_id"] == second.id
+
+
+def test_duplicate_username_is_rejected(fresh_db):
+    assert User.create("same", "password") is not None
+    assert User.create("same", "password") is None
+    assert fresh_db.db.users.count_documents({"username": "same"}) == 1
+
+
+def test_concurrent_signups_get_unique_ids(fresh_db, monkeypatch):
+    # find_one_and_update ของ mongomock ไม่ atomic ข้าม thread (mongod เป็น atomic): จองทีละ thread
+    lock = threading.Lock()
+    allocate = fresh_db.next_user_id
+
+    def locked_allocate():
+        with lock:
+            return allocate()
+
+    monkeypatch.setattr(fresh_db, "next_user_id", locked_allocate)
+    monkeypatch.setattr("werkzeug.security.generate_password_hash", lambda password, method=None: "hash")
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        users = list(pool.map(lambda i: User.create(f"user{i}", "password"), range(64)))
+
+    assert None not in users
+    ids = [user.id for user in users]
+    assert len(set(ids)) == 64
+    assert sorted(map(int, ids)) == list(range(1, 65))
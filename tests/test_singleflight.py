@@ -0,0 +1,145 @@
+import asyncio
+import threading
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+def run_followers(flight, key, fn, count):
+    """เรียก do(key, fn) พร้อมกัน count ครั้ง คืน (threads, results, errors)"""
+    results, errors = [], []
+
+    def call():
+        try:
+            results.append(flight.do(key, fn))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def wait_coalesced(flight, count):
+    while flight.stats()["coalesced"] < count:
+        threading.Event().wait(0.001)
+
+
+def test_concurrent_calls_with_same_key_run_once():
+    flight = SingleFlight()
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait()
+        return "result"
+
+    threads, results, errors = run_followers(flight, "key", fn, 5)
+    wait_coalesced(flight, 4)
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert calls == [1]
+    assert results == ["result"] * 5 and not errors
+    assert flight.stats() == {"calls": 1, "coalesced": 4, "in_flight": 0}
+
+
+def test_leader_error_is_shared():
+    flight = SingleFlight()
+    release = threading.Event()
+
+    def fn():
+        release.wait()
+        raise RuntimeError("provider down")
+
+    threads, results, errors = run_followers(flight, "key", fn, 3)
+    wait_coalesced(flight, 2)
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert not results
+    assert [str(e) for e in errors] == ["provider down"] * 3
+
+
+def test_different_keys_and_later_calls_are_not_coalesced():
+    flight = SingleFlight()
+    assert flight.do("a", lambda: 1) == 1
+    assert flight.do("b", lambda: 2) == 2
+    assert flight.do("a", lambda: 3) == 3
+    assert flight.stats()["calls"] == 3
+
+
+def test_abandoned_leader_lets_follower_call_again():
+    flight = SingleFlight()
+    call = flight.begin("key")
+    assert flight.begin("key") is None
+    threads, results, errors = run_followers(flight, "key", lambda: "own result", 1)
+    wait_coalesced(flight, 1)
+    flight.finish("key", call, error=GeneratorExit())
+    threads[0].join()
+    assert results == ["own result"] and not errors
+
+
+def test_do_async_coalesces_on_one_loop():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def main():
+        return await asyncio.gather(*(flight.do_async("key", fetch) for _ in range(4)))
+
+    assert asyncio.run(main()) == ["result"] * 4
+    assert calls == [1]
+
+
+def test_do_async_follower_cancel_does_not_cancel_leader():
+    flight = SingleFlight()
+
+    async def fetch():
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do_async("key", fetch))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(flight.do_async("key", fetch))
+        await asyncio.sleep(0)
+        follower.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await follower
+        return await leader
+
+    assert asyncio.run(main()) == "result"
+
+
+def test_do_async_leader_cancel_lets_follower_call_again():
+    flight = SingleFlight()
+    calls = []
+
+    async def fetch():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return "result"
+
+    async def main():
+        leader = asyncio.ensure_future(flight.do_async("key", fetch))
+        await asyncio.sleep(0)
+        followers = [asyncio.ensure_future(flight.do_async("key", fetch)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await asyncio.gather(*followers)
+
+    assert asyncio.run(main()) == ["result", "result"]
+    # leader ที่ถูกยกเลิก 1 ครั้ง + leader ใหม่จากผู้รอ 1 ครั้ง
+    assert calls == [1, 1]
+    assert flight.stats()["in_flight"] == 0
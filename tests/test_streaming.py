@@ -0,0 +1,99 @@
+import json
+import threading
+import time
+
+import pytest
+
+import app as flask_module
+from conftest import FakeResponse
+
+
+class ProviderError(Exception):
+    def __init__(self, code):
+        super().__init__(f"provider error {code}")
+        self.code = code
+
+
+class StreamingModel:
+    """โมเดลปลอม: failures = ลำดับของ error ที่จะ raise (ก่อน chunk แรก หรือหลัง chunk แรกเมื่อ after_first)"""
+
+    def __init__(self, text="สวัสดีครับ", failures=(), after_first=False, delay=0.0):
+        self.text = text
+        self.failures = list(failures)
+        self.after_first = after_first
+        self.delay = delay
+        self.calls = []
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        self.calls.append("stream" if stream else "call")
+        error = self.failures.pop(0) if self.failures else None
+        if not stream:
+            time.sleep(self.delay)
+            if error:
+                raise error
+            return FakeResponse(self.text)
+        return self._chunks(error)
+
+    def _chunks(self, error):
+        if error and not self.after_first:
+            raise error
+        for i, char in enumerate(self.text):
+            time.sleep(self.delay / len(self.text))
+            yield FakeResponse(char)
+            if error and i == 0:
+                raise error
+
+
+@pytest.fixture
+def fake_model(monkeypatch):
+    def install(**kwargs):
+        model = StreamingModel(**kwargs)
+        monkeypatch.setattr(flask_module, "model", model)
+        monkeypatch.setattr(flask_module.model_governor, "base_backoff", 0.01)
+        return model
+    return install
+
+
+def run_stream(prompt):
+    with flask_module.app.test_request_context():
+        events = list(flask_module.stream_model_flow(flask_module.generate_flow({"prompt": prompt})))
+    parsed = [(frame.split("\n")[0][len("event: "):], json.loads(frame.split("\n")[1][len("data: "):]))
+              for frame in events]
+    return [data for event, data in parsed if event == "done"][0]
+
+
+def test_stream_retries_provider_error_before_first_chunk(fake_model):
+    model = fake_model(failures=[ProviderError(503), ProviderError(429)])
+    done = run_stream("retry-before-first-chunk")
+    assert done["status"] == 200
+    assert done["body"] == {"response": "สวัสดีครับ"}
+    assert model.calls == ["stream", "stream", "stream"]
+
+
+def test_stream_falls_back_to_retried_call_after_partial_output(fake_model):
+    model = fake_model(failures=[ProviderError(503)], after_first=True)
+    done = run_stream("fails-mid-stream")
+    assert done["status"] == 200
+    assert done["body"] == {"response": "สวัสดีครับ"}
+    assert model.calls == ["stream", "call"]
+
+
+def test_stream_does_not_retry_client_errors(fake_model):
+    model = fake_model(failures=[ProviderError(400)])
+    done = run_stream("bad-request")
+    assert done["status"] == 500
+    assert model.calls == ["stream"]
+
+
+def test_identical_call_during_stream_is_coalesced(fake_model):
+    model = fake_model(delay=0.3)
+    results = {}
+    streamer = threading.Thread(target=lambda: results.setdefault("stream", run_stream("same-prompt")))
+    streamer.start()
+    time.sleep(0.05)
+    results["call"] = flask_module.call_model("same-prompt")
+    streamer.join()
+
+    assert results["call"] == "สวัสดีครับ"
+    assert results["stream"]["body"] == {"response": "สวัสดีครับ"}
+    assert model.calls == ["stream"]
@@ -0,0 +1,40 @@
+import pytest
+
+import structured_output
+from structured_output import (ANALYZE_BATCH_SCHEMA, ANALYZE_SCHEMA, EVALUATION_SCHEMA, PARSE_RESULTS, JsonPrompt,
+                               coerce, decode, generation_config)
+
+
+@pytest.mark.parametrize("schema", [ANALYZE_SCHEMA, ANALYZE_BATCH_SCHEMA, EVALUATION_SCHEMA])
+def test_generation_config_is_accepted_by_sdk(schema):
+    generation_types = pytest.importorskip("google.generativeai.types.generation_types")
+    config = generation_types.to_generation_config_dict(generation_config(JsonPrompt("prompt", schema)))
+    assert config["response_mime_type"] == "application/json"
+
+
+def test_score_is_still_clamped_locally():
+    result = coerce({"emotion": "สุข", "summary": "s", "emotionScore": "150"}, ANALYZE_SCHEMA)
+    assert result["emotionScore"] == 100
+    assert coerce([{"index": 0, "emotion": "a", "summary": "b", "emotionScore": -3}],
+                  ANALYZE_BATCH_SCHEMA)[0]["emotionScore"] == 0
+
+
+def test_plain_prompt_has_no_generation_config():
+    assert generation_config("prompt") is None
+
+
+def test_plain_json_skips_legacy_check(monkeypatch):
+    def fail(text):
+        raise AssertionError("legacy parse should not run for plain JSON")
+
+    monkeypatch.setattr(structured_output, "_legacy_parse_fails", fail)
+    result = decode('{"emotion": "สุข", "summary": "s", "emotionScore": 80}', ANALYZE_SCHEMA, "test-fast")
+    assert result["emotionScore"] == 80
+
+
+def test_wrapped_json_is_extracted_and_counted():
+    before = PARSE_RESULTS.value(kind="test-wrapped", result="legacy_failures")
+    result = decode('ผลลัพธ์: {"emotion": "สุข", "summary": "s", "emotionScore": 80} จบ', ANALYZE_SCHEMA,
+                    "test-wrapped")
+    assert result["emotion"] == "สุข"
+    assert PARSE_RESULTS.value(kind="test-wrapped", result="legacy_failures") == before + 1
@@ -0,0 +1,34 @@
+from werkzeug.security import generate_password_hash
+
+from models import User
+
+
+def test_user_lookup_is_cached(fresh_db):
+    user = User.create("cached", "password")
+    assert fresh_db.get_user_by_id(user.id)["username"] == "cached"
+    # แก้ในฐานข้อมูลตรง ๆ (ไม่ผ่าน method ที่ล้างแคช): ภายใน TTL ยังได้ค่าจากแคช
+    fresh_db.db.users.update_one({"user_id": user.id}, {"$set": {"username": "renamed"}})
+    assert fresh_db.get_user_by_id(user.id)["username"] == "cached"
+    assert fresh_db.user_cache.stats()["hits"] >= 1
+
+
+def test_login_invalidates_cached_user(fresh_db):
+    import app as flask_module
+
+    User.create("login-user", "password")
+    user_id = fresh_db.get_user_by_username("login-user")["user_id"]
+    assert fresh_db.get_user_by_id(user_id)["last_login"] is None
+
+    response = flask_module.app.test_client().post("/signin", data={"username": "login-user", "password": "password"})
+    assert response.status_code == 302
+    assert fresh_db.get_user_by_id(user_id)["last_login"] is not None
+
+
+def test_signup_invalidates_stale_entry_for_new_id(fresh_db):
+    # ค่าเก่าของ ID ที่ counter จะจองให้ (เช่น user ที่ถูกลบไปแล้ว) ค้างอยู่ในแคช
+    next_id = str(int(fresh_db.next_user_id()) + 1)
+    fresh_db.user_cache.set(next_id, {"user_id": next_id, "username": "deleted",
+                                      "password": generate_password_hash("old")})
+    user = User.create("fresh", "password")
+    assert user.id == next_id
+    assert User.get(next_id).username == "fresh"
@@ -0,0 +1,53 @@
+from collections import Counter
+from datetime import datetime, timedelta
+
+import pytest
+
+ENTRIES = [
+    # (วันที่ย้อนหลัง, emotion, emoji, emotionScore)
+    (0, "มีความสุข", "😀", 90),
+    (0, "เศร้า", "😢", 20),
+    (1, "มีความสุข", "😀", 75),
+    (3, "เครียด", "😰", "N/A"),
+    (10, "มีความสุข", "😀", 60),
+    (120, "โกรธ", "😡", 5),  # นอกช่วง 90 วัน
+]
+
+
+def python_stats(history):
+    """ผลอ้างอิง: คำนวณจากประวัติทุก entry ใน Python (วิธีเดิมก่อนมี pipeline/สถิติรายวัน)"""
+    scores = [e["emotionScore"] for e in history if isinstance(e.get("emotionScore"), (int, float))]
+    emotions = Counter(e["emotion"] for e in history if e.get("emotion"))
+    return {
+        "total_entries": len(history),
+        "average_score": round(sum(scores) / len(scores), 2) if scores else 0,
+        "highest_score": max(scores) if scores else 0,
+        "lowest_score": min(scores) if scores else 0,
+        "days_with_entries": len({e["date"] for e in history}),
+        "most_common_emotion": emotions.most_common(1)[0][0] if emotions else "N/A",
+    }
+
+
+@pytest.fixture
+def seeded(fresh_db):
+    user_id = "42"
+    today = datetime.now()
+    for days_ago, emotion, emoji, score in ENTRIES:
+        fresh_db.save_emotion_entry(user_id, {
+            "date": (today - timedelta(days=days_ago)).strftime("%Y-%m-%d"), "message": "m",
+            "emoji": emoji, "emotion": emotion, "summary": "s", "emotionScore": score,
+        })
+    return fresh_db, user_id
+
+
+def test_aggregate_matches_python_path(seeded):
+    db, user_id = seeded
+    expected = python_stats(db.get_emotion_history(user_id, days=90))
+    assert expected["total_entries"] == 5
+    assert db.get_user_stats_aggregate(user_id) == expected
+    assert db.get_user_stats(user_id) == expected
+
+
+def test_aggregate_for_user_without_entries(fresh_db):
+    empty = fresh_db.get_user_stats_aggregate("nobody")
+    assert empty == python_stats([]) == fresh_db.get_user_stats("nobody")